@@ -1,6 +1,8 @@
 import nltk
+import numpy as np
 from rank_bm25 import BM25Okapi
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from indexing.metadata_filter import MetadataFilterIndex
 
 nltk.download("punkt")
 
@@ -13,17 +15,33 @@ class BM25Indexer:
         tokenized = [nltk.word_tokenize(t.lower()) for t in self.texts]
         self.bm25 = BM25Okapi(tokenized)
 
-    def search(self, query: str, top_k: int = 10):
+        self.filters = MetadataFilterIndex()
+        self.filters.add([c.get("metadata", {}) for c in chunks])
+
+    def search(self, query: str, top_k: int = 10, filters: Optional[Dict[str, Any]] = None):
+        """
+        filters: same format as FaissIndex.search; only the matching
+        documents are scored (masked BM25), so the top-k is exact within them.
+        """
         tokens = nltk.word_tokenize(query.lower())
-        scores = self.bm25.get_scores(tokens)
 
-        ranked = sorted(
-            zip(self.chunk_ids, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )[:top_k]
+        allowed = self.filters.select(filters)
+        if allowed is None:
+            doc_ids = np.arange(len(self.chunk_ids))
+            scores = self.bm25.get_scores(tokens)
+        elif len(allowed) == 0:
+            return []
+        else:
+            doc_ids = allowed
+            scores = np.asarray(self.bm25.get_batch_scores(tokens, allowed.tolist()))
+
+        k = min(top_k, len(doc_ids))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
 
         return [
-            {"chunk_id": cid, "score": float(score)}
-            for cid, score in ranked
+            {"chunk_id": self.chunk_ids[doc_ids[i]], "score": float(scores[i])}
+            for i in top
         ]
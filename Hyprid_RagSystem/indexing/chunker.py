@@ -15,8 +15,16 @@ class RecursiveChunker:
         min_chunk_size: int = 300,
         respect_sentence_boundaries: bool = True,
         respect_paragraph_boundaries: bool = True,
-        preserve_lists: bool = True
+        preserve_lists: bool = True,
+        link_neighbours: bool = False
     ):
+        """
+        link_neighbours: store only the non-overlapping core chunks, each with
+            prev_id / next_id links to its neighbours in the same document,
+            instead of copying up to `overlap` tokens of both neighbours into
+            every chunk; the retriever adds the neighbouring text back at read
+            time (see retrieval.expansion.NeighbourExpander)
+        """
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
         self.max_tokens = max_tokens
         self.overlap = overlap
@@ -24,6 +32,7 @@ class RecursiveChunker:
         self.respect_sentence_boundaries = respect_sentence_boundaries
         self.respect_paragraph_boundaries = respect_paragraph_boundaries
         self.preserve_lists = preserve_lists
+        self.link_neighbours = link_neighbours
 
     # ---------------------------------------------
     # Tokenization helpers
@@ -184,6 +193,18 @@ class RecursiveChunker:
                                "text": final_text, "metadata": curr_meta})
         return overlapped
 
+    # ---------------------------------------------
+    # Neighbour links (overlap-free storage)
+    # ---------------------------------------------
+    def _link_neighbours(self, chunks: List[Dict[str,Any]]) -> List[Dict[str,Any]]:
+        for chunk in chunks:
+            # merged chunks may have grown after their id was made
+            chunk["chunk_id"] = self._make_chunk_id(chunk["text"], chunk["metadata"])
+        for i, chunk in enumerate(chunks):
+            chunk["prev_id"] = chunks[i-1]["chunk_id"] if i > 0 else None
+            chunk["next_id"] = chunks[i+1]["chunk_id"] if i < len(chunks)-1 else None
+        return chunks
+
     # ---------------------------------------------
     # Main chunking
     # ---------------------------------------------
@@ -205,7 +226,9 @@ class RecursiveChunker:
                 doc_chunks.extend(para_chunks)
 
             doc_chunks = self._merge_small_chunks(doc_chunks, token_cache)
-            if self.overlap>0:
+            if self.link_neighbours:
+                doc_chunks = self._link_neighbours(doc_chunks)
+            elif self.overlap>0:
                 doc_chunks = self._add_smart_overlap(doc_chunks, token_cache)
 
             all_chunks.extend(doc_chunks)
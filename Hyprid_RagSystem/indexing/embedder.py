@@ -1,9 +1,8 @@
 import os
 import numpy as np
 import nltk
-from transformers import AutoTokenizer
-from sentence_transformers import SentenceTransformer
 from typing import Dict, List, Any
+from core.model_registry import registry
 
 nltk.download("punkt")
 
@@ -34,10 +33,15 @@ class EmbeddingEngine:
         batch_size: int = 16,
         cache: EmbeddingCache | None = None
     ):
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
         self.batch_size = batch_size
         self.cache = cache
 
+    @property
+    def model(self):
+        # shared, loaded on first use
+        return registry.sentence_transformer(self.model_name)
+
     def _normalize(self, vectors: np.ndarray) -> np.ndarray:
         norms = np.linalg.norm(vectors, axis=1, keepdims=True)
         return vectors / (norms + 1e-12)
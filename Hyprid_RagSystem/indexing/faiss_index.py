@@ -2,7 +2,8 @@ import faiss
 import numpy as np
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from indexing.metadata_filter import MetadataFilterIndex
 
 
 class FaissIndex:
@@ -10,14 +11,24 @@ class FaissIndex:
         self,
         vector_dim: int,
         index_path: str = "data/processed/faiss.index",
-        mapping_path: str = "data/processed/faiss_mapping.json"
+        mapping_path: str = "data/processed/faiss_mapping.json",
+        metadata_path: str = "data/processed/faiss_metadata.json",
+        subset_scan_ratio: float = 0.3
     ):
+        """
+        subset_scan_ratio: when a filter keeps less than this fraction of the
+            index, score only the matching vectors directly (cost ~ subset size)
+            instead of a full scan with an IDSelector.
+        """
         self.vector_dim = vector_dim
         self.index_path = index_path
         self.mapping_path = mapping_path
+        self.metadata_path = metadata_path
+        self.subset_scan_ratio = subset_scan_ratio
 
         self.index = faiss.IndexFlatIP(vector_dim)
         self.mapping: Dict[int, str] = {}
+        self.filters = MetadataFilterIndex()
         self.next_id = 0
 
         self._load_if_exists()
@@ -31,9 +42,20 @@ class FaissIndex:
                 self.mapping = {int(k): v for k, v in json.load(f).items()}
             self.next_id = max(self.mapping.keys()) + 1 if self.mapping else 0
 
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                self.filters = MetadataFilterIndex.from_json(json.load(f))
+
+    def clear(self):
+        """Drop every vector, id and metadata entry (including what was loaded from disk)."""
+        self.index = faiss.IndexFlatIP(self.vector_dim)
+        self.mapping = {}
+        self.filters = MetadataFilterIndex()
+        self.next_id = 0
+
     def add(self, chunks: List[Dict[str, Any]]):
         """
-        chunks: [{chunk_id, embedding}]
+        chunks: [{chunk_id, embedding, metadata}]
         """
         vectors = []
         for chunk in chunks:
@@ -43,10 +65,25 @@ class FaissIndex:
 
         vectors = np.array(vectors).astype("float32")
         self.index.add(vectors)
+        self.filters.add([c.get("metadata", {}) for c in chunks])
 
-    def search(self, query_vector: np.ndarray, top_k: int = 10):
+    def search(self, query_vector: np.ndarray, top_k: int = 10, filters: Optional[Dict[str, Any]] = None):
+        """
+        filters: metadata restriction applied inside the search, e.g.
+            {"language": "ar"} or {"source": ["a.pdf", "b.pdf"], "page": 3}
+        """
         query_vector = query_vector.astype("float32").reshape(1, -1)
-        scores, indices = self.index.search(query_vector, top_k)
+
+        allowed = self.filters.select(filters)
+        if allowed is None:
+            scores, indices = self.index.search(query_vector, top_k)
+        elif len(allowed) == 0:
+            return []
+        elif len(allowed) < self.subset_scan_ratio * self.index.ntotal:
+            scores, indices = self._search_subset(query_vector, allowed, top_k)
+        else:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed))
+            scores, indices = self.index.search(query_vector, top_k, params=params)
 
         results = []
         for i, faiss_id in enumerate(indices[0]):
@@ -58,9 +95,22 @@ class FaissIndex:
             })
         return results
 
+    def _search_subset(self, query_vector: np.ndarray, ids: np.ndarray, top_k: int):
+        """Exact inner-product top-k over the given ids only."""
+        vectors = self.index.reconstruct_batch(ids)
+        sims = vectors @ query_vector[0]
+
+        k = min(top_k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return sims[top].reshape(1, -1), ids[top].reshape(1, -1)
+
     def save(self):
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         faiss.write_index(self.index, self.index_path)
 
         with open(self.mapping_path, "w", encoding="utf-8") as f:
             json.dump(self.mapping, f, ensure_ascii=False, indent=2)
+
+        with open(self.metadata_path, "w", encoding="utf-8") as f:
+            json.dump(self.filters.to_json(), f, ensure_ascii=False)
@@ -0,0 +1,131 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Callable
+from indexing.bm25_index import BM25Indexer
+from indexing.faiss_index import FaissIndex
+from retrieval.expansion import NeighbourExpander
+
+
+class IndexGeneration:
+    """
+    One immutable snapshot of everything retrieve() reads: the chunk store,
+    FAISS, BM25 and the neighbour expander over that chunk store.
+
+    The retriever serves from exactly one generation at a time. Readers
+    register with enter()/leave(), so a replaced generation can be drained
+    (no request still inside it) before close() frees it; when_idle() defers
+    that to the last reader's leave() if they outlast the drain.
+
+    FAISS files live in `index_dir`, one directory per content version; if
+    that directory already holds the index for these chunks it is loaded
+    instead of rebuilt.
+    """
+
+    def __init__(
+        self,
+        number: int,
+        version: str,
+        chunks: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        index_dir: str,
+        context_neighbours: int = 1
+    ):
+        self.number = number
+        self.version = version
+        self.index_dir = index_dir
+        self.created_at = time.time()
+
+        for chunk, vector in zip(chunks, embeddings):
+            chunk.setdefault("embedding", vector)
+        self.chunk_lookup = {c["chunk_id"]: c for c in chunks}
+
+        self.faiss = FaissIndex(
+            vector_dim=embeddings.shape[1],
+            index_path=os.path.join(index_dir, "faiss.index"),
+            mapping_path=os.path.join(index_dir, "faiss_mapping.json"),
+            metadata_path=os.path.join(index_dir, "faiss_metadata.json")
+        )
+        self.loaded = self._matches_disk(chunks)
+        if not self.loaded:
+            self.faiss.clear()
+            self.faiss.add(chunks)
+            self.faiss.save()
+
+        self.bm25 = BM25Indexer(chunks)
+
+        # search and rerank see the core chunks only; neighbours are added afterwards
+        linked = any("prev_id" in c or "next_id" in c for c in chunks)
+        self.expander = NeighbourExpander(self.chunk_lookup, context_neighbours) if linked and context_neighbours else None
+
+        self._readers = 0
+        self._idle = threading.Condition()
+        self._on_idle: Optional[Callable[[], None]] = None
+
+    def _matches_disk(self, chunks: List[Dict[str, Any]]) -> bool:
+        mapping = self.faiss.mapping
+        return (
+            self.faiss.index.ntotal == len(chunks) == len(mapping)
+            and all(mapping.get(i) == c["chunk_id"] for i, c in enumerate(chunks))
+        )
+
+    # -------------------- Readers --------------------
+
+    def enter(self):
+        with self._idle:
+            self._readers += 1
+
+    def leave(self):
+        with self._idle:
+            self._readers -= 1
+            if self._readers:
+                return
+            self._idle.notify_all()
+            on_idle, self._on_idle = self._on_idle, None
+        if on_idle is not None:
+            on_idle()
+
+    @property
+    def readers(self) -> int:
+        with self._idle:
+            return self._readers
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no reader is inside; False if `timeout` ran out first."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._readers == 0, timeout=timeout)
+
+    def when_idle(self, callback: Callable[[], None]):
+        """
+        Run `callback` now if no reader is inside, else from the last
+        reader's leave(). Only for a generation no new reader can enter.
+        """
+        with self._idle:
+            if self._readers:
+                self._on_idle = callback
+                return
+        callback()
+
+    # -------------------- Teardown --------------------
+
+    def close(self, remove_files: bool = False):
+        """Free the in-memory index (call only once drained)."""
+        self.faiss.clear()
+        self.bm25 = None
+        self.expander = None
+        self.chunk_lookup = {}
+        if remove_files:
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+        logging.info(f"index generation {self.number} ({self.version}) freed")
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "generation": self.number,
+            "index_version": self.version,
+            "chunks": len(self.chunk_lookup),
+            "created_at": self.created_at,
+            "loaded_from_disk": self.loaded,
+        }
@@ -0,0 +1,79 @@
+import numpy as np
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+# Fields every chunk carries from DocumentLoader
+FILTER_FIELDS = ("source", "page", "language", "doc_type")
+
+
+class MetadataFilterIndex:
+    """
+    Per-field bitsets over positional ids (FAISS ids / BM25 document order).
+
+    filters: {"language": "ar", "source": ["a.pdf", "b.txt"], "page": range(1, 4)}
+        - a scalar matches one value
+        - a list / tuple / set / range matches any of its values (OR)
+        - different fields are combined with AND
+    """
+
+    def __init__(self, fields=FILTER_FIELDS):
+        self.fields = tuple(fields)
+        self.size = 0
+        self._positions: Dict[str, Dict[Any, List[int]]] = {f: defaultdict(list) for f in self.fields}
+        self._bitsets: Dict[tuple, np.ndarray] = {}
+
+    def add(self, metadatas: List[Dict[str, Any]]):
+        for meta in metadatas:
+            for field in self.fields:
+                if field in meta:
+                    self._positions[field][meta[field]].append(self.size)
+            self.size += 1
+        # bitsets are sized to the index, rebuild lazily after growth
+        self._bitsets.clear()
+
+    def _bitset(self, field: str, value: Any) -> np.ndarray:
+        key = (field, value)
+        bits = self._bitsets.get(key)
+        if bits is None:
+            bits = np.zeros(self.size, dtype=bool)
+            bits[self._positions[field].get(value, [])] = True
+            self._bitsets[key] = bits
+        return bits
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted int64 positions matching `filters`, or None when there is nothing to filter."""
+        if not filters:
+            return None
+
+        mask = np.ones(self.size, dtype=bool)
+        for field, wanted in filters.items():
+            if field not in self._positions:
+                raise ValueError(f"Unknown filter field '{field}', expected one of {self.fields}")
+
+            values = wanted if isinstance(wanted, (list, tuple, set, frozenset, range)) else [wanted]
+            field_mask = np.zeros(self.size, dtype=bool)
+            for v in values:
+                field_mask |= self._bitset(field, v)
+            mask &= field_mask
+
+        return np.flatnonzero(mask).astype("int64")
+
+    # -------------------- Persistence --------------------
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "fields": {
+                f: [[v, ids] for v, ids in values.items()]
+                for f, values in self._positions.items()
+            }
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MetadataFilterIndex":
+        index = cls(fields=data["fields"].keys())
+        index.size = data["size"]
+        for f, pairs in data["fields"].items():
+            for v, ids in pairs:
+                index._positions[f][v] = list(ids)
+        return index
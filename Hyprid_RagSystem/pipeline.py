@@ -1,28 +1,179 @@
+import os
 import hashlib
+import logging
+import threading
 import numpy as np
-from typing import List, Dict, Any
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional
 from indexing.embedder import EmbeddingEngine
-from indexing.bm25_index import BM25Indexer
-from indexing.faiss_index import FaissIndex
+from indexing.generation import IndexGeneration
 from retrieval.fusion import RRFFusion
 from retrieval.rerank import ReRanker
+from retrieval.compression import ContextCompressor
+from core.tracing import tracer
 
 class SmartHybridRetriever:
     def __init__(
         self,
         chunks: List[Dict[str, Any]],
-        embeddings: np.ndarray
+        embeddings: np.ndarray,
+        embedding_model: str = "BAAI/bge-m3",
+        reranker_model: str = "BAAI/bge-reranker-large",
+        rerank_cascade=None,
+        index_dir: str = "data/processed",
+        context_neighbours: int = 1,
+        compression_budget: int = 0,
+        compression_scorer: str = "cross-encoder",
+        drain_timeout: float = 60.0
     ):
-        self.embedder = EmbeddingEngine()
-        self.chunk_lookup = {c["chunk_id"]: c for c in chunks}
+        """
+        index_dir: where the FAISS index, id mapping and metadata are saved
+            (one sub-directory per index version)
+        rerank_cascade: optional cheap stages before the cross-encoder,
+            e.g. [("bi-encoder", 8)] (see ReRanker)
+        context_neighbours: for chunks stored without overlap (chunker with
+            link_neighbours=True), reranked hits are widened with this many
+            linked chunks on each side and adjacent hits are merged (0: off)
+        compression_budget: if > 0, the returned passages are cut down to their
+            best sentences within this many tokens, with offsets into the
+            source chunks kept in `spans` (see ContextCompressor)
+        compression_scorer: "cross-encoder" (the reranker) or "embedding"
+        drain_timeout: seconds reload() waits for requests still reading the
+            replaced index generation; if they outlast it, the last one to leave frees it
+        """
+        self.embedder = EmbeddingEngine(model_name=embedding_model)
+        self.fusion = RRFFusion()
+        self.reranker = ReRanker(model_name=reranker_model, cascade=rerank_cascade)
+        self.compressor = None
+        if compression_budget:
+            self.compressor = ContextCompressor(
+                reranker=self.reranker,
+                embedder=self.embedder,
+                scorer=compression_scorer,
+                token_budget=compression_budget
+            )
 
-        self.faiss = FaissIndex(vector_dim=embeddings.shape[1])
-        self.faiss.add(chunks)
-        self.faiss.save()
+        self.index_dir = index_dir
+        self.context_neighbours = context_neighbours
+        self.drain_timeout = drain_timeout
+        # everything but the chunks that decides what retrieve() returns
+        compression = f"{compression_scorer}:{compression_budget}" if self.compressor else "off"
+        self._config_key = f"{embedding_model}|{reranker_model}|{rerank_cascade}|{context_neighbours}|{compression}"
 
-        self.bm25 = BM25Indexer(chunks)
-        self.fusion = RRFFusion()
-        self.reranker = ReRanker()
+        # retrieve() reads one generation from start to end; reload() swaps in the next
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # index-<version> directories: the one a reload is building into must not be removed
+        self._files_lock = threading.Lock()
+        self._building: Optional[str] = None
+        self._next_generation = 1
+        self._generation = self._build_generation(chunks, embeddings)
+
+    # -------------------- Index generations --------------------
+
+    def _version(self, chunks: List[Dict[str, Any]]) -> str:
+        """Identifies what retrieve() can return; keys cached RAG tool results."""
+        linked = any("prev_id" in c or "next_id" in c for c in chunks)
+        digest = hashlib.sha256(f"{self._config_key}|{linked}".encode())
+        for chunk_id in sorted(c["chunk_id"] for c in chunks):
+            digest.update(chunk_id.encode())
+        return digest.hexdigest()[:16]
+
+    def _build_generation(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> IndexGeneration:
+        number = self._next_generation
+        self._next_generation += 1
+        version = self._version(chunks)
+        with tracer.span("index.build", generation=number, chunks=len(chunks)):
+            return IndexGeneration(
+                number,
+                version,
+                chunks,
+                embeddings,
+                index_dir=os.path.join(self.index_dir, f"index-{version}"),
+                context_neighbours=self.context_neighbours
+            )
+
+    @contextmanager
+    def reading(self):
+        """
+        The current generation, pinned until the block exits; pass it to
+        retrieve(generation=...) to know which one answered, hits or not.
+        """
+        with self._swap_lock:
+            generation = self._generation
+            generation.enter()
+        try:
+            yield generation
+        finally:
+            generation.leave()
+
+    @property
+    def generation(self) -> IndexGeneration:
+        return self._generation
+
+    @property
+    def index_version(self) -> str:
+        return self._generation.version
+
+    @property
+    def chunk_lookup(self) -> Dict[str, Dict[str, Any]]:
+        return self._generation.chunk_lookup
+
+    def reload(self, chunks: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> Future:
+        """
+        Build a new index generation from `chunks` in the background while the
+        current one keeps serving, then swap it in. Requests already running
+        finish on the generation they started on; the old generation is freed
+        once they are done. Reloads run one at a time.
+
+        embeddings: aligned with chunks; computed with the retriever's embedder if omitted
+        Returns a Future with the new generation's info().
+        """
+        future: Future = Future()
+
+        def _reload():
+            try:
+                with self._reload_lock:
+                    future.set_result(self._swap(chunks, embeddings))
+            except BaseException as e:
+                logging.exception("index reload failed")
+                future.set_exception(e)
+
+        threading.Thread(target=_reload, name="index-reload", daemon=True).start()
+        return future
+
+    def _swap(self, chunks: List[Dict[str, Any]], embeddings: Optional[np.ndarray]) -> Dict[str, Any]:
+        if embeddings is None:
+            with tracer.span("index.embed", chunks=len(chunks)):
+                embeddings = self.embedder.embed(chunks)
+        with self._files_lock:
+            self._building = self._version(chunks)
+        try:
+            new = self._build_generation(chunks, embeddings)
+            with self._swap_lock:
+                old, self._generation = self._generation, new
+        finally:
+            with self._files_lock:
+                self._building = None
+        tracer.count("index.swaps")
+        logging.info(f"index generation {new.number} ({new.version}) live, replacing {old.number}")
+
+        with tracer.span("index.drain", generation=old.number) as span:
+            drained = old.drain(self.drain_timeout)
+            span.set("drained", drained)
+        if not drained:
+            # readers still hold it; it is freed when the last one lets go
+            logging.warning(f"index generation {old.number} not drained after {self.drain_timeout}s")
+        old.when_idle(lambda: self._free(old))
+        return {**new.info(), "replaced": old.number, "drained": drained}
+
+    def _free(self, old: IndexGeneration):
+        # decided at free time: a later reload may have come back to this version's files
+        with self._files_lock:
+            old.close(remove_files=old.version not in (self._generation.version, self._building))
+
+    # -------------------- Retrieval --------------------
 
     def expand_query(self, query: str):
         return [
@@ -31,31 +182,102 @@ class SmartHybridRetriever:
             f"Detailed information about {query}"
         ]
 
-    def retrieve(self, query: str, top_k: int = 5):
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        generation: Optional[IndexGeneration] = None
+    ):
+        """
+        filters: optional metadata restriction pushed into FAISS and BM25,
+            e.g. {"language": "ar"} or {"source": "paper.pdf", "page": [1, 2]}
+        generation: one already pinned with reading(); the current one if omitted
+        Every record carries the number of the index generation it came from.
+        """
+        with (nullcontext(generation) if generation is not None else self.reading()) as generation, \
+                tracer.span("retrieve", top_k=top_k, filtered=bool(filters), generation=generation.number) as span:
+            enriched, query_vector = self._candidates(query, filters, generation)
+            span.set("candidates", len(enriched))
+
+            with tracer.span("retrieve.rerank", candidates=len(enriched)):
+                vectors = self._vectors(enriched, generation) if self.reranker.cascade and enriched else None
+                results = self.reranker.rerank(query, enriched, top_k=top_k, query_vector=query_vector, vectors=vectors)
+
+            if generation.expander is not None:
+                with tracer.span("retrieve.context", hits=len(results)) as context_span:
+                    results = generation.expander.expand(results)
+                    context_span.set("passages", len(results))
+
+            if self.compressor is not None:
+                with tracer.span("retrieve.compress", passages=len(results)) as compress_span:
+                    results = self.compressor.compress(query, results, query_vector=query_vector)
+                    compress_span.set("kept", len(results))
+            return results
+
+    def _candidates(self, query: str, filters: Optional[Dict[str, Any]], generation: IndexGeneration):
+        """Fused dense + sparse candidates (before reranking) and the query vector."""
         dense_all, sparse_all = [], []
+        query_vector = None
 
-        for q in self.expand_query(query):
+        with tracer.span("retrieve.expand"):
+            expanded = self.expand_query(query)
+
+        for q in expanded:
             q_chunk = {
                 "chunk_id": hashlib.sha256(q.encode()).hexdigest(),
                 "text": q,
                 "metadata": {}
             }
-            q_vec = self.embedder.embed([q_chunk])
+            with tracer.span("retrieve.embed"):
+                q_vec = self.embedder.embed([q_chunk])
+            if query_vector is None:
+                query_vector = q_vec[0]
 
-            dense_all.extend(self.faiss.search(q_vec, top_k=10))
-            sparse_all.extend(self.bm25.search(q, top_k=10))
+            with tracer.span("retrieve.faiss") as span:
+                dense = generation.faiss.search(q_vec, top_k=10, filters=filters)
+                span.set("hits", len(dense))
+            with tracer.span("retrieve.bm25") as span:
+                sparse = generation.bm25.search(q, top_k=10, filters=filters)
+                span.set("hits", len(sparse))
+            dense_all.extend(dense)
+            sparse_all.extend(sparse)
 
-        fused = self.fusion.fuse(dense_all, sparse_all, top_k=15)
+        with tracer.span("retrieve.fusion", dense=len(dense_all), sparse=len(sparse_all)):
+            fused = self.fusion.fuse(dense_all, sparse_all, top_k=15)
+        tracer.count("retrieve.candidates", len(fused))
 
         # enrich text
         enriched = []
         for r in fused:
-            base = self.chunk_lookup[r["chunk_id"]]
+            base = generation.chunk_lookup[r["chunk_id"]]
             enriched.append({
                 "chunk_id": r["chunk_id"],
                 "text": base["text"],
                 "metadata": base["metadata"],
-                "score": r["score"]
+                "score": r["score"],
+                "generation": generation.number
             })
 
-        return self.reranker.rerank(query, enriched, top_k=top_k)
+        return enriched, query_vector
+
+    def _vectors(self, records: List[Dict[str, Any]], generation: IndexGeneration) -> np.ndarray:
+        return np.vstack([generation.chunk_lookup[r["chunk_id"]]["embedding"] for r in records])
+
+    def evaluate_rerank_cascade(self, labelled_queries: List[Dict[str, Any]], k: int = 5):
+        """
+        labelled_queries: [{"query": str, "relevant": [chunk_id, ...]}]
+        Returns ReRanker.evaluate_cascade's report (full reranker vs cascade).
+        """
+        labelled = []
+        with self.reading() as generation:
+            for item in labelled_queries:
+                candidates, query_vector = self._candidates(item["query"], item.get("filters"), generation)
+                labelled.append({
+                    "query": item["query"],
+                    "candidates": candidates,
+                    "relevant": set(item["relevant"]),
+                    "query_vector": query_vector,
+                    "vectors": self._vectors(candidates, generation) if candidates else None
+                })
+        return self.reranker.evaluate_cascade(labelled, k=k)
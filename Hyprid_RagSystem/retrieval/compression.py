@@ -0,0 +1,189 @@
+import re
+import hashlib
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+
+# sentence = text up to terminal punctuation (Latin or Arabic) or a line break
+SENTENCE = re.compile(r"[^.!?؟\n]+(?:[.!?؟]+|\n|$)")
+
+
+def split_sentences(text: str, min_chars: int = 1, max_chars: int = 400) -> List[Tuple[int, int]]:
+    """
+    (start, end) character offsets of the sentences in `text`, whitespace
+    trimmed. Sentences longer than max_chars (unpunctuated text) are cut at
+    whitespace into pieces of at most max_chars.
+    """
+    spans = []
+    for m in SENTENCE.finditer(text):
+        start, end = m.start(), m.end()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        while end - start > max_chars:
+            cut = text.rfind(" ", start + 1, start + max_chars)
+            cut = cut if cut > start else start + max_chars
+            spans.append((start, cut))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        if end - start >= min_chars:
+            spans.append((start, end))
+    return spans
+
+
+class ContextCompressor:
+    """
+    Keeps only the sentences of the retrieved passages that matter for the query.
+
+    Every passage is split into sentences (never across the chunks it was
+    assembled from), all sentences are scored against the query in one
+    batched pass, and the best ones are kept until `token_budget` is spent. A
+    passage comes back with the kept sentences in reading order (adjacent
+    ones in the same chunk joined into one span) and `spans`:
+    [{chunk_id, start, end, score}], character offsets into that stored
+    chunk's text, so an answer can still cite the exact source. Passages with
+    no kept sentence are dropped.
+
+    scorer: "cross-encoder" (the retriever's ReRanker, batched and cached)
+        or "embedding" (cosine with the query vector, one encode call)
+    """
+
+    def __init__(
+        self,
+        reranker=None,
+        embedder=None,
+        scorer: str = "cross-encoder",
+        token_budget: int = 512,
+        min_sentence_chars: int = 12,
+        max_sentence_chars: int = 400,
+        separator: str = " ... "
+    ):
+        if scorer not in ("cross-encoder", "embedding"):
+            raise ValueError(f"Unknown compression scorer: {scorer}")
+        if scorer == "cross-encoder" and reranker is None:
+            raise ValueError("cross-encoder compression needs a reranker")
+        if scorer == "embedding" and embedder is None:
+            raise ValueError("embedding compression needs an embedder")
+        self.reranker = reranker
+        self.embedder = embedder
+        self.scorer = scorer
+        self.token_budget = token_budget
+        self.min_sentence_chars = min_sentence_chars
+        self.max_sentence_chars = max_sentence_chars
+        self.separator = separator
+        self.stats = {"sentences": 0, "kept": 0, "tokens_in": 0, "tokens_out": 0}
+        self._stats_lock = threading.Lock()  # compress() runs on many request threads
+
+    # -------------------- Scoring --------------------
+
+    def _tokenizer(self):
+        model = self.reranker.model if self.scorer == "cross-encoder" else self.embedder.model
+        return getattr(model, "tokenizer", None)
+
+    def _token_counts(self, texts: List[str]) -> List[int]:
+        tokenizer = self._tokenizer()
+        if tokenizer is None:
+            return [len(t.split()) for t in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _score(self, query: str, sentences: List[Dict[str, Any]], query_vector: Optional[np.ndarray]) -> List[float]:
+        if self.scorer == "cross-encoder":
+            return self.reranker.score(query, sentences)
+
+        model = self.embedder.model
+        vectors = model.encode(
+            [s["text"] for s in sentences],
+            batch_size=self.embedder.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        if query_vector is None:
+            query_vector = model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
+        query_vector = np.asarray(query_vector, dtype="float32").ravel()
+        query_vector = query_vector / (np.linalg.norm(query_vector) + 1e-12)
+        return (np.asarray(vectors, dtype="float32") @ query_vector).tolist()
+
+    # -------------------- Compression --------------------
+
+    def compress(
+        self,
+        query: str,
+        passages: List[Dict[str, Any]],
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        passages: ranked [{chunk_id, text, metadata, score, ...}]
+        Returns new records (the caller's dicts are left untouched).
+        """
+        sentences = []
+        for p_idx, passage in enumerate(passages):
+            text = passage["text"]
+            # expanded passages say where each chunk sits in their text; others are one chunk
+            segments = passage.get("segments") or [{"chunk_id": passage["chunk_id"], "start": 0, "end": len(text)}]
+            for segment in segments:
+                base = segment["start"]
+                for start, end in split_sentences(text[base:segment["end"]], self.min_sentence_chars, self.max_sentence_chars):
+                    sentence = text[base + start:base + end]
+                    sentences.append({
+                        # keyed on the text itself: a passage's text (so any offset in it)
+                        # depends on which hits were merged into it, a sentence's doesn't
+                        "chunk_id": "sentence:" + hashlib.sha1(sentence.encode("utf-8")).hexdigest(),
+                        "text": sentence,
+                        "passage": p_idx,
+                        "source": segment["chunk_id"],
+                        "base": base,
+                        "start": start,  # offsets in the source chunk's text
+                        "end": end,
+                    })
+        if not sentences:
+            return []
+
+        scores = self._score(query, sentences, query_vector)
+        lengths = self._token_counts([s["text"] for s in sentences])
+
+        # best sentences first, skipping any that would overflow the budget
+        # (the best one is kept regardless, so the context is never empty)
+        kept, used = [], 0
+        for i in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+            if kept and used + lengths[i] > self.token_budget:
+                continue
+            kept.append(i)
+            used += lengths[i]
+
+        by_passage: Dict[int, List[int]] = {}
+        for i in sorted(kept, key=lambda i: (sentences[i]["passage"], sentences[i]["base"] + sentences[i]["start"])):
+            by_passage.setdefault(sentences[i]["passage"], []).append(i)
+
+        compressed = []
+        for p_idx, passage in enumerate(passages):
+            if p_idx not in by_passage:
+                continue
+            text = passage["text"]
+            spans, bases = [], []
+            for i in by_passage[p_idx]:
+                s = sentences[i]
+                # sentences of one chunk separated only by whitespace become one span
+                if (
+                    spans and spans[-1]["chunk_id"] == s["source"]
+                    and not text[s["base"] + spans[-1]["end"]:s["base"] + s["start"]].strip()
+                ):
+                    spans[-1]["end"] = s["end"]
+                    spans[-1]["score"] = max(spans[-1]["score"], float(scores[i]))
+                else:
+                    spans.append({"chunk_id": s["source"], "start": s["start"], "end": s["end"], "score": float(scores[i])})
+                    bases.append(s["base"])
+            compressed.append({
+                **passage,
+                "text": self.separator.join(text[b + sp["start"]:b + sp["end"]] for sp, b in zip(spans, bases)),
+                "spans": spans,
+            })
+
+        with self._stats_lock:
+            self.stats["sentences"] += len(sentences)
+            self.stats["kept"] += len(kept)
+            self.stats["tokens_in"] += sum(lengths)
+            self.stats["tokens_out"] += used
+        return compressed
@@ -0,0 +1,97 @@
+from typing import List, Dict, Any, Optional
+
+
+class NeighbourExpander:
+    """
+    Read-time context window for chunks stored without overlap.
+
+    Each hit is widened with up to `neighbours` chunks on each side (following
+    the chunker's prev_id / next_id links), and hits whose windows touch or
+    overlap are merged into one passage, so the caller gets the surrounding
+    text once instead of the same sentences in several hits.
+    """
+
+    def __init__(self, chunk_lookup: Dict[str, Dict[str, Any]], neighbours: int = 1, separator: str = " "):
+        self.chunk_lookup = chunk_lookup
+        self.neighbours = neighbours
+        self.separator = separator
+
+    def _window(self, chunk_id: str) -> List[str]:
+        before, after = [], []
+        cid = chunk_id
+        for _ in range(self.neighbours):
+            cid = self.chunk_lookup[cid].get("prev_id")
+            if cid is None or cid not in self.chunk_lookup:
+                break
+            before.append(cid)
+        cid = chunk_id
+        for _ in range(self.neighbours):
+            cid = self.chunk_lookup[cid].get("next_id")
+            if cid is None or cid not in self.chunk_lookup:
+                break
+            after.append(cid)
+        return before[::-1] + [chunk_id] + after
+
+    def _ordered(self, ids: set) -> Optional[List[str]]:
+        """The ids as one contiguous run along the links, or None if they are not contiguous."""
+        heads = [cid for cid in ids if self.chunk_lookup[cid].get("prev_id") not in ids]
+        if len(heads) != 1:
+            return None
+        run, cid = [], heads[0]
+        while cid in ids and cid not in run:
+            run.append(cid)
+            cid = self.chunk_lookup[cid].get("next_id")
+        return run if len(run) == len(ids) else None
+
+    def _touches(self, window: List[str], other: List[str]) -> bool:
+        if set(window) & set(other):
+            return True
+        return (
+            self.chunk_lookup[window[-1]].get("next_id") == other[0]
+            or self.chunk_lookup[other[-1]].get("next_id") == window[0]
+        )
+
+    def expand(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        hits: ranked [{chunk_id, text, metadata, score, ...}] (best first)
+        Returns one passage per group of adjacent hits, in the rank of its best
+        hit: the best hit's fields plus the widened `text`, `chunk_ids` (the
+        hits merged into it), `span` (every chunk whose text it contains) and
+        `segments` ([{chunk_id, start, end}]: where each of those chunks sits
+        in `text`).
+        """
+        groups: List[Dict[str, Any]] = []
+        for hit in hits:
+            if hit["chunk_id"] not in self.chunk_lookup:
+                groups.append({"hit": hit, "chunk_ids": [hit["chunk_id"]], "span": None})
+                continue
+            window = self._window(hit["chunk_id"])
+
+            # a hit can bridge two earlier groups: all of them collapse into the best one
+            touching = [g for g in groups if g["span"] is not None and self._touches(window, g["span"])]
+            ids = set(window).union(*(g["span"] for g in touching))
+            merged = self._ordered(ids) if touching else None
+            if merged is None:
+                groups.append({"hit": hit, "chunk_ids": [hit["chunk_id"]], "span": window})
+                continue
+            best = touching[0]
+            for group in touching[1:]:
+                best["chunk_ids"].extend(group["chunk_ids"])
+                groups.remove(group)
+            best["chunk_ids"].append(hit["chunk_id"])
+            best["span"] = merged
+
+        passages = []
+        for group in groups:
+            passage = dict(group["hit"])
+            passage["chunk_ids"] = group["chunk_ids"]
+            if group["span"] is not None:
+                passage["span"] = group["span"]
+                passage["segments"], offset = [], 0
+                for cid in group["span"]:
+                    end = offset + len(self.chunk_lookup[cid]["text"])
+                    passage["segments"].append({"chunk_id": cid, "start": offset, "end": end})
+                    offset = end + len(self.separator)
+                passage["text"] = self.separator.join(self.chunk_lookup[cid]["text"] for cid in group["span"])
+            passages.append(passage)
+        return passages
@@ -0,0 +1,22 @@
+import numpy as np
+from typing import List, Set
+
+
+def recall_at_k(ranked_ids: List[str], relevant: Set[str], k: int) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(ranked_ids[:k]) & relevant) / len(relevant)
+
+
+def mrr(ranked_ids: List[str], relevant: Set[str]) -> float:
+    for rank, cid in enumerate(ranked_ids, start=1):
+        if cid in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked_ids: List[str], relevant: Set[str], k: int) -> float:
+    """Binary-relevance nDCG@k."""
+    dcg = sum(1.0 / np.log2(rank + 1) for rank, cid in enumerate(ranked_ids[:k], start=1) if cid in relevant)
+    ideal = sum(1.0 / np.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return float(dcg / ideal) if ideal else 0.0
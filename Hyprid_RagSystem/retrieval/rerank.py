@@ -1,75 +1,277 @@
-from sentence_transformers import CrossEncoder
-from typing import List, Dict, Any
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
+from core.model_registry import registry
+from core.tracing import tracer
+from retrieval.metrics import recall_at_k, mrr, ndcg_at_k
+
+
+class ScoreCache:
+    """Bounded LRU of cross-encoder scores keyed on (normalized query, chunk_id, model)."""
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._data.get(key)
+            if score is not None:
+                self._data.move_to_end(key)
+            return score
+
+    def put(self, key: Tuple[str, str, str], score: float):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
 
 class ReRanker:
-    def __init__(self, model_name="BAAI/bge-reranker-large"):
-        self.model = CrossEncoder(model_name)
+    def __init__(
+        self,
+        model_name="BAAI/bge-reranker-large",
+        max_length: int = 512,
+        batch_size: int = 16,
+        max_batch_tokens: int = 8192,
+        cache_size: int = 50_000,
+        cascade: Optional[List[Tuple[Union[str, "CascadeStage"], int]]] = None
+    ):
+        """
+        max_length: max (query + passage) tokens fed to the cross-encoder;
+            longer passages are cut before tokenization inside predict()
+        batch_size / max_batch_tokens: pairs are sorted by length and packed
+            so a batch never pads more than max_batch_tokens tokens
+        cache_size: scores kept in the (query, chunk, model) cache, 0 disables it
+        cascade: cheap stages run before this model, as [(stage, depth), ...];
+            each stage keeps its `depth` best candidates for the next one, e.g.
+            [("bi-encoder", 8)] or [("bi-encoder", 10), ("cross-encoder:cross-encoder/ms-marco-MiniLM-L-6-v2", 5)]
+        """
+        self.model_name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.cache = ScoreCache(cache_size) if cache_size else None
+        self.cascade = [(make_stage(stage), depth) for stage, depth in (cascade or [])]
+        self.stats = {"pairs_scored": 0, "cache_hits": 0, "pruned_by_cascade": 0}
+        self._stats_lock = threading.Lock()  # score() runs on many request threads
+
+    @property
+    def model(self):
+        return registry.cross_encoder(self.model_name, max_length=self.max_length)
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.model_name}@{self.max_length}"
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.casefold().split())
 
     def rerank(
         self,
         query: str,
         chunks: List[Dict[str, Any]],
-        top_k: int = 5
+        top_k: int = 5,
+        query_vector: Optional[np.ndarray] = None,
+        vectors: Optional[np.ndarray] = None,
+        use_cascade: bool = True
     ):
-        pairs = [(query, c["text"]) for c in chunks]
-        scores = self.model.predict(pairs)
+        """
+        Returns new records ({**chunk, "score": cross-encoder score}) sorted by
+        score; the caller's dicts are left untouched.
+        query_vector / vectors: query and chunk embeddings (aligned with chunks),
+            needed only by a bi-encoder cascade stage.
+        """
+        if use_cascade and self.cascade:
+            chunks = self._run_cascade(query, chunks, query_vector, vectors)
 
-        for c, s in zip(chunks, scores):
-            c["score"] = float(s)
+        scores = self.score(query, chunks)
+        ranked = [{**c, "score": s} for c, s in zip(chunks, scores)]
+        ranked.sort(key=lambda x: x["score"], reverse=True)
+        return ranked[:top_k]
 
-        chunks.sort(key=lambda x: x["score"], reverse=True)
-        return chunks[:top_k]
+    def score(self, query: str, chunks: List[Dict[str, Any]]) -> List[float]:
+        """Cross-encoder scores aligned with `chunks`, served from cache when possible."""
+        qkey = self.normalize_query(query)
+        scores: List[Optional[float]] = [None] * len(chunks)
+        missing = []
 
+        for i, c in enumerate(chunks):
+            cached = self.cache.get((qkey, c["chunk_id"], self.model_key)) if self.cache is not None else None
+            if cached is None:
+                missing.append(i)
+            else:
+                scores[i] = cached
+        self._count("cache_hits", len(chunks) - len(missing))
+        tracer.count("rerank.cache_hits", len(chunks) - len(missing), model=self.model_name)
 
+        if missing:
+            with tracer.span("rerank.predict", model=self.model_name, pairs=len(missing)):
+                new_scores = self._score_pairs(query, [chunks[i]["text"] for i in missing])
+            tracer.count("rerank.pairs_scored", len(missing), model=self.model_name)
+            for i, s in zip(missing, new_scores):
+                scores[i] = s
+                if self.cache is not None:
+                    self.cache.put((qkey, chunks[i]["chunk_id"], self.model_key), s)
+            self._count("pairs_scored", len(missing))
 
-# Code splitting the top chunks into sentences and getting score for each one
-'''
-from sentence_transformers import CrossEncoder
-from typing import List, Dict, Any
-import nltk
+        return scores
 
-nltk.download("punkt")
+    def _count(self, name: str, n: int):
+        with self._stats_lock:
+            self.stats[name] += n
 
-class ReRanker:
-    def __init__(self, model_name="BAAI/bge-reranker-large"):
-        self.model = CrossEncoder(model_name)
+    # -------------------- Cascade --------------------
 
-    def rerank(
-        self,
-        query: str,
-        chunks: List[Dict[str, Any]],
-        top_k: int = 5
-    ) -> List[Dict[str, Any]]:
+    def _run_cascade(self, query, chunks, query_vector, vectors):
+        """Prune candidates with the cheap stages; returns the shortlist for the large model."""
+        keep = list(range(len(chunks)))
+        for stage, depth in self.cascade:
+            if len(keep) <= depth:
+                continue
+            stage_vectors = vectors[keep] if vectors is not None else None
+            with tracer.span("rerank.cascade", stage=stage.name, candidates=len(keep), keep=depth):
+                stage_scores = stage.score(query, [chunks[i] for i in keep], query_vector, stage_vectors)
+            order = np.argsort(-np.asarray(stage_scores), kind="stable")[:depth]
+            self._count("pruned_by_cascade", len(keep) - depth)
+            keep = [keep[i] for i in order]
+        return [chunks[i] for i in keep]
+
+    def evaluate_cascade(self, labelled: List[Dict[str, Any]], k: int = 5) -> Dict[str, Any]:
         """
-        Perform sentence-level reranking:
-        1. Split each chunk into sentences
-        2. Score each sentence with CrossEncoder
-        3. Return top_k sentences with scores
+        Quality cost of the cascade against the full reranker.
+        labelled: [{"query", "candidates": [chunk...], "relevant": {chunk_id...},
+                    optional "query_vector", "vectors"}]
         """
-        sentence_entries = []
-        for chunk in chunks:
-            text = chunk["text"]
-            sentences = nltk.sent_tokenize(text)  # split chunk to sentences
-            for sent in sentences:
-                sentence_entries.append({
-                    "chunk_id": chunk["chunk_id"],
-                    "metadata": chunk.get("metadata", {}),
-                    "text": sent
-                })
-
-        if not sentence_entries:
-            return []
-
-        # prepare pairs (query, sentence)
-        pairs = [(query, s["text"]) for s in sentence_entries]
-        scores = self.model.predict(pairs)
-
-        # attach scores
-        for s, score in zip(sentence_entries, scores):
-            s["score"] = float(score)
-
-        # sort by score descending
-        sentence_entries.sort(key=lambda x: x["score"], reverse=True)
-
-        return sentence_entries[:top_k]
-'''
\ No newline at end of file
+        per_mode = {"full": [], "cascade": []}
+        overlap, large_pairs = [], {"full": 0, "cascade": 0}
+
+        for item in labelled:
+            ranked = {}
+            for mode in per_mode:
+                use_cascade = mode == "cascade"
+                candidates = item["candidates"]
+                if use_cascade and self.cascade:
+                    candidates = self._run_cascade(query=item["query"], chunks=candidates,
+                                                   query_vector=item.get("query_vector"),
+                                                   vectors=item.get("vectors"))
+                large_pairs[mode] += len(candidates)
+                ids = [r["chunk_id"] for r in self.rerank(item["query"], candidates, top_k=k, use_cascade=False)]
+                ranked[mode] = ids
+                relevant = set(item["relevant"])
+                per_mode[mode].append((recall_at_k(ids, relevant, k), mrr(ids, relevant), ndcg_at_k(ids, relevant, k)))
+            overlap.append(len(set(ranked["full"]) & set(ranked["cascade"])) / max(len(ranked["full"]), 1))
+
+        report = {"queries": len(labelled), "k": k}
+        for mode, rows in per_mode.items():
+            arr = np.array(rows) if rows else np.zeros((1, 3))
+            report[mode] = {
+                f"recall@{k}": float(arr[:, 0].mean()),
+                "mrr": float(arr[:, 1].mean()),
+                f"ndcg@{k}": float(arr[:, 2].mean()),
+                "large_model_pairs": large_pairs[mode],
+            }
+        report["ndcg_loss"] = report["full"][f"ndcg@{k}"] - report["cascade"][f"ndcg@{k}"]
+        report["topk_overlap"] = float(np.mean(overlap)) if overlap else 0.0
+        return report
+
+    # -------------------- Batching --------------------
+
+    def _truncate(self, query: str, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """Cut passages to the reranker window and return (texts, pair token lengths)."""
+        tokenizer = self.model.tokenizer
+        q_len = len(tokenizer(query, add_special_tokens=False)["input_ids"])
+        budget = max(self.max_length - q_len - 4, 1)  # room for CLS/SEP tokens
+
+        if not getattr(tokenizer, "is_fast", False):
+            enc = tokenizer(texts, add_special_tokens=False, truncation=True, max_length=budget)
+            return texts, [q_len + len(ids) + 4 for ids in enc["input_ids"]]
+
+        enc = tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=budget,
+            return_offsets_mapping=True
+        )
+        cut_texts, lengths = [], []
+        for text, ids, offsets in zip(texts, enc["input_ids"], enc["offset_mapping"]):
+            cut_texts.append(text[:offsets[-1][1]] if offsets else text)
+            lengths.append(q_len + len(ids) + 4)
+        return cut_texts, lengths
+
+    def _score_pairs(self, query: str, texts: List[str]) -> List[float]:
+        texts, lengths = self._truncate(query, texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        # pack length-sorted pairs so each batch pads to a similar length
+        batches, current = [], []
+        for i in order:
+            padded = (len(current) + 1) * lengths[i]
+            if current and (len(current) >= self.batch_size or padded > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+
+        scores = [0.0] * len(texts)
+        for batch in batches:
+            preds = self.model.predict(
+                [(query, texts[i]) for i in batch],
+                batch_size=len(batch),
+                show_progress_bar=False
+            )
+            for i, s in zip(batch, preds):
+                scores[i] = float(s)
+        return scores
+
+
+# -------------------- Cascade stages --------------------
+
+class CascadeStage(ABC):
+    name = "stage"
+
+    @abstractmethod
+    def score(self, query, chunks, query_vector=None, vectors=None) -> List[float]:
+        """Scores aligned with `chunks`; higher is better."""
+
+
+class BiEncoderStage(CascadeStage):
+    """Cosine between the query vector and the chunk vectors already in the index (no model call)."""
+    name = "bi-encoder"
+
+    def score(self, query, chunks, query_vector=None, vectors=None) -> List[float]:
+        if query_vector is None or vectors is None:
+            raise ValueError("bi-encoder stage needs query_vector and chunk vectors")
+        return (np.asarray(vectors, dtype="float32") @ np.asarray(query_vector, dtype="float32").ravel()).tolist()
+
+
+class CrossEncoderStage(CascadeStage):
+    """A small cross-encoder, with its own score cache."""
+
+    def __init__(self, model_name: str, **kwargs):
+        self.name = f"cross-encoder:{model_name}"
+        self.reranker = ReRanker(model_name, **kwargs)
+
+    def score(self, query, chunks, query_vector=None, vectors=None) -> List[float]:
+        return self.reranker.score(query, chunks)
+
+
+def make_stage(spec: Union[str, CascadeStage]) -> CascadeStage:
+    """'bi-encoder' | 'cross-encoder:<model name>' | CascadeStage instance"""
+    if isinstance(spec, CascadeStage):
+        return spec
+    if spec == "bi-encoder":
+        return BiEncoderStage()
+    if spec.startswith("cross-encoder:"):
+        return CrossEncoderStage(spec.split(":", 1)[1])
+    raise ValueError(f"Unknown cascade stage: {spec}")
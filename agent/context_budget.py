@@ -0,0 +1,207 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+'''
+Token-budgeted prompt context for the agent loop.
+
+Every prompt type gets a token budget. Step results and retrieved passages
+are counted with the model tokenizer, ranked by relevance to the task and
+recency, kept whole while they fit, compressed to a short head once they
+don't, and dropped last. Each request keeps a ContextUsage so the loop can
+report how many prompt tokens the budget saved compared with the fixed
+character slices the loop used before.
+'''
+
+DEFAULT_BUDGETS = {
+    "tool_input": 384,   # context in front of python/calculator input generation
+    "direct": 768,       # context for LLM reasoning steps
+    "passages": 768,     # retrieved text kept from one RAG step
+    "synthesis": 1536,   # step results in the final-answer prompt
+}
+
+# what the loop sent before budgets: step results cut to this many characters
+# (RAG passages were sent whole); the baseline for `saved_tokens`
+FIXED_SLICE_CHARS = {
+    "tool_input": 500,
+    "direct": 500,
+    "synthesis": 600,
+}
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class ContextEntry:
+    index: int
+    label: str
+    text: str
+    tokens: int
+
+
+class ContextUsage:
+    """
+    Per-request token accounting (thread safe, steps run concurrently).
+
+    raw: the candidate context untruncated; baseline: what the fixed
+    character slices would have sent; used: what the budget sent.
+    saved_tokens = baseline - used (negative if the budget sent more).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.raw_tokens = 0
+        self.baseline_tokens = 0
+        self.prompt_tokens = 0
+        self.by_kind: Dict[str, Dict[str, int]] = {}
+
+    def add(self, kind: str, raw: int, used: int, baseline: Optional[int] = None):
+        baseline = raw if baseline is None else baseline
+        with self._lock:
+            self.raw_tokens += raw
+            self.baseline_tokens += baseline
+            self.prompt_tokens += used
+            bucket = self.by_kind.setdefault(kind, {"raw": 0, "baseline": 0, "used": 0})
+            bucket["raw"] += raw
+            bucket["baseline"] += baseline
+            bucket["used"] += used
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.baseline_tokens - self.prompt_tokens
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "raw_tokens": self.raw_tokens,
+                "baseline_tokens": self.baseline_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "saved_tokens": self.baseline_tokens - self.prompt_tokens,
+                "by_kind": {k: dict(v) for k, v in self.by_kind.items()},
+            }
+
+
+class ContextBudget:
+    def __init__(
+        self,
+        tokenizer=None,
+        budgets: Optional[Dict[str, int]] = None,
+        compressed_tokens: int = 64,
+        recency_weight: float = 0.3
+    ):
+        # without a tokenizer (stub clients, tests) whitespace words stand in for tokens
+        self.tokenizer = tokenizer
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.compressed_tokens = compressed_tokens
+        self.recency_weight = recency_weight
+
+    # ---------------- Tokens ----------------
+    def _encode(self, text: str) -> List:
+        if self.tokenizer is None:
+            return text.split()
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def count(self, text: str) -> int:
+        return len(self._encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ids = self._encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        if self.tokenizer is None:
+            return " ".join(ids[:max_tokens]) + " ..."
+        return self.tokenizer.decode(ids[:max_tokens], skip_special_tokens=True) + " ..."
+
+    def entry(self, index: int, label: str, text) -> ContextEntry:
+        text = str(text)
+        return ContextEntry(index, label, text, self.count(text))
+
+    # ---------------- Selection ----------------
+    @staticmethod
+    def _relevance(query_words: set, text: str) -> float:
+        if not query_words:
+            return 0.0
+        return len(query_words & set(_WORD.findall(text.lower()))) / len(query_words)
+
+    def _ranked(self, query: str, entries: Sequence[ContextEntry]) -> List[ContextEntry]:
+        query_words = set(_WORD.findall(query.lower()))
+        n = len(entries)
+        age_rank = {pos: r for r, pos in enumerate(sorted(range(n), key=lambda i: entries[i].index))}
+
+        def score(pos):
+            recency = (age_rank[pos] + 1) / n
+            relevance = self._relevance(query_words, entries[pos].text)
+            return (1 - self.recency_weight) * relevance + self.recency_weight * recency
+
+        return [entries[i] for i in sorted(range(n), key=score, reverse=True)]
+
+    def select(
+        self,
+        kind: str,
+        query: str,
+        entries: Sequence[ContextEntry],
+        usage: Optional[ContextUsage] = None
+    ) -> List[ContextEntry]:
+        """
+        Fit `entries` into the `kind` budget. Highest scoring entries stay whole,
+        the rest are compressed to a share of what is left, whatever still
+        doesn't fit is dropped. Returned in plan order.
+        """
+        budget = self.budgets[kind]
+        remaining = budget
+        kept: List[ContextEntry] = []
+
+        overflow: List[ContextEntry] = []
+        for e in self._ranked(query, entries):
+            if e.tokens <= remaining:
+                kept.append(e)
+                remaining -= e.tokens
+            else:
+                overflow.append(e)
+
+        # what is left is shared among the entries that didn't fit, best first,
+        # never cutting one below `compressed_tokens`
+        for n, e in enumerate(overflow):
+            if remaining <= 0:
+                break
+            cut = min(max(self.compressed_tokens, remaining // (len(overflow) - n)), remaining)
+            kept.append(ContextEntry(e.index, e.label, self.truncate(e.text, cut), cut))
+            remaining -= cut
+
+        if usage is not None:
+            usage.add(kind, sum(e.tokens for e in entries), budget - remaining, self._baseline(kind, entries))
+        return sorted(kept, key=lambda e: e.index)
+
+    def _baseline(self, kind: str, entries: Sequence[ContextEntry]) -> int:
+        """Tokens the fixed character slices would have sent for these entries."""
+        chars = FIXED_SLICE_CHARS.get(kind)
+        if chars is None:
+            return sum(e.tokens for e in entries)
+        return sum(e.tokens if len(e.text) <= chars else self.count(e.text[:chars]) for e in entries)
+
+    def fit_passages(
+        self,
+        passages: Sequence[str],
+        usage: Optional[ContextUsage] = None
+    ) -> List[str]:
+        """Keep retrieved passages in rank order until the passage budget is spent."""
+        budget = self.budgets["passages"]
+        remaining = budget
+        kept, raw = [], 0
+
+        for text in passages:
+            tokens = self.count(text)
+            raw += tokens
+            if remaining <= 0:
+                continue
+            if tokens <= remaining:
+                kept.append(text)
+                remaining -= tokens
+            else:
+                kept.append(self.truncate(text, remaining))
+                remaining = 0
+
+        if usage is not None:
+            usage.add("passages", raw, budget - remaining)
+        return kept
@@ -0,0 +1,345 @@
+import math
+import time
+import queue
+import atexit
+import argparse
+import logging
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+'''
+SQLite persistence for AgentMemory episodes.
+
+One background thread owns the connection (WAL mode). Inserts are queued by
+the agent and written in grouped transactions of up to `batch_size` rows, so
+a step never waits for an fsync. Anything else that needs the database
+(startup snapshot, maintenance) is sent to the same thread as a callable, so
+the connection is never shared across threads. Pending rows are flushed on
+close() and at interpreter exit.
+
+Retention: episodes older than `retention_days` are compacted into per-tool,
+per-`bucket_seconds` rows of `tool_aggregates`, and aggregate buckets older
+than `aggregate_days` are dropped, so the file stays flat under steady
+traffic. maintain() compacts, checkpoints the WAL and returns free pages
+to the OS with `incremental_vacuum` (auto_vacuum=INCREMENTAL), a chunk of
+`vacuum_pages` at a time, each chunk queued behind pending inserts so
+writes keep flowing. A full VACUUM (which also switches databases created
+before incremental mode) blocks the writer and is left to the CLI:
+
+    python agent/episode_store.py --db agent_memory.db --retention-days 30 [--full-vacuum]
+'''
+
+Episode = Tuple[str, str, int, float]  # (query, tool, success, timestamp)
+
+
+class _Job:
+    __slots__ = ("fn", "future")
+
+    def __init__(self, fn: Callable[[sqlite3.Connection], Any]):
+        self.fn = fn
+        self.future: Future = Future()
+
+
+class EpisodeStore:
+    def __init__(
+        self,
+        db_path: str = "agent_memory.db",
+        batch_size: int = 256,
+        recent: int = 1000,
+        decay_lambda: float = 0.001,
+        retention_days: float = 30.0,
+        aggregate_days: float = 365.0,
+        bucket_seconds: int = 3600,
+        vacuum_pages: int = 2048
+    ):
+        """
+        batch_size: most rows written in one transaction
+        recent: episodes returned by the startup snapshot
+        decay_lambda: decay used for the snapshot's decayed per-tool counts
+        retention_days: raw episodes older than this are compacted into aggregates
+        aggregate_days: aggregate buckets older than this are dropped
+        bucket_seconds: width of one aggregate bucket
+        vacuum_pages: most free pages released per incremental vacuum step
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.recent = recent
+        self.decay_lambda = decay_lambda
+        self.retention = retention_days * 86400
+        self.aggregate_retention = aggregate_days * 86400
+        self.bucket_seconds = bucket_seconds
+        self.vacuum_pages = vacuum_pages
+        self.incremental_vacuum = False  # set on the writer thread once connected
+        self.stats = {"rows": 0, "transactions": 0}
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._ready: "Future" = Future()
+        self._writer = threading.Thread(target=self._loop, name="memory-writer", daemon=True)
+        self._writer.start()
+        # schema + startup snapshot are built on the writer thread
+        self.snapshot: Dict[str, Any] = self._ready.result()
+        atexit.register(self.close)
+
+    # -------------------- Writer thread --------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        # only takes effect on a new database (an existing one needs one full VACUUM)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS episodes (
+                query TEXT,
+                tool TEXT,
+                success INTEGER,
+                timestamp REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_tool ON episodes (tool)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_timestamp ON episodes (timestamp)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tool_aggregates (
+                tool TEXT,
+                bucket_start REAL,
+                success INTEGER,
+                fail INTEGER,
+                PRIMARY KEY (tool, bucket_start)
+            )
+        """)
+        conn.commit()
+        conn.create_function("exp", 1, math.exp, deterministic=True)
+        self.incremental_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        return conn
+
+    def _load_snapshot(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        """
+        Aggregates instead of a replay: lifetime per-tool counts, decayed
+        per-tool counts (as of now), total, newest episodes.
+        """
+        now = time.time()
+        tool_stats: Dict[str, Dict[str, int]] = {}
+        decayed: Dict[str, Dict[str, float]] = {}
+
+        def _merge(tool, ok, bad, d_ok, d_bad):
+            stats = tool_stats.setdefault(tool, {"success": 0, "fail": 0})
+            stats["success"] += int(ok or 0)
+            stats["fail"] += int(bad or 0)
+            counts = decayed.setdefault(tool, {"success": 0.0, "fail": 0.0})
+            counts["success"] += d_ok or 0.0
+            counts["fail"] += d_bad or 0.0
+
+        for row in conn.execute(
+            "SELECT tool, SUM(success), COUNT(*) - SUM(success), "
+            "SUM(success * exp(-? * (? - timestamp))), SUM((1 - success) * exp(-? * (? - timestamp))) "
+            "FROM episodes GROUP BY tool",
+            (self.decay_lambda, now, self.decay_lambda, now)
+        ):
+            _merge(*row)
+        # compacted buckets decay from their midpoint
+        half = self.bucket_seconds / 2
+        for row in conn.execute(
+            "SELECT tool, SUM(success), SUM(fail), "
+            "SUM(success * exp(-? * (? - bucket_start - ?))), SUM(fail * exp(-? * (? - bucket_start - ?))) "
+            "FROM tool_aggregates GROUP BY tool",
+            (self.decay_lambda, now, half, self.decay_lambda, now, half)
+        ):
+            _merge(*row)
+
+        count = sum(s["success"] + s["fail"] for s in tool_stats.values())
+        rows = conn.execute(
+            "SELECT query, tool, success, timestamp FROM episodes ORDER BY timestamp DESC LIMIT ?",
+            (self.recent,)
+        ).fetchall()
+        episodes = [
+            {"query": q, "tool": t, "success": bool(s), "timestamp": ts}
+            for q, t, s, ts in reversed(rows)
+        ]
+        return {
+            "tool_stats": tool_stats,
+            "decayed": decayed,
+            "as_of": now,
+            "episode_count": count,
+            "episodes": episodes,
+        }
+
+    def _compact(self, conn: sqlite3.Connection, now: float) -> Dict[str, int]:
+        cutoff = now - self.retention
+        with conn:
+            conn.execute(
+                "INSERT INTO tool_aggregates (tool, bucket_start, success, fail) "
+                "SELECT tool, CAST(timestamp / ? AS INTEGER) * ?, SUM(success), COUNT(*) - SUM(success) "
+                "FROM episodes WHERE timestamp < ? GROUP BY 1, 2 "
+                "ON CONFLICT (tool, bucket_start) DO UPDATE SET "
+                "success = success + excluded.success, fail = fail + excluded.fail",
+                (self.bucket_seconds, self.bucket_seconds, cutoff)
+            )
+            compacted = conn.execute("DELETE FROM episodes WHERE timestamp < ?", (cutoff,)).rowcount
+            dropped = conn.execute(
+                "DELETE FROM tool_aggregates WHERE bucket_start < ?",
+                (now - self.aggregate_retention,)
+            ).rowcount
+        return {"compacted_episodes": compacted, "dropped_buckets": dropped}
+
+    def _maintain(self, conn: sqlite3.Connection, now: float, full_vacuum: bool) -> Dict[str, Any]:
+        report = self._compact(conn, now)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if full_vacuum:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")  # rewrites the file; also switches it to incremental mode
+            self.incremental_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        report["episodes"] = conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+        report["buckets"] = conn.execute("SELECT COUNT(*) FROM tool_aggregates").fetchone()[0]
+        report["freed_pages"] = 0
+        return report
+
+    def _vacuum_step(self, conn: sqlite3.Connection) -> int:
+        """Release up to `vacuum_pages` free pages; returns how many are still free."""
+        conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def _write(self, conn: sqlite3.Connection, rows: List[Episode]):
+        with conn:  # one transaction for the whole batch
+            conn.executemany("INSERT INTO episodes VALUES (?, ?, ?, ?)", rows)
+        self.stats["rows"] += len(rows)
+        self.stats["transactions"] += 1
+
+    def _loop(self):
+        try:
+            conn = self._connect()
+            self._ready.set_result(self._load_snapshot(conn))
+        except BaseException as e:
+            self._ready.set_exception(e)
+            return
+
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [item for item in items if isinstance(item, tuple)]
+            try:
+                if rows:
+                    self._write(conn, rows)
+            except Exception:
+                logging.exception("writing %d memory episodes failed", len(rows))
+
+            stop = False
+            for item in items:
+                if item is None:
+                    stop = True
+                elif isinstance(item, _Job):
+                    try:
+                        item.future.set_result(item.fn(conn))
+                    except BaseException as e:
+                        item.future.set_exception(e)
+                self._queue.task_done()
+
+            if stop:
+                conn.close()
+                return
+
+    # -------------------- API --------------------
+
+    def add(self, query: str, tool: str, success: bool, timestamp: float):
+        self._queue.put((query, tool, int(success), timestamp))
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Run fn(conn) on the writer thread, after every row queued before it."""
+        job = _Job(fn)
+        self._queue.put(job)
+        return job.future
+
+    def maintain(self, vacuum: bool = True, now: Optional[float] = None, full_vacuum: bool = False) -> Future:
+        """
+        Compact old episodes into aggregates, checkpoint the WAL and, with
+        `vacuum`, release free pages in incremental steps. Each step is its own
+        job on the writer thread, so inserts queued meanwhile are written in
+        between. `full_vacuum` runs a blocking VACUUM instead (CLI use).
+        Returns a Future with the maintenance report.
+        """
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        done: Future = Future()
+
+        def _finish(report: Dict[str, Any]):
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            logging.info(f"memory maintenance on {self.db_path}: {report}")
+            done.set_result(report)
+
+        def _chain(job: Future, then: Callable[[Any], None]):
+            def _callback(f: Future):
+                if f.exception() is not None:
+                    done.set_exception(f.exception())
+                else:
+                    then(f.result())
+            job.add_done_callback(_callback)
+
+        def _vacuum(report: Dict[str, Any]):
+            def _step(conn):
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                left = self._vacuum_step(conn)
+                return before - left, left
+
+            def _after(result):
+                freed, left = result
+                report["freed_pages"] += freed
+                if freed and left:
+                    _chain(self.submit(_step), _after)  # behind whatever was queued meanwhile
+                else:
+                    _finish(report)
+
+            _chain(self.submit(_step), _after)
+
+        def _compacted(report: Dict[str, Any]):
+            if vacuum and not full_vacuum and self.incremental_vacuum:
+                _vacuum(report)
+            else:
+                if vacuum and not full_vacuum:
+                    logging.info(f"{self.db_path} predates incremental vacuum; run a full VACUUM once to switch it")
+                _finish(report)
+
+        _chain(self.submit(lambda conn: self._maintain(conn, now, full_vacuum)), _compacted)
+        return done
+
+    def flush(self):
+        """Block until every queued row is committed."""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and vacuum the agent memory database")
+    parser.add_argument("--db", default="agent_memory.db")
+    parser.add_argument("--retention-days", type=float, default=30.0)
+    parser.add_argument("--aggregate-days", type=float, default=365.0)
+    parser.add_argument("--bucket-seconds", type=int, default=3600)
+    parser.add_argument("--no-vacuum", action="store_true")
+    parser.add_argument("--full-vacuum", action="store_true", help="blocking VACUUM (switches old files to incremental mode)")
+    args = parser.parse_args()
+
+    store = EpisodeStore(
+        args.db,
+        retention_days=args.retention_days,
+        aggregate_days=args.aggregate_days,
+        bucket_seconds=args.bucket_seconds
+    )
+    print(store.maintain(vacuum=not args.no_vacuum, full_vacuum=args.full_vacuum).result())
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
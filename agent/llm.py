@@ -0,0 +1,464 @@
+import os
+import copy
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from core.tracing import tracer
+from prefix_cache import PrefixCache
+
+'''
+LLM client shared by the planner, router and agent loop.
+
+Concurrent `generate()` calls are put on one queue; a background worker
+collects them for up to `max_wait_ms` (or `max_batch_size` requests) and
+runs them as a single left-padded `model.generate` call. Each sequence stops
+on EOS or on its own `max_new_tokens`, and the batch ends as soon as every
+sequence is done. Prompts that start with a registered prefix reuse its
+precomputed KV cache (see prefix_cache.py).
+
+Speculative mode (opt-in): with a `draft_model` from the same tokenizer
+family, each request runs on its own and the draft proposes
+`num_draft_tokens` tokens per step that the main model verifies in one
+forward pass (transformers assisted generation). With greedy decoding the
+output matches plain decoding and only the speed changes; when sampling
+(the agent uses temperature 0.2) it follows the same distribution, but the
+individual samples differ. Set NEURORAG_DRAFT_MODEL to turn it on
+for get_client().
+'''
+
+DRAFT_MODEL_ENV = "NEURORAG_DRAFT_MODEL"
+
+
+@dataclass
+class GenerationRequest:
+    prompt: str
+    max_new_tokens: int
+    temperature: float
+    do_sample: bool
+    caller: str = "agent"
+    prefix: Optional[str] = None
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def batch_key(self) -> Tuple[bool, float, Optional[str]]:
+        # requests can only share a generate() call with the same sampling setup and prefix
+        return (self.do_sample, self.temperature if self.do_sample else 0.0, self.prefix)
+
+
+class _PerSequenceLimit(StoppingCriteria):
+    """Marks each sequence finished once it has produced its own max_new_tokens."""
+
+    def __init__(self, prompt_len: int, limits: List[int]):
+        self.prompt_len = prompt_len
+        self.limits = limits
+
+    def __call__(self, input_ids, scores, **kwargs):
+        generated = input_ids.shape[-1] - self.prompt_len
+        limits = torch.tensor(self.limits, device=input_ids.device)
+        return generated >= limits
+
+
+class _Cancelled(StoppingCriteria):
+    """Ends generation once `event` is set (the consumer of a stream went away)."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+_forward_counters = threading.local()
+_hooks_lock = threading.Lock()
+
+
+def _count_forward(module, args, output):
+    for counter in getattr(_forward_counters, "active", {}).get(id(module._forward_hooks), ()):
+        counter.calls += 1
+
+
+class _ForwardCounter:
+    """
+    Counts forward passes of a module made by the current thread while
+    active (used for draft acceptance).
+
+    Models are shared through the registry (the private draft too shares its
+    hooks with the registry's), so other threads may run the same module at
+    the same time: one hook is installed per module, once, and each thread
+    counts only its own calls.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.calls = 0
+        with _hooks_lock:
+            if not any(hook is _count_forward for hook in module._forward_hooks.values()):
+                module.register_forward_hook(_count_forward)
+
+    def __enter__(self):
+        if not hasattr(_forward_counters, "active"):
+            _forward_counters.active = {}
+        self.calls = 0
+        _forward_counters.active.setdefault(id(self.module._forward_hooks), []).append(self)
+        return self
+
+    def __exit__(self, *exc):
+        key = id(self.module._forward_hooks)
+        _forward_counters.active[key].remove(self)
+        if not _forward_counters.active[key]:
+            del _forward_counters.active[key]
+
+
+class LLMClient:
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        draft_model=None,
+        num_draft_tokens: int = 5
+    ):
+        """
+        max_batch_size: most prompts merged into one generate() call
+        max_wait_ms: how long the worker waits for more prompts after the first one
+        draft_model: small model sharing the tokenizer; enables speculative decoding
+        num_draft_tokens: tokens the draft proposes per verification step
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = {"requests": 0, "batches": 0, "streams": 0}
+        self.prefixes = PrefixCache(model, tokenizer)
+
+        self.draft_model = self._private_draft(draft_model, num_draft_tokens) if draft_model is not None else None
+        self.num_draft_tokens = num_draft_tokens
+        self.speculation = {"runs": 0, "generated": 0, "proposed": 0, "accepted": 0}
+        # one assisted run at a time per client: they update self.speculation
+        self._speculative_lock = threading.Lock()
+
+        self._queue: "queue.Queue[Optional[GenerationRequest]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def _private_draft(draft_model, num_draft_tokens: int):
+        """
+        The draft with its own generation_config and the same weights.
+
+        Assisted generation reads the proposal length from the draft's
+        generation_config (generate() kwargs only reach the main model's), and
+        the draft handle is shared through the registry, so the settings go on
+        a shallow copy instead of the shared module.
+        """
+        draft = copy.copy(draft_model)
+        config = copy.deepcopy(draft_model.generation_config)
+        config.num_assistant_tokens = num_draft_tokens
+        config.num_assistant_tokens_schedule = "constant"
+        # no confidence cut-off: the draft always proposes the full length
+        config.assistant_confidence_threshold = 0.0
+        draft.generation_config = config
+        return draft
+
+    @property
+    def pad_token_id(self) -> int:
+        if self.tokenizer.pad_token_id is not None:
+            return self.tokenizer.pad_token_id
+        return self.tokenizer.eos_token_id
+
+    # -------------------- Public API --------------------
+
+    def register_prefix(self, name: str, text: str, version: str = "1"):
+        """Static prompt prefix whose KV cache is computed once and reused."""
+        self.prefixes.register(name, text, version)
+
+    def submit(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+        caller: str = "agent",
+        prefix: Optional[str] = None
+    ) -> Future:
+        """prefix: name of a registered prefix that `prompt` starts with"""
+        prefix = self._check_prefix(prompt, prefix)
+        request = GenerationRequest(prompt, max_new_tokens, temperature, do_sample, caller, prefix)
+        self._queue.put(request)
+        return request.future
+
+    @property
+    def speculative(self) -> bool:
+        return self.draft_model is not None
+
+    def acceptance_rate(self) -> float:
+        """Share of draft-proposed tokens the main model accepted."""
+        proposed = self.speculation["proposed"]
+        return self.speculation["accepted"] / proposed if proposed else 0.0
+
+    def _check_prefix(self, prompt: str, prefix: Optional[str]) -> Optional[str]:
+        # the draft has to see the whole prompt, so speculative runs skip the prefix cache
+        if prefix is None or self.speculative or not self.prefixes.has(prefix):
+            return None
+        # a prompt that drifted from the registered text is simply run uncached
+        return prefix if prompt.startswith(self.prefixes.text(prefix)) else None
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """Blocking generation (batched with any concurrent callers)."""
+        return self.submit(prompt, **kwargs).result()
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        return await asyncio.wrap_future(self.submit(prompt, **kwargs))
+
+    def generate_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """Submit several prompts at once; they land in the same batch when they fit."""
+        futures = [self.submit(p, **kwargs) for p in prompts]
+        return [f.result() for f in futures]
+
+    def stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+        caller: str = "agent",
+        prefix: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Yield decoded text pieces as they are generated (single sequence, not batched).
+        Closing the iterator early stops decoding at the next token.
+        """
+        inputs = self._encode([prompt], self._check_prefix(prompt, prefix))
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = threading.Event()
+        kwargs = dict(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=do_sample,
+            pad_token_id=self.pad_token_id,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([_Cancelled(cancelled)])
+        )
+        if do_sample:
+            kwargs["temperature"] = temperature
+
+        error: List[BaseException] = []
+
+        def _generate():
+            try:
+                if self.speculative:
+                    self._generate_speculative(kwargs, inputs["input_ids"].shape[-1], caller)
+                    return
+                with torch.no_grad():
+                    self.model.generate(**kwargs)
+            except BaseException as e:  # surfaced to the consumer below
+                error.append(e)
+                streamer.end()
+
+        self.stats["streams"] += 1
+        tracer.count("llm.prompt_tokens", inputs["input_ids"].shape[-1], caller=caller)
+        thread = threading.Thread(target=_generate, name="llm-stream", daemon=True)
+        thread.start()
+        try:
+            for piece in streamer:
+                if piece:
+                    yield piece
+        finally:
+            # on early close, let the generate() thread stop instead of decoding to the end
+            cancelled.set()
+        thread.join()
+        if error:
+            raise error[0]
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    # -------------------- Batching worker --------------------
+
+    def _collect(self, first: GenerationRequest) -> List[GenerationRequest]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # keep the shutdown signal for the loop
+                break
+            batch.append(request)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            groups: Dict[Tuple, List[GenerationRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.batch_key, []).append(request)
+
+            for requests in groups.values():
+                try:
+                    if self.speculative:
+                        texts = [self._run_speculative(r) for r in requests]
+                    else:
+                        texts = self._run_batch(requests)
+                except Exception as e:
+                    for r in requests:
+                        r.future.set_exception(e)
+                else:
+                    for r, text in zip(requests, texts):
+                        r.future.set_result(text)
+
+    def _run_batch(self, requests: List[GenerationRequest]) -> List[str]:
+        now = time.perf_counter()
+        for r in requests:
+            tracer.observe("llm.queue_wait", now - r.enqueued_at)
+
+        inputs = self._encode([r.prompt for r in requests], requests[0].prefix)
+        prompt_len = inputs["input_ids"].shape[-1]
+        limits = [r.max_new_tokens for r in requests]
+        kwargs = dict(
+            **inputs,
+            max_new_tokens=max(limits),
+            do_sample=requests[0].do_sample,
+            pad_token_id=self.pad_token_id,
+            stopping_criteria=StoppingCriteriaList([_PerSequenceLimit(prompt_len, limits)])
+        )
+        if requests[0].do_sample:
+            kwargs["temperature"] = requests[0].temperature
+
+        with tracer.span("llm.batch", size=len(requests), prompt_tokens=prompt_len) as span, torch.no_grad():
+            outputs = self.model.generate(**kwargs)
+            span.set("steps", outputs.shape[-1] - prompt_len)
+
+        self.stats["requests"] += len(requests)
+        self.stats["batches"] += 1
+
+        texts = []
+        for i, r in enumerate(requests):
+            generated = outputs[i, prompt_len:prompt_len + r.max_new_tokens]
+            n_prompt = int(inputs["attention_mask"][i].sum())
+            n_new = int((generated != self.pad_token_id).sum())
+            tracer.count("llm.prompt_tokens", n_prompt, caller=r.caller)
+            tracer.count("llm.generated_tokens", n_new, caller=r.caller)
+            texts.append(self.tokenizer.decode(generated, skip_special_tokens=True).strip())
+        return texts
+
+    def _run_speculative(self, request: GenerationRequest) -> str:
+        tracer.observe("llm.queue_wait", time.perf_counter() - request.enqueued_at)
+        inputs = self._encode([request.prompt])
+        prompt_len = inputs["input_ids"].shape[-1]
+        kwargs = dict(
+            **inputs,
+            max_new_tokens=request.max_new_tokens,
+            do_sample=request.do_sample,
+            pad_token_id=self.pad_token_id
+        )
+        if request.do_sample:
+            kwargs["temperature"] = request.temperature
+
+        outputs = self._generate_speculative(kwargs, prompt_len, request.caller)
+        self.stats["requests"] += 1
+        self.stats["batches"] += 1
+        tracer.count("llm.prompt_tokens", prompt_len, caller=request.caller)
+        return self.tokenizer.decode(outputs[0, prompt_len:], skip_special_tokens=True).strip()
+
+    def _generate_speculative(self, kwargs: Dict, prompt_len: int, caller: str):
+        """
+        One assisted generate() call. Every main-model forward verifies a draft
+        run and emits the accepted tokens plus one of its own, so
+        accepted = generated - main forwards; proposed = draft forwards.
+        """
+        with self._speculative_lock, torch.no_grad(), \
+                tracer.span("llm.speculative", prompt_tokens=prompt_len, draft=self.num_draft_tokens) as span, \
+                _ForwardCounter(self.model) as main, _ForwardCounter(self.draft_model) as draft:
+            outputs = self.model.generate(**kwargs, assistant_model=self.draft_model)
+            generated = outputs.shape[-1] - prompt_len
+            accepted = max(generated - main.calls, 0)
+            span.set("generated", generated)
+            span.set("accepted", accepted)
+
+            stats = self.speculation
+            stats["runs"] += 1
+            stats["generated"] += generated
+            stats["proposed"] += draft.calls
+            stats["accepted"] += accepted
+
+        tracer.count("llm.generated_tokens", generated, caller=caller)
+        tracer.count("llm.draft_proposed_tokens", draft.calls, caller=caller)
+        tracer.count("llm.draft_accepted_tokens", accepted, caller=caller)
+        return outputs
+
+    def _encode(self, prompts: List[str], prefix: Optional[str] = None) -> Dict:
+        """
+        generate() inputs for a batch. Without a prefix: left-padded prompts.
+        With a prefix: [prefix][pad...][suffix] rows plus a copy of the prefix
+        KV cache, so only the suffix tokens are encoded.
+        """
+        if prefix is None:
+            # generated tokens must line up at the end; per call, the tokenizer is shared across threads
+            enc = self.tokenizer(prompts, return_tensors="pt", padding=True, padding_side="left")
+            return dict(enc.to(self.model.device))
+
+        entry = self.prefixes.get(prefix)
+        suffixes = self.tokenizer(
+            [p[len(entry.text):] for p in prompts],
+            add_special_tokens=False
+        )["input_ids"]
+        width = max(len(ids) for ids in suffixes)
+        prefix_ids = entry.input_ids[0].tolist()
+
+        rows, masks = [], []
+        for ids in suffixes:
+            pad = width - len(ids)
+            rows.append(prefix_ids + [self.pad_token_id] * pad + ids)
+            masks.append([1] * len(prefix_ids) + [0] * pad + [1] * len(ids))
+
+        tracer.count("llm.prefix_tokens_reused", entry.length * len(prompts), prefix=prefix)
+        device = self.model.device
+        return {
+            "input_ids": torch.tensor(rows, device=device),
+            "attention_mask": torch.tensor(masks, device=device),
+            "past_key_values": entry.expand(len(prompts)),
+        }
+
+
+# -------------------- Shared clients --------------------
+
+_clients: Dict[int, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(model, tokenizer, **kwargs) -> LLMClient:
+    """
+    One client (and so one request queue) per loaded model.
+    Speculative decoding is enabled when NEURORAG_DRAFT_MODEL names a draft
+    model (loaded through the registry) and no draft_model is passed.
+    """
+    with _clients_lock:
+        client = _clients.get(id(model))
+        if client is None:
+            draft_name = os.environ.get(DRAFT_MODEL_ENV)
+            if draft_name and "draft_model" not in kwargs:
+                from core.model_registry import registry
+                kwargs["draft_model"], _ = registry.causal_lm(draft_name)
+            client = _clients[id(model)] = LLMClient(model, tokenizer, **kwargs)
+        return client
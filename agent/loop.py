@@ -1,32 +1,48 @@
 import re
-import torch
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 
 from planner import generate_plan
-from router import route_step
+from router import StepRouter
+from step_graph import build_step_graph, execute_graph
+from context_budget import ContextBudget, ContextUsage
+from tool_cache import ToolCache
+from llm import get_client
+from core.tracing import tracer
 
 class FullAgentSystem:
-    def __init__(self, model, tokenizer, tools, memory, rag_tool):
+    def __init__(self, model, tokenizer, tools, memory, rag_tool, llm=None, max_parallel_steps=4,
+                 context_budgets=None, tool_cache=None):
         self.model = model
         self.tokenizer = tokenizer
         self.tools = tools  # {"python": tool, "calculator": calc}
         self.memory = memory
         self.rag_tool = rag_tool
+        # shared batching client; planner and router go through the same queue
+        self.llm = llm or get_client(model, tokenizer)
+        # keyword -> memory-trained classifier -> batched LLM fallback
+        self.router = StepRouter(self.llm, memory)
+        # independent plan steps run concurrently on this many workers
+        self.max_parallel_steps = max_parallel_steps
+        # token budgets per prompt type, counted with the model tokenizer
+        self.context = ContextBudget(tokenizer, context_budgets)
+        # rag/calculator/python results keyed on tool, normalized input and version
+        self.tool_cache = tool_cache if tool_cache is not None else ToolCache()
 
     def _call_llm(self, prompt, max_tokens=512):
         """Responsible for calling the LLM to generate text"""
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
+        with tracer.span("llm.generate", max_new_tokens=max_tokens):
+            return self.llm.generate(
+                prompt,
                 max_new_tokens=max_tokens,
                 temperature=0.2,
                 do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
+                caller="agent"
             )
-        return self.tokenizer.decode(
-            outputs[0][inputs.input_ids.shape[-1]:],
-            skip_special_tokens=True
-        ).strip()
 
     def _prepare_tool_input(self, step_text, tool_name, context=""):
         """
@@ -60,104 +76,328 @@ class FullAgentSystem:
         return clean_output
 
     def run(self, user_query):
-        print("🚀 Starting Agentic Pipeline (with Context Passing)...")
+        """Run the whole pipeline and return the final answer."""
+        answer = None
+        for event in self.stream(user_query):
+            if event["type"] == "answer":
+                answer = event["text"]
+        return answer
+
+    def stream(
+        self,
+        user_query,
+        cancel: Optional[threading.Event] = None,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Run the pipeline, yielding events as they happen:
+            plan, routes, step_started, tool_output, step_finished,
+            answer_token (one per decoded piece), answer
+
+        cancel: set it (or close the iterator) to stop early; steps not yet
+            started are skipped and synthesis stops at the next token.
+        on_done: called once the run has really stopped, including steps
+            that were still running when the iterator was closed (admission
+            control holds its slot until then).
+        """
+        cancel = cancel if cancel is not None else threading.Event()
+        workers: List[threading.Thread] = []
+        try:
+            yield from self._stream(user_query, cancel, workers)
+        finally:
+            # finished, or the consumer went away: the plan thread stops picking up steps
+            cancel.set()
+            if on_done is not None:
+                _after_threads(workers, on_done)
+
+    def _stream(self, user_query, cancel: threading.Event, workers: List[threading.Thread]) -> Iterator[Dict[str, Any]]:
+        run_start = time.perf_counter()
 
         # 1. Planning phase
-        plan_raw = generate_plan(user_query)
+        with tracer.span("agent.plan"):
+            plan_raw = generate_plan(user_query, self.llm)
         steps = [s.strip() for s in plan_raw.strip().split('\n') if s.strip()]
-        print(f"📝 Plan:\n{plan_raw}\n" + "-" * 40)
+        yield {"type": "plan", "plan": plan_raw, "steps": steps}
+        if cancel.is_set():
+            return
+
+        # Route the whole plan at once: only uncertain steps reach the LLM, in one batch
+        with tracer.span("agent.route", steps=len(steps)):
+            routes = self.router.route_steps(steps)
+        yield {"type": "routes", "routes": routes}
+
+        # 2. Step execution: independent steps run concurrently, each one
+        # only sees the results of the steps it depends on
+        graph = build_step_graph(steps, routes)
+        events: "queue.Queue" = queue.Queue()
+        usage = ContextUsage()
+        outcome = []
+
+        def _execute():
+            try:
+                outcome.append(execute_graph(
+                    graph,
+                    lambda node, results: self._run_plan_step(node, results, events, usage, cancel),
+                    max_workers=self.max_parallel_steps,
+                    serial=self._runs_serially
+                ))
+            except BaseException as e:
+                outcome.append(e)
+            finally:
+                events.put(None)
+
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(_execute,), name="agent-plan")
+        workers.append(worker)
+        worker.start()
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+        worker.join()
+        if isinstance(outcome[0], BaseException):
+            raise outcome[0]
+        if cancel.is_set():
+            return
+        results = outcome[0]
 
+        # Merge in plan order
         final_report = []
-        accumulated_context = ""  # Working memory passed across steps
+        for node in graph:
+            result = results[node.index]
+            tool_name = node.route["tool_name"]
+            with tracer.span("agent.memory"):
+                self.memory.add_interaction(node.text, tool_name or node.route["route"], result)
+            final_report.append({
+                "step": node.text,
+                "output": result.get("output")
+            })
 
-        # 2. Step execution loop
-        for i, step in enumerate(steps, 1):
-            print(f"\n🔍 Processing Step {i}: {step}")
-            route_info = route_step(step, self.model, self.tokenizer)
-            route = route_info["route"]
-            tool_name = route_info["tool_name"]
+        # 3. Final answer synthesis, streamed token by token
+        synthesis_start = time.perf_counter()
+        pieces = []
+        tokens = self.llm.stream(
+            self._final_answer_prompt(user_query, final_report, usage),
+            max_new_tokens=1024,
+            temperature=0.2,
+            do_sample=True,
+            caller="agent"
+        )
+        try:
+            for piece in tokens:
+                if cancel.is_set():
+                    return
+                if not pieces:
+                    tracer.observe("agent.answer_first_token", time.perf_counter() - synthesis_start)
+                pieces.append(piece)
+                yield {"type": "answer_token", "text": piece}
+        finally:
+            # stops decoding if we leave early
+            tokens.close()
 
-            print(f"🧠 LLM Router Decision: {route} | Tool: {tool_name}")
+        tracer.observe("agent.synthesis", time.perf_counter() - synthesis_start)
+        tracer.observe("agent.run", time.perf_counter() - run_start)
+        # counters only go up; a request where the budget sent more than the old slices adds 0
+        tracer.count("agent.context_tokens_saved", max(usage.saved_tokens, 0))
+        yield {"type": "answer", "text": "".join(pieces).strip(), "context": usage.as_dict()}
 
-            result = {"status": "error", "output": "No execution"}
+    async def astream(self, user_query) -> AsyncIterator[Dict[str, Any]]:
+        """Async version of stream(); the pipeline runs on a worker thread."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancel = threading.Event()
 
+        def _emit(item):
             try:
-                if route == "rag":
-                    print("📡 Action: RAG Retrieval...")
-                    result = self.rag_tool.run(step)
-                    if result["status"] == "success":
-                        # Aggregate retrieved documents into a single output
-                        content = " ".join([d["text"] for d in result["results"]])
-                        result["output"] = content
-
-                elif route == "tool":
-                    print(f"🛠️ Action: Using {tool_name}...")
-                    # Pass accumulated context so tools can leverage previous knowledge
+                loop.call_soon_threadsafe(events.put_nowait, item)
+            except RuntimeError:
+                # the event loop is closed: nobody is listening any more
+                cancel.set()
+
+        def _produce():
+            stream = self.stream(user_query, cancel)
+            try:
+                for event in stream:
+                    if cancel.is_set():
+                        break
+                    _emit(event)
+            except BaseException as e:
+                _emit(e)
+            finally:
+                stream.close()
+                _emit(done)
+
+        threading.Thread(target=_produce, name="agent-astream", daemon=True).start()
+        try:
+            while True:
+                event = await events.get()
+                if event is done:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            # consumer finished or abandoned us (break, aclose, task cancelled)
+            cancel.set()
+
+    def _runs_serially(self, node):
+        """Python steps overlap only when the tool runs code outside this process."""
+        if node.route.get("tool_name") != "python":
+            return False
+        return not getattr(self.tools.get("python"), "isolated", False)
+
+    def _context_for(self, node, results, usage=None):
+        """Working memory for a step: budgeted results of the steps it depends on, in plan order."""
+        entries = [
+            self.context.entry(i, f"Step {i} Result Summary", results[i].get("output", ""))
+            for i in sorted(node.deps)
+            # only successful information is worth carrying forward
+            if results[i].get("status") == "success"
+        ]
+        if not entries:
+            return ""
+        kind = "tool_input" if node.route["route"] == "tool" else "direct"
+        return "".join(
+            f"\n[{e.label}]: {e.text}\n"
+            for e in self.context.select(kind, node.text, entries, usage)
+        )
+
+    def _run_plan_step(self, node, results, events=None, usage=None, cancel=None):
+        if cancel is not None and cancel.is_set():
+            return {"status": "cancelled", "output": ""}
+        emit = events.put if events is not None else (lambda event: None)
+        route = node.route["route"]
+        tool_name = node.route["tool_name"]
+        emit({"type": "step_started", "index": node.index, "step": node.text,
+              "route": route, "tool_name": tool_name, "tier": node.route.get("tier")})
+
+        with tracer.span("agent.step", index=node.index, deps=len(node.deps)) as step_span:
+            step_span.set("route", tool_name or route)
+            result = self._execute_step(node.text, route, tool_name, self._context_for(node, results, usage), usage)
+            step_span.set("status", result.get("status"))
+
+        emit({"type": "tool_output", "index": node.index, "tool": tool_name or route,
+              "status": result.get("status"), "output": result.get("output")})
+        emit({"type": "step_finished", "index": node.index, "status": result.get("status")})
+        return result
+
+    def _cached_tool_call(self, tool_name, tool, tool_input, call):
+        """Serve a deterministic tool call from the cache, or run it and store the result."""
+        if not self.tool_cache.cacheable(tool_name, tool_input):
+            return call()
+
+        version = str(getattr(tool, "version", "1"))
+        result = self.tool_cache.get(tool_name, tool_input, version)
+        hit = result is not None
+        self.memory.record_cache_lookup(tool_name, hit)
+        tracer.count("agent.tool_cache", tool=tool_name, result="hit" if hit else "miss")
+        if hit:
+            return result
+
+        result = call()
+        self.tool_cache.put(tool_name, tool_input, result, version)
+        return result
+
+    def _execute_step(self, step, route, tool_name, accumulated_context, usage=None):
+        """Run one routed step and return the tool result dict."""
+        result = {"status": "error", "output": "No execution"}
+
+        try:
+            if route == "rag":
+                with tracer.span("agent.tool.rag") as span:
+                    result = self._cached_tool_call("rag", self.rag_tool, step, lambda: self.rag_tool.run(step))
+                    span.set("results", len(result.get("results", [])))
+                if result["status"] == "success":
+                    # Aggregate retrieved documents (best first) up to the passage budget
+                    passages = self.context.fit_passages([d["text"] for d in result["results"]], usage)
+                    content = " ".join(passages)
+                    result["output"] = content
+
+            elif route == "tool":
+                # Pass accumulated context so tools can leverage previous knowledge
+                with tracer.span("agent.tool_input", tool=tool_name):
                     refined_input = self._prepare_tool_input(
                         step,
                         tool_name,
                         context=accumulated_context
                     )
 
+                with tracer.span(f"agent.tool.{tool_name}"):
                     if tool_name == "python":
-                        print("💻 Executing Python code...")
-                        result = self.tools["python"].run_code(refined_input)
+                        tool = self.tools["python"]
+                        result = self._cached_tool_call("python", tool, refined_input, lambda: tool.run_code(refined_input))
                     elif tool_name == "calculator":
-                        result = self.tools["calculator"].run(refined_input)
-
-                elif route == "direct":
-                    print("🤖 Action: LLM Reasoning (using previous context)...")
-                    # Key idea: LLM reasons using accumulated context
-                    prompt_with_context = (
-                        f"Context from previous steps: {accumulated_context}\n"
-                        f"Task: {step}\n"
-                        "Instruction: Use the context above to complete the task."
-                    )
-                    result = {
-                        "status": "success",
-                        "output": self._call_llm(prompt_with_context)
-                    }
-
-            except Exception as e:
-                result = {"status": "error", "output": str(e)}
-
-            # Update accumulated context with new successful information
-            if result.get("status") == "success":
-                new_info = str(result.get("output", ""))
-                # Add a concise summary so future steps can reference it
-                accumulated_context += (
-                    f"\n[Step {i} Result Summary]: "
-                    f"{new_info[:500]}...\n"
+                        tool = self.tools["calculator"]
+                        result = self._cached_tool_call("calculator", tool, refined_input, lambda: tool.run(refined_input))
+
+            elif route == "direct":
+                # Key idea: LLM reasons using accumulated context
+                prompt_with_context = (
+                    f"Context from previous steps: {accumulated_context}\n"
+                    f"Task: {step}\n"
+                    "Instruction: Use the context above to complete the task."
                 )
+                result = {
+                    "status": "success",
+                    "output": self._call_llm(prompt_with_context)
+                }
 
-            print(f"📥 Result Status: {result.get('status')}")
-            self.memory.add_interaction(step, tool_name or route, result)
-            final_report.append({
-                "step": step,
-                "output": result.get("output")
-            })
+        except Exception as e:
+            result = {"status": "error", "output": str(e)}
 
-        # 3. Final answer synthesis
-        print("\n" + "=" * 50)
-        print("🎯 Generating Final Answer...")
-        self._generate_final_answer(user_query, final_report)
+        tracer.count("agent.steps", route=tool_name or route, status=result.get("status"))
+        return result
 
-    def _generate_final_answer(self, query, report):
-        # Aggregate all step outputs into a single synthesis prompt
+    def _final_answer_prompt(self, query, report, usage=None):
+        # Aggregate step outputs into a single synthesis prompt within the synthesis budget
+        entries = [
+            self.context.entry(i, item["step"], item["output"])
+            for i, item in enumerate(report, start=1)
+        ]
         summary_prompt = f"User Question: {query}\nStep-by-Step Execution Results:\n"
-        for item in report:
+        for e in self.context.select("synthesis", query, entries, usage):
             summary_prompt += (
-                f"- Step: {item['step']}\n"
-                f"  Result: {str(item['output'])[:600]}\n"
+                f"- Step: {e.label}\n"
+                f"  Result: {e.text}\n"
             )
 
         summary_prompt += (
             "\nSynthesize a complete, professional, and helpful final response in Same Languge. "
             "Integrate the code and calculations found above:"
         )
+        return summary_prompt
+
+
+def _after_threads(threads: List[threading.Thread], callback: Callable[[], None]):
+    """Call `callback` once every thread has exited (right away if they already have)."""
+    alive = [t for t in threads if t.is_alive()]
+    if not alive:
+        callback()
+        return
+
+    def _wait():
+        for t in alive:
+            t.join()
+        callback()
 
-        final_answer = self._call_llm(summary_prompt, max_tokens=1024)
-        print("\n" + "*" * 20 + " Final Answer " + "*" * 20)
-        print(final_answer)
+    threading.Thread(target=_wait, name="agent-drain", daemon=True).start()
 
 
+def print_event(event: Dict[str, Any]):
+    """Console rendering of FullAgentSystem.stream() events."""
+    kind = event["type"]
+    if kind == "plan":
+        print(f"📝 Plan:\n{event['plan']}\n" + "-" * 40)
+    elif kind == "step_started":
+        print(f"\n🔍 Processing Step {event['index']}: {event['step']}")
+        print(f"🧠 Router Decision ({event['tier']}): {event['route']} | Tool: {event['tool_name']}")
+    elif kind == "step_finished":
+        print(f"📥 Step {event['index']} Result Status: {event['status']}")
+    elif kind == "answer_token":
+        print(event["text"], end="", flush=True)
+    elif kind == "answer":
+        print()
+        context = event.get("context")
+        if context:
+            print(f"✂️ Prompt tokens: {context['prompt_tokens']} (saved {context['saved_tokens']})")
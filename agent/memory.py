@@ -1,9 +1,42 @@
 import time
-import sqlite3
+import queue
+import logging
+import threading
 from collections import deque, defaultdict
 from typing import List, Dict, Any, Optional
 import numpy as np
 
+from core.model_registry import registry
+from semantic_memory import SemanticMemory
+from episode_store import EpisodeStore
+
+
+def _log_maintenance_failure(future):
+    if future.exception() is not None:
+        logging.error("memory maintenance failed", exc_info=future.exception())
+
+
+class DecayedRate:
+    """Exponentially decayed success/fail counts for one tool, updated in O(1)."""
+
+    __slots__ = ("success", "fail", "updated_at")
+
+    def __init__(self, success: float = 0.0, fail: float = 0.0, updated_at: float = 0.0):
+        self.success = success
+        self.fail = fail
+        self.updated_at = updated_at
+
+    def update(self, success: bool, timestamp: float, decay_lambda: float):
+        w = float(np.exp(-decay_lambda * max(timestamp - self.updated_at, 0.0)))
+        self.success = self.success * w + (1.0 if success else 0.0)
+        self.fail = self.fail * w + (0.0 if success else 1.0)
+        self.updated_at = timestamp
+
+    def rate(self, now: float, decay_lambda: float) -> float:
+        """Laplace-smoothed success rate; stale evidence drifts back towards 0.5."""
+        w = float(np.exp(-decay_lambda * max(now - self.updated_at, 0.0)))
+        return (self.success * w + 1.0) / ((self.success + self.fail) * w + 2.0)
+
 
 class AgentMemory:
     def __init__(
@@ -11,36 +44,74 @@ class AgentMemory:
         max_short_term: int = 20,
         decay_lambda: float = 0.001,
         db_path: str = "agent_memory.db",
-        embed_fn=None
+        embed_fn=None,
+        embed_model: Optional[str] = None,
+        embed_batch_fn=None,
+        semantic_capacity: int = 100_000,
+        embed_batch_size: int = 64,
+        recent_episodes: int = 1000,
+        write_batch_size: int = 256,
+        retention_days: float = 30.0,
+        maintenance_interval: Optional[float] = 24 * 3600
     ):
         """
         max_short_term: LRU size for short-term memory
         decay_lambda: decay factor for old episodes
         embed_fn: function(text:str) -> np.ndarray
+        embed_model: if no embed_fn is given, use this model from the shared
+                     registry (same instance as the retriever's embedder)
+        embed_batch_fn: function(texts:List[str]) -> np.ndarray (n, dim); used to
+                        embed new episodes in batches (defaults to embed_fn per text)
+        semantic_capacity: most episodes kept in semantic memory (decay-weighted eviction)
+        embed_batch_size: most episodes embedded in one background batch
+        recent_episodes: episodes kept in memory (all of them stay in the database)
+        write_batch_size: most episodes committed in one background transaction
+        retention_days: raw episodes older than this are compacted into per-tool aggregates
+        maintenance_interval: seconds between background compaction + incremental vacuum runs (None: never)
         """
+        if embed_fn is None and embed_model is not None:
+            embed_fn = registry.embed_fn(embed_model)
+            embed_batch_fn = embed_batch_fn or registry.embed_batch_fn(embed_model)
+
+        # persistence runs on its own writer thread; startup state comes from aggregates
+        self.store = EpisodeStore(
+            db_path,
+            batch_size=write_batch_size,
+            recent=recent_episodes,
+            decay_lambda=decay_lambda,
+            retention_days=retention_days
+        )
+        snapshot = self.store.snapshot
+        self.maintenance_interval = maintenance_interval
+        self._last_maintenance = time.time()
+
         self.short_term = deque(maxlen=max_short_term)
-        self.episodes = []
+        self.episodes = deque(snapshot["episodes"], maxlen=recent_episodes)
+        self._episode_count = snapshot["episode_count"]
         self.tool_stats = defaultdict(lambda: {"success": 0, "fail": 0})
-        self.semantic_memory = []  # list of (embedding, tool)
+        for tool, stats in snapshot["tool_stats"].items():
+            self.tool_stats[tool].update(stats)
+        # decayed success rates drive tool selection; never recomputed from history
+        self.tool_rates: Dict[str, DecayedRate] = {
+            tool: DecayedRate(c["success"], c["fail"], snapshot["as_of"])
+            for tool, c in snapshot["decayed"].items()
+        }
+        # tool-result cache lookups seen by the agent loop (steps run on parallel threads)
+        self.cache_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._cache_stats_lock = threading.Lock()
+        # (embedding, tool) for successful steps, as one normalized matrix
+        self.semantic = SemanticMemory(capacity=semantic_capacity, decay_lambda=decay_lambda)
         self.decay_lambda = decay_lambda
         self.embed_fn = embed_fn
+        self.embed_batch_fn = embed_batch_fn
+        self.embed_batch_size = embed_batch_size
 
-        self.conn = sqlite3.connect(db_path)
-        self._init_db()
-
-    # -------------------- DB --------------------
-
-    def _init_db(self):
-        cur = self.conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS episodes (
-                query TEXT,
-                tool TEXT,
-                success INTEGER,
-                timestamp REAL
-            )
-        """)
-        self.conn.commit()
+        # new episodes are embedded off the request path, in batches
+        self._embed_queue: "queue.Queue" = queue.Queue()
+        self._embedder = None
+        if embed_fn is not None or embed_batch_fn is not None:
+            self._embedder = threading.Thread(target=self._embed_loop, name="memory-embedder", daemon=True)
+            self._embedder.start()
 
     # -------------------- Add Interaction --------------------
 
@@ -64,58 +135,110 @@ class AgentMemory:
             "timestamp": ts
         }
         self.episodes.append(episode)
+        self._episode_count += 1
 
-        # persist
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO episodes VALUES (?, ?, ?, ?)",
-            (query, tool, int(success), ts)
-        )
-        self.conn.commit()
+        # persist (batched by the writer thread)
+        self.store.add(query, tool, success, ts)
 
         # tool statistics
         if success:
             self.tool_stats[tool]["success"] += 1
         else:
             self.tool_stats[tool]["fail"] += 1
-
-        # semantic memory
-        if self.embed_fn is not None:
-            emb = self.embed_fn(query)
-            self.semantic_memory.append((emb, tool))
+        self.tool_rates.setdefault(tool, DecayedRate(updated_at=ts)).update(success, ts, self.decay_lambda)
+
+        # scheduled retention: compaction + incremental vacuum run on the writer thread
+        if self.maintenance_interval is not None and ts - self._last_maintenance >= self.maintenance_interval:
+            self._last_maintenance = ts
+            self.store.maintain().add_done_callback(_log_maintenance_failure)
+
+        # semantic memory: remember which tool worked for this kind of query
+        if self._embedder is not None and success:
+            self._embed_queue.put((query, tool, ts))
+
+    # -------------------- Background embedding --------------------
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        if self.embed_batch_fn is not None:
+            return np.asarray(self.embed_batch_fn(texts), dtype="float32")
+        return np.vstack([self.embed_fn(t) for t in texts]).astype("float32")
+
+    def _embed_loop(self):
+        while True:
+            batch = [self._embed_queue.get()]
+            while len(batch) < self.embed_batch_size:
+                try:
+                    batch.append(self._embed_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    queries, tools, stamps = zip(*items)
+                    self.semantic.add(self._embed_texts(list(queries)), tools, stamps)
+            except Exception:
+                logging.exception("embedding %d memory episodes failed", len(items))
+            finally:
+                for _ in batch:
+                    self._embed_queue.task_done()
+
+            if len(items) < len(batch):
+                return
+
+    def flush(self):
+        """Block until every queued episode is embedded and stored."""
+        if self._embedder is not None:
+            self._embed_queue.join()
+        self.store.flush()
+
+    def close(self):
+        if self._embedder is not None and self._embedder.is_alive():
+            self._embed_queue.put(None)
+            self._embedder.join(timeout=5)
+        self.store.close()
 
     # -------------------- Read Memory --------------------
 
     def recent_context(self, k: int = 5) -> List[Dict[str, Any]]:
         return list(self.short_term)[-k:]
 
+    def episode_count(self) -> int:
+        return self._episode_count
+
+    def routing_examples(self):
+        """(embeddings matrix, tool labels) of successful steps, for training the step router."""
+        return self.semantic.examples()
+
+    def record_cache_lookup(self, tool: str, hit: bool):
+        with self._cache_stats_lock:
+            self.cache_stats[tool]["hits" if hit else "misses"] += 1
+
+    def cache_hit_rates(self) -> Dict[str, float]:
+        with self._cache_stats_lock:
+            return {
+                tool: c["hits"] / (c["hits"] + c["misses"])
+                for tool, c in self.cache_stats.items() if c["hits"] + c["misses"]
+            }
+
     # -------------------- Tool Recommendation --------------------
 
     def preferred_tool(self, query: str) -> Optional[str]:
-        # 1) semantic match
-        if self.embed_fn and self.semantic_memory:
-            q_emb = self.embed_fn(query)
-            best_sim = 0.0
-            best_tool = None
-
-            for emb, tool in self.semantic_memory:
-                sim = self._cosine_similarity(q_emb, emb)
-                if sim > best_sim:
-                    best_sim = sim
-                    best_tool = tool
-
-            if best_sim > 0.8:
+        # 1) semantic match: one matrix-vector top-1 over every stored episode
+        if self.embed_fn and len(self.semantic):
+            hits = self.semantic.search(self.embed_fn(query), k=1)
+            if hits and hits[0][1] > 0.8:
+                best_tool, _, slot = hits[0]
+                self.semantic.touch([slot])  # useful episodes decay from their last match
                 return best_tool
 
-        # 2) fallback: best success rate
+        # 2) fallback: best decayed success rate (O(number of tools))
+        now = time.time()
         best_tool = None
         best_rate = 0.0
 
-        for tool, stats in self.tool_stats.items():
-            total = stats["success"] + stats["fail"]
-            if total == 0:
-                continue
-            rate = stats["success"] / total
+        for tool, counts in self.tool_rates.items():
+            rate = counts.rate(now, self.decay_lambda)
             if rate > best_rate:
                 best_rate = rate
                 best_tool = tool
@@ -128,8 +251,3 @@ class AgentMemory:
         age = time.time() - timestamp
         return float(np.exp(-self.decay_lambda * age))
 
-    # -------------------- Utils --------------------
-
-    @staticmethod
-    def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
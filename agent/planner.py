@@ -15,24 +15,16 @@
 # 2. Summarize concept
 # 3. Generate code example
 
-from transformers import AutoTokenizer, AutoModelForCausalLM , BitsAndBytesConfig
-import torch
+from core.model_registry import registry
+from core.tracing import tracer
+from llm import get_client
+
 MODEL_NAME = "Qwen/Qwen2.5-1.5B-Instruct"
 
-# 4 bit quantization
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.float16,
-    bnb_4bit_use_double_quant=True
-)
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    torch_dtype = torch.float16 ,
-    quantization_config=bnb_config,
-    device_map="auto")
+def load_planner_model():
+    """Shared (model, tokenizer); loaded lazily on first use, not at import."""
+    return registry.causal_lm(MODEL_NAME)
 
 
 SYSTEM_PROMPT = """
@@ -49,27 +41,43 @@ For Example :
 4. Calculate 512 * 512
 """
 
-def generate_plan(query):
+# bump when SYSTEM_PROMPT or the template layout changes (cached prefix is rebuilt)
+PLANNER_PROMPT_VERSION = "1"
+_QUERY_SLOT = "<<<PLANNER_QUERY>>>"
+
+
+def _render(tokenizer, query):
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": query}
     ]
-
-    model_inputs = tokenizer.apply_chat_template(
+    return tokenizer.apply_chat_template(
         messages,
-        tokenize=True,
-        add_generation_prompt=True,
-        return_tensors="pt",
-        return_dict=True
-    ).to(model.device)
-
-    outputs = model.generate(
-        **model_inputs,
-        max_new_tokens=256,
-        do_sample=True,
-        temperature=0.2,
-        pad_token_id=tokenizer.eos_token_id
+        tokenize=False,
+        add_generation_prompt=True
     )
 
-    generated_only = outputs[0][model_inputs["input_ids"].shape[-1]:]
-    return tokenizer.decode(generated_only, skip_special_tokens=True)
+
+def planner_prefix(tokenizer):
+    """Everything in the chat prompt before the user's query (identical for every call)."""
+    rendered = _render(tokenizer, _QUERY_SLOT)
+    return rendered[:rendered.index(_QUERY_SLOT)]
+
+
+def generate_plan(query, llm=None):
+    """llm: shared LLMClient; defaults to the planner model's client."""
+    if llm is None:
+        llm = get_client(*load_planner_model())
+
+    llm.register_prefix("planner", planner_prefix(llm.tokenizer), PLANNER_PROMPT_VERSION)
+    prompt = _render(llm.tokenizer, query)
+
+    with tracer.span("planner.generate"):
+        return llm.generate(
+            prompt,
+            max_new_tokens=256,
+            do_sample=True,
+            temperature=0.2,
+            caller="planner",
+            prefix="planner"
+        )
@@ -0,0 +1,92 @@
+import copy
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import torch
+from transformers import DynamicCache
+
+from core.tracing import tracer
+
+'''
+Precomputed KV cache for fixed prompt prefixes (planner system prompt,
+router tool description). The prefix is encoded once per (model, prompt
+name, version, text hash); every call then copies the cache and only the
+varying suffix tokens are run through the model before decoding starts.
+'''
+
+
+@dataclass
+class CachedPrefix:
+    name: str
+    version: str
+    text: str
+    input_ids: torch.Tensor      # (1, prefix_len)
+    cache: Any                   # DynamicCache for the prefix
+    build_seconds: float
+
+    @property
+    def length(self) -> int:
+        return self.input_ids.shape[-1]
+
+    def expand(self, batch_size: int):
+        """A private copy of the cache for `batch_size` sequences (generate() appends to it)."""
+        cache = copy.deepcopy(self.cache)
+        if batch_size > 1:
+            cache.batch_repeat_interleave(batch_size)
+        return cache
+
+
+def prompt_version(text: str, version: str = "1") -> str:
+    return f"{version}-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]}"
+
+
+class PrefixCache:
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.model_name = getattr(model, "name_or_path", "") or type(model).__name__
+        self._entries: Dict[str, CachedPrefix] = {}
+        self._texts: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, text: str, version: str = "1"):
+        """Declare a prefix; re-registering with a different text or version invalidates it."""
+        version = prompt_version(text, version)
+        with self._lock:
+            if self._texts.get(name) != (text, version):
+                self._texts[name] = (text, version)
+                self._entries.pop(name, None)
+
+    def has(self, name: str) -> bool:
+        return name in self._texts
+
+    def text(self, name: str) -> str:
+        return self._texts[name][0]
+
+    def get(self, name: str) -> CachedPrefix:
+        with self._lock:
+            text, version = self._texts[name]
+            entry = self._entries.get(name)
+            if entry is None or entry.version != version:
+                entry = self._entries[name] = self._build(name, text, version)
+                tracer.count("llm.prefix_cache_builds", prefix=name)
+            else:
+                tracer.count("llm.prefix_cache_hits", prefix=name)
+        return entry
+
+    def _build(self, name: str, text: str, version: str) -> CachedPrefix:
+        start = time.perf_counter()
+        input_ids = self.tokenizer(text, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            out = self.model(input_ids, past_key_values=DynamicCache(), use_cache=True)
+        return CachedPrefix(name, version, text, input_ids, out.past_key_values, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {"model": self.model_name, "version": e.version, "tokens": e.length, "build_ms": e.build_seconds * 1000.0}
+                for name, e in self._entries.items()
+            }
@@ -1,10 +1,20 @@
 import re
-import torch
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
 
+import numpy as np
+
+from core.tracing import tracer
+
+# Routing labels, as recorded by AgentMemory (tool name, or route for rag/direct)
+ROUTE_LABELS = ("rag", "direct", "python", "calculator")
+
+# "python" means *executing* code; writing code is a direct LLM answer
+# (same rule as the note in ROUTER_PREFIX)
 TOOL_KEYWORDS = {
     "python": [
-        "code", "implement", "run", "execute", "python", "debug",
-        "example code", "write code", "script"
+        "run", "execute", "debug", "run the code", "execute the code"
     ],
     "calculator": [
         "calculate", "compute", "percentage", "sum", "mean",
@@ -22,6 +32,13 @@ RAG_KEYWORDS = [
      "explain" # Added these for explicit RAG routing
 ]
 
+DIRECT_KEYWORDS = [
+    "summarize", "write code", "example code", "code example", "give code",
+    "implement", "generate code", "write python", "python code"
+]
+
+ARITHMETIC = re.compile(r"\d\s*(\*\*|[-+*/%^])\s*\(?\s*\d")
+
 # def route_step(step: str):
 #     step_lower = step.lower()
 #     # 3) Heuristic: if step looks like "summarize/explain", use RAG by default
@@ -47,13 +64,10 @@ RAG_KEYWORDS = [
 #     return {"route": "direct", "tool_name": None}
 
 
-# for better
-def route_step(step: str, model, tokenizer ):
-    """
-    تستخدم الـ LLM لتحديد المسار (الأداة) المناسبة لكل خطوة بشكل ذكي.
-    """
-    # البرومبت اللي هيوجه الموديل لاختيار الأداة
-    router_prompt = f"""Analyze the task and pick the best tool. Respond with ONLY the tool name.
+# Static part of the router prompt; its KV cache is computed once (see prefix_cache.py).
+# Bump ROUTER_PROMPT_VERSION when editing it.
+ROUTER_PROMPT_VERSION = "1"
+ROUTER_PREFIX = """Analyze the task and pick the best tool. Respond with ONLY the tool name.
 
 Tools:
 - 'direct': To summarize, explain results, or generic reasoning or Write python Code.
@@ -61,25 +75,204 @@ Tools:
 - 'python': To excute or run code, programming scripts, or examples.
 - 'calculator': For math operations or arithmetic.
 
-Task: "{step}"
-
 note : Just Return Python only when the task reqire code execution or running code .
 when user asks for write code example just return direct not python
+
+"""
+
+
+# for better
+def route_step(step: str, llm):
+    """
+    تستخدم الـ LLM لتحديد المسار (الأداة) المناسبة لكل خطوة بشكل ذكي.
+    """
+    # البرومبت اللي هيوجه الموديل لاختيار الأداة
+    # only the task line changes between calls
+    llm.register_prefix("router", ROUTER_PREFIX, ROUTER_PROMPT_VERSION)
+    router_prompt = ROUTER_PREFIX + f"""Task: "{step}"
 Tool:"""
 
     # مناداة الموديل
-    inputs = tokenizer(router_prompt, return_tensors="pt").to(model.device)
-    with torch.no_grad():
-        outputs = model.generate(**inputs, max_new_tokens=10, temperature=0.1)
-
-    decision = tokenizer.decode(outputs[0][inputs.input_ids.shape[-1]:], skip_special_tokens=True).strip().lower()
+    with tracer.span("router.generate"):
+        decision = llm.generate(
+            router_prompt,
+            max_new_tokens=10,
+            do_sample=True,
+            temperature=0.1,
+            caller="router",
+            prefix="router"
+        ).lower()
 
     # تحويل الرد لرد مهيكل (Dictionary) زي ما الكود بتاعك متعود
-    if "run" in decision or "run" in decision:
-        return {"route": "tool", "tool_name": "python"}
+    return to_route(parse_decision(decision))
+
+
+def parse_decision(decision: str) -> str:
+    """LLM router answer -> routing label"""
+    if "python" in decision or "run" in decision:
+        return "python"
     elif "calculator" in decision:
-        return {"route": "tool", "tool_name": "calculator"}
+        return "calculator"
     elif "rag" in decision:
-        return {"route": "rag", "tool_name": None}
-    else:
-        return {"route": "direct", "tool_name": None}
+        return "rag"
+    return "direct"
+
+
+def to_route(label: str) -> Dict[str, Optional[str]]:
+    if label in ("python", "calculator"):
+        return {"route": "tool", "tool_name": label}
+    return {"route": label, "tool_name": None}
+
+
+# -------------------- Tiered router --------------------
+
+def _keyword_pattern(words: List[str]):
+    return re.compile(r"\b(" + "|".join(re.escape(w) for w in words) + r")\b")
+
+
+KEYWORD_RULES = {
+    "python": _keyword_pattern(TOOL_KEYWORDS["python"]),
+    "calculator": _keyword_pattern(TOOL_KEYWORDS["calculator"]),
+    "rag": _keyword_pattern(TOOL_KEYWORDS["search"] + RAG_KEYWORDS),
+    "direct": _keyword_pattern(DIRECT_KEYWORDS),
+}
+
+
+def keyword_route(step: str) -> Optional[str]:
+    """Label when exactly one keyword family matches, else None (ambiguous / no match)."""
+    step_lower = step.lower()
+    matched = {label for label, pattern in KEYWORD_RULES.items() if pattern.search(step_lower)}
+    if ARITHMETIC.search(step_lower):
+        matched.add("calculator")
+    return matched.pop() if len(matched) == 1 else None
+
+
+class CentroidClassifier:
+    """Nearest-centroid over normalized step embeddings, trained from memory episodes."""
+
+    def __init__(self, min_examples: int = 3):
+        self.min_examples = min_examples
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+
+    def fit(self, vectors: np.ndarray, labels: List[str]) -> "CentroidClassifier":
+        counts = Counter(labels)
+        keep = [l for l in ROUTE_LABELS if counts[l] >= self.min_examples]
+        if len(keep) < 2:
+            self.labels, self.centroids = [], None
+            return self
+
+        labels_arr = np.asarray(labels)
+        centroids = np.vstack([vectors[labels_arr == l].mean(axis=0) for l in keep])
+        self.centroids = centroids / (np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12)
+        self.labels = keep
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def predict(self, vector: np.ndarray):
+        """(label, top-1 similarity, margin over the runner-up)"""
+        v = vector / (np.linalg.norm(vector) + 1e-12)
+        sims = self.centroids @ v
+        order = np.argsort(-sims)
+        margin = float(sims[order[0]] - sims[order[1]])
+        return self.labels[order[0]], float(sims[order[0]]), margin
+
+
+class StepRouter:
+    """
+    keyword rules -> centroid classifier over step embeddings -> LLM,
+    where the LLM only sees the steps the first two tiers were unsure about,
+    all in one batched call.
+    """
+
+    def __init__(
+        self,
+        llm,
+        memory=None,
+        min_similarity: float = 0.5,
+        min_margin: float = 0.05,
+        refit_every: int = 20
+    ):
+        """
+        memory: AgentMemory providing embed_fn and routing examples (optional)
+        min_similarity / min_margin: classifier confidence needed to skip the LLM
+        refit_every: retrain the centroids after this many new episodes
+        """
+        self.llm = llm
+        self.memory = memory
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.refit_every = refit_every
+        self.classifier = CentroidClassifier()
+        self.stats = Counter()
+        self._fitted_on = -1
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # steps are routed from many agent threads
+
+    def _maybe_refit(self):
+        if self.memory is None or getattr(self.memory, "embed_fn", None) is None:
+            return
+        seen = self.memory.episode_count()
+        with self._lock:
+            if self._fitted_on >= 0 and seen - self._fitted_on < self.refit_every:
+                return
+            vectors, labels = self.memory.routing_examples()
+            if len(labels):
+                self.classifier.fit(vectors, labels)
+            self._fitted_on = seen
+
+    def _classify(self, step: str) -> Optional[str]:
+        if not self.classifier.ready:
+            return None
+        label, sim, margin = self.classifier.predict(self.memory.embed_fn(step))
+        if sim >= self.min_similarity and margin >= self.min_margin:
+            return label
+        return None
+
+    def route_steps(self, steps: List[str]) -> List[Dict[str, Optional[str]]]:
+        self._maybe_refit()
+        labels: List[Optional[str]] = [None] * len(steps)
+        tiers: List[str] = [""] * len(steps)
+
+        for i, step in enumerate(steps):
+            label = keyword_route(step)
+            tier = "keyword"
+            if label is None:
+                label = self._classify(step)
+                tier = "classifier"
+            if label is not None:
+                labels[i], tiers[i] = label, tier
+
+        uncertain = [i for i, label in enumerate(labels) if label is None]
+        if uncertain:
+            self.llm.register_prefix("router", ROUTER_PREFIX, ROUTER_PROMPT_VERSION)
+            prompts = [ROUTER_PREFIX + f'Task: "{steps[i]}"\nTool:' for i in uncertain]
+            with tracer.span("router.generate", steps=len(prompts)):
+                decisions = self.llm.generate_batch(
+                    prompts,
+                    max_new_tokens=10,
+                    do_sample=True,
+                    temperature=0.1,
+                    caller="router",
+                    prefix="router"
+                )
+            for i, decision in zip(uncertain, decisions):
+                labels[i], tiers[i] = parse_decision(decision.lower()), "llm"
+
+        with self._stats_lock:
+            self.stats.update(tiers)
+        for tier in tiers:
+            tracer.count("router.tier", tier=tier)
+        return [dict(to_route(label), tier=tier) for label, tier in zip(labels, tiers)]
+
+    def route(self, step: str) -> Dict[str, Optional[str]]:
+        return self.route_steps([step])[0]
+
+    def hit_rates(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        total = sum(stats.values())
+        return {tier: stats.get(tier, 0) / total if total else 0.0 for tier in ("keyword", "classifier", "llm")}
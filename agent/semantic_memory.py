@@ -0,0 +1,195 @@
+import time
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+'''
+Bounded semantic memory: which tool worked for which kind of step.
+
+Embeddings live in one preallocated, L2-normalized float32 matrix. A lookup
+is a single matrix-vector product plus a top-k; past `ann_threshold` stored
+rows an inner-product FAISS IVF index over the same slot ids takes over, so
+lookups stay sub-millisecond at a million episodes.
+
+Slots are stable: evicted rows go on a free list and are reused, so the IVF
+index only ever needs add/remove, never a rebuild for eviction. When the
+memory is full, the `evict_fraction` rows with the lowest decay weight
+(time since they were stored or last matched) are evicted in one batch.
+Writers are serialized; the IVF (re)build runs outside the read lock so
+lookups keep using the previous index meanwhile.
+'''
+
+
+class SemanticMemory:
+    def __init__(
+        self,
+        capacity: int = 100_000,
+        decay_lambda: float = 0.001,
+        evict_fraction: float = 0.05,
+        ann_threshold: int = 10_000,
+        nprobe: int = 8
+    ):
+        """
+        capacity: most stored episodes; the matrix is allocated at this size
+        decay_lambda: decay of an episode's weight per second since last use
+        evict_fraction: share of capacity freed when the memory is full
+        ann_threshold: stored rows above which lookups go through FAISS IVF
+        nprobe: IVF lists scanned per lookup
+        """
+        self.capacity = capacity
+        self.decay_lambda = decay_lambda
+        self.evict_count = max(1, int(capacity * evict_fraction))
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+
+        self.dim: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._tool_ids = np.zeros(capacity, dtype=np.int32)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._high = 0            # slots [0, _high) have been used at least once
+        self._free: List[int] = []
+        self._size = 0
+
+        self._tools: List[str] = []
+        self._tool_index: Dict[str, int] = {}
+
+        self._ann = None
+        self._ann_trained_on = 0
+        self._lock = threading.RLock()         # guards state seen by readers
+        self._write_lock = threading.Lock()    # one writer at a time (add / eviction / ANN build)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # -------------------- Write --------------------
+
+    def _allocate(self, dim: int):
+        self.dim = dim
+        self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+
+    def _tool_id(self, tool: str) -> int:
+        if tool not in self._tool_index:
+            self._tool_index[tool] = len(self._tools)
+            self._tools.append(tool)
+        return self._tool_index[tool]
+
+    def _take_slots(self, n: int) -> np.ndarray:
+        if self._size + n > self.capacity:
+            self._evict(max(self.evict_count, self._size + n - self.capacity))
+        reused = [self._free.pop() for _ in range(min(n, len(self._free)))]
+        fresh = list(range(self._high, self._high + n - len(reused)))
+        self._high += len(fresh)
+        return np.asarray(reused + fresh, dtype=np.int64)
+
+    def add(self, vectors: np.ndarray, tools: Sequence[str], timestamps: Optional[Sequence[float]] = None):
+        """Store a batch of (embedding, tool) pairs."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) == 0:
+            return
+        # keep only the newest rows if one batch is larger than the whole memory
+        vectors, tools = vectors[-self.capacity:], list(tools)[-self.capacity:]
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+        now = time.time()
+        timestamps = np.asarray(timestamps if timestamps is not None else [now] * len(vectors))[-self.capacity:]
+
+        with self._write_lock:
+            with self._lock:
+                if self._matrix is None:
+                    self._allocate(vectors.shape[1])
+                slots = self._take_slots(len(vectors))
+
+                self._matrix[slots] = vectors
+                self._tool_ids[slots] = [self._tool_id(t) for t in tools]
+                self._last_used[slots] = timestamps
+                self._valid[slots] = True
+                self._size += len(slots)
+
+                if self._ann is not None:
+                    self._ann.add_with_ids(vectors, slots)
+            self._maybe_build_ann()
+
+    # -------------------- Eviction --------------------
+
+    def weights(self, now: Optional[float] = None) -> np.ndarray:
+        """decay weight exp(-lambda * age since last use) of every used slot (0 for free ones)"""
+        now = time.time() if now is None else now
+        age = now - self._last_used[:self._high]
+        return np.where(self._valid[:self._high], np.exp(-self.decay_lambda * age), 0.0)
+
+    def _evict(self, n: int):
+        valid = np.flatnonzero(self._valid[:self._high])
+        n = min(n, len(valid))
+        if n == 0:
+            return
+        weights = self.weights()[valid]
+        victims = valid[np.argpartition(weights, n - 1)[:n]]
+
+        self._valid[victims] = False
+        self._free.extend(victims.tolist())
+        self._size -= n
+        if self._ann is not None:
+            import faiss
+            self._ann.remove_ids(faiss.IDSelectorBatch(victims.astype(np.int64)))
+
+    # -------------------- ANN --------------------
+
+    def _maybe_build_ann(self):
+        # (re)train once the memory is past the threshold and has grown 8x since the last training;
+        # called with only the write lock held, so nothing but touch() changes meanwhile
+        if self._size < self.ann_threshold or self._size < 8 * self._ann_trained_on:
+            return
+        import faiss
+
+        slots = np.flatnonzero(self._valid[:self._high])
+        vectors = self._matrix[slots]
+        nlist = max(1, int(4 * np.sqrt(len(slots))))
+        quantizer = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), min(len(vectors), nlist * 40), replace=False)]
+        index.train(sample)
+        index.add_with_ids(vectors, slots.astype(np.int64))
+        index.nprobe = self.nprobe
+
+        with self._lock:
+            self._ann = index
+            self._ann_trained_on = len(slots)
+
+    # -------------------- Read --------------------
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[str, float, int]]:
+        """Top-k (tool, cosine similarity, slot) for a query embedding."""
+        with self._lock:
+            if self._size == 0:
+                return []
+            q = np.asarray(vector, dtype=np.float32).ravel()
+            q = q / (np.linalg.norm(q) + 1e-12)
+            k = min(k, self._size)
+
+            if self._ann is not None:
+                scores, slots = self._ann.search(q[None, :], k)
+                hits = [(int(s), float(sc)) for s, sc in zip(slots[0], scores[0]) if s >= 0]
+            else:
+                scores = self._matrix[:self._high] @ q
+                scores[~self._valid[:self._high]] = -np.inf
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                hits = [(int(s), float(scores[s])) for s in top]
+
+            return [(self._tools[self._tool_ids[s]], score, s) for s, score in hits]
+
+    def touch(self, slots: Sequence[int], timestamp: Optional[float] = None):
+        """Refresh the decay clock of rows that were just useful."""
+        with self._lock:
+            slots = np.asarray(slots, dtype=np.int64)
+            slots = slots[self._valid[slots]]
+            self._last_used[slots] = time.time() if timestamp is None else timestamp
+
+    def examples(self) -> Tuple[np.ndarray, List[str]]:
+        """(normalized embeddings, tool labels) of every stored episode."""
+        with self._lock:
+            if self._size == 0:
+                return np.zeros((0, 0), dtype="float32"), []
+            slots = np.flatnonzero(self._valid[:self._high])
+            return self._matrix[slots].copy(), [self._tools[i] for i in self._tool_ids[slots]]
@@ -0,0 +1,103 @@
+import re
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Set
+
+'''
+Plan steps -> dependency DAG -> concurrent execution.
+
+A step depends on earlier steps when
+    1. it names them explicitly ("the result of step 2", "combine steps 1 and 3"),
+    2. otherwise, when it is a direct LLM step (it reasons over earlier results),
+    3. otherwise, when it refers to earlier output ("the result", "above", "previous", ...).
+Anything else (a plain retrieval, a self-contained calculation) runs as soon
+as a worker is free.
+'''
+
+EXPLICIT_DEPENDENCY = re.compile(r"\bsteps?\s*#?(\d+(?:\s*(?:,|and|&)\s*\d+)*)", re.IGNORECASE)
+REFERENCES_EARLIER = re.compile(
+    r"\b(results?|above|previous|previously|earlier|output|outputs|retrieved|"
+    r"found|obtained|combine|integrate|compare|based on)\b",
+    re.IGNORECASE
+)
+STEP_NUMBER = re.compile(r"^\s*(\d+)[.)]\s*")
+
+
+@dataclass
+class PlanStep:
+    index: int                   # 1-based position in the plan
+    text: str
+    route: Dict[str, Any]
+    deps: Set[int] = field(default_factory=set)
+
+
+def build_step_graph(steps: List[str], routes: List[Dict[str, Any]]) -> List[PlanStep]:
+    graph = []
+    for i, (text, route) in enumerate(zip(steps, routes), 1):
+        body = STEP_NUMBER.sub("", text)
+        explicit = {
+            int(n)
+            for m in EXPLICIT_DEPENDENCY.finditer(body)
+            for n in re.findall(r"\d+", m.group(1))
+            if 0 < int(n) < i
+        }
+
+        if explicit:
+            deps = explicit
+        elif route.get("route") == "direct" or REFERENCES_EARLIER.search(body):
+            deps = set(range(1, i))
+        else:
+            deps = set()
+
+        graph.append(PlanStep(index=i, text=text, route=route, deps=deps))
+    return graph
+
+
+def execute_graph(
+    graph: List[PlanStep],
+    run_step: Callable[[PlanStep, Dict[int, Any]], Any],
+    max_workers: int = 4,
+    on_done: Optional[Callable[[PlanStep, Any], None]] = None,
+    serial: Optional[Callable[[PlanStep], bool]] = None
+) -> Dict[int, Any]:
+    """
+    Run every step once all of its dependencies have finished.
+    run_step(step, results_so_far) -> result; returns {step index: result}.
+    on_done(step, result) is called from this (the caller's) thread as steps finish.
+    serial(step) -> True for steps that must not overlap each other (a tool
+        that is not thread-safe); they run one at a time, in plan order.
+    """
+    results: Dict[int, Any] = {}
+    pending = {s.index: s for s in graph}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-step") as pool:
+        while pending or running:
+            serial_busy = serial is not None and any(serial(s) for s in running.values())
+            ready = []
+            for s in pending.values():
+                if not s.deps <= results.keys():
+                    continue
+                if serial is not None and serial(s):
+                    if serial_busy:
+                        continue
+                    serial_busy = True
+                ready.append(s)
+            for step in ready:
+                del pending[step.index]
+                # carry tracing/context variables into the worker thread
+                ctx = contextvars.copy_context()
+                running[pool.submit(ctx.run, run_step, step, dict(results))] = step
+
+            if not running:
+                # unsatisfiable dependencies (should not happen: deps only point backwards)
+                raise RuntimeError(f"Plan steps {sorted(pending)} can never run")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.index] = future.result()
+                if on_done is not None:
+                    on_done(step, results[step.index])
+    return results
@@ -0,0 +1,162 @@
+import re
+import json
+import time
+import copy
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+'''
+Tool-result cache for the agent's execution layer.
+
+Results are keyed on (tool name, normalized input, tool/index version), kept
+in an in-memory LRU bounded by size and TTL and, when `db_path` is given, in
+an SQLite tier that survives restarts (entries found there are promoted to
+memory). Only successful results are stored, and Python code that looks
+non-deterministic (randomness, clocks, I/O, environment, object identity) is
+never cached. Hash and set iteration order are fixed by the Python tool's
+workers (PYTHONHASHSEED=0), so they don't need a bypass.
+'''
+
+NON_DETERMINISTIC = re.compile(
+    r"\b(random|secrets|uuid|time|datetime|os|sys|subprocess|socket|requests|urllib|"
+    r"open|input|getpass|tempfile|shutil|pathlib|threading|multiprocessing|id)\b"
+)
+
+
+def normalize_input(tool: str, text: str) -> str:
+    text = str(text)
+    if tool == "calculator":
+        return "".join(text.split())
+    if tool == "python":
+        # trailing whitespace and blank lines never change what the code does
+        lines = [line.rstrip() for line in text.strip().splitlines()]
+        return "\n".join(line for line in lines if line)
+    # whitespace only: retrieval is case-sensitive (embeddings, BM25 tokens), "US" != "us"
+    return " ".join(text.split())
+
+
+def _json_default(value):
+    # numpy scalars/arrays from the retriever and calculator
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class ToolCache:
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        max_db_entries: int = 100_000
+    ):
+        """
+        max_entries: in-memory LRU size
+        ttl: seconds a result stays valid (both tiers)
+        db_path: optional SQLite file for the persistent tier
+        max_db_entries: rows kept in the SQLite tier (oldest expiry pruned first)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_writes = 0
+
+        self.conn = None
+        if db_path is not None:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tool_cache (
+                    key TEXT PRIMARY KEY,
+                    tool TEXT,
+                    result TEXT,
+                    expires_at REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_cache_expires ON tool_cache (expires_at)")
+            self.conn.commit()
+
+    # -------------------- Keys --------------------
+
+    @staticmethod
+    def cacheable(tool: str, tool_input: str) -> bool:
+        if tool == "python":
+            return NON_DETERMINISTIC.search(str(tool_input)) is None
+        return True
+
+    @staticmethod
+    def key(tool: str, tool_input: str, version: str = "1") -> str:
+        raw = f"{tool}\x00{version}\x00{normalize_input(tool, tool_input)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # -------------------- Read / write --------------------
+
+    def get(self, tool: str, tool_input: str, version: str = "1") -> Optional[Dict[str, Any]]:
+        key = self.key(tool, tool_input, version)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT result, expires_at FROM tool_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result, row[1])
+                    return copy.deepcopy(result)
+
+            return None
+
+    def put(self, tool: str, tool_input: str, result: Dict[str, Any], version: str = "1"):
+        if result.get("status") != "success":
+            return
+        key = self.key(tool, tool_input, version)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._remember(key, copy.deepcopy(result), expires_at)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?)",
+                        (key, tool, json.dumps(result, default=_json_default), expires_at)
+                    )
+                self._db_writes += 1
+                if self._db_writes % 1000 == 0:
+                    self._prune_db()
+
+    def _remember(self, key: str, result: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_db(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            self.conn.execute(
+                "DELETE FROM tool_cache WHERE key IN ("
+                "SELECT key FROM tool_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_db_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM tool_cache")
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # not POSIX: no peak RSS
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent"), os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from benchmarks.fixtures import TOPICS, build_corpus
+from benchmarks.retrieval_bench import compare, git_commit, percentiles
+from benchmarks.stub_llm import StubLLMClient
+from indexing.embedder import EmbeddingEngine
+from pipeline import SmartHybridRetriever
+from tools.rag_tool import RAGTool
+from tools.calc_tool import CalcTool
+from tools.python_tool import PythonTool
+from memory import AgentMemory
+from tool_cache import ToolCache
+from loop import FullAgentSystem
+from core.tracing import tracer
+
+'''
+End-to-end load test of FullAgentSystem on a CPU.
+
+    python benchmarks/agent_load.py --concurrency 8 --requests 200 --out agent.json
+    python benchmarks/agent_load.py --baseline agent.json --max-latency-regression 0.2
+
+Everything but the LLM is real: planner -> router -> RAG over the fixture
+corpus (hybrid retriever with small models), Python worker pool, calculator
+-> memory -> streamed synthesis. The LLM is benchmarks/stub_llm.py, which
+answers deterministically with configurable per-token latency, so runs are
+comparable across machines and commits. A mix of queries (RAG, RAG +
+calculation, Python, direct) is replayed by `--concurrency` closed-loop
+clients; the JSON report has requests/s, p50/p95/p99 end to end, to the
+first answer token and per traced stage, per-tool outcomes and peak RSS.
+'''
+
+
+def build_workload(requests: int, seed: int, path: str = None) -> List[Dict[str, str]]:
+    """[{kind, query, plan}] of length `requests`, from a JSONL file or the built-in mix."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            mix = [json.loads(line) for line in f if line.strip()]
+    else:
+        mix = []
+        for topic, vocab in sorted(TOPICS.items()):
+            a, b = vocab[0], vocab[1]
+            n = len(vocab)
+            mix += [
+                {"kind": "rag",
+                 "query": f"What is {topic}? Explain {a} and {b}.",
+                 "plan": f"1. Retrieve info about {a} and {b} from KB\n2. Summarize concept"},
+                {"kind": "rag+calculator",
+                 "query": f"How much memory do {topic} {a} matrices of size {n * 64} need?",
+                 "plan": f"1. Retrieve info about {topic} {a} from KB\n2. Calculate {n * 64} * {n * 64} * 4\n3. Summarize the result"},
+                {"kind": "python",
+                 "query": f"Run a quick {topic} experiment and report it",
+                 "plan": f"1. Retrieve info about {topic} from KB\n2. Run the code for the {topic} experiment\n3. Summarize the output above"},
+                {"kind": "direct",
+                 "query": f"Write a short note on {topic}",
+                 "plan": f"1. Write a short note on {topic} and {b}"},
+            ]
+    rng = random.Random(seed)
+    return [dict(rng.choice(mix)) for _ in range(requests)]
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    if resource is None:
+        return {}
+    scale = 1024.0 if sys.platform != "darwin" else 1024.0 * 1024.0  # ru_maxrss: KiB on Linux, bytes on macOS
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def run_one(agent: FullAgentSystem, item: Dict[str, str]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first_token = None
+    tools = []
+    error = None
+    try:
+        for event in agent.stream(item["query"]):
+            if event["type"] == "answer_token" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif event["type"] == "tool_output":
+                tools.append((event["tool"], event["status"]))
+    except Exception as e:
+        error = repr(e)
+    return {
+        "kind": item.get("kind", "custom"),
+        "seconds": time.perf_counter() - start,
+        "first_token": first_token,
+        "tools": tools,
+        "error": error,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    tracer.enabled = True  # per-stage timings come from the agent's spans
+    workload = build_workload(args.requests, args.seed, args.queries)
+    warmup = build_workload(args.warmup, args.seed + 1, args.queries)
+    llm = StubLLMClient(
+        token_latency=args.token_latency,
+        prefill_latency=args.prefill_latency,
+        answer_tokens=args.answer_tokens,
+        max_batch_size=args.max_batch_size,
+        plans={item["query"]: item["plan"] for item in workload + warmup if item.get("plan")}
+    )
+
+    chunks = build_corpus(docs_per_topic=args.docs_per_topic, seed=args.seed)
+    embedder = EmbeddingEngine(model_name=args.embedding_model, batch_size=32)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        retriever = SmartHybridRetriever(
+            chunks,
+            embedder.embed(chunks),
+            embedding_model=args.embedding_model,
+            reranker_model=args.reranker_model,
+            index_dir=os.path.join(work_dir, "index")
+        )
+        memory = AgentMemory(
+            db_path=os.path.join(work_dir, "memory.db"),
+            embed_model=args.embedding_model,
+            maintenance_interval=None
+        )
+        python_tool = PythonTool(workers=args.python_workers)
+        agent = FullAgentSystem(
+            model=None,
+            tokenizer=None,
+            tools={"python": python_tool, "calculator": CalcTool()},
+            memory=memory,
+            rag_tool=RAGTool(retriever),
+            llm=llm,
+            max_parallel_steps=args.max_parallel_steps,
+            # max_entries=0: every tool call does real work
+            tool_cache=ToolCache(max_entries=0) if args.no_tool_cache else None
+        )
+
+        try:
+            # model loads, worker start-up, first index touches
+            for item in warmup:
+                run_one(agent, item)
+
+            with tracer.capture() as spans:
+                wall = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                    results = list(pool.map(lambda item: run_one(agent, item), workload))
+                wall = time.perf_counter() - wall
+            memory.flush()
+            router_rates = agent.router.hit_rates()
+            cache_rates = memory.cache_hit_rates()
+        finally:
+            python_tool.close()
+            memory.close()
+            llm.close()
+
+    by_stage = defaultdict(list)
+    for span in spans:
+        by_stage[span.name].append(span.duration)
+    latency = {
+        "end_to_end": percentiles([r["seconds"] for r in results]),
+        "first_token": percentiles([r["first_token"] for r in results if r["first_token"] is not None] or [0.0]),
+    }
+    latency.update({stage: percentiles(samples) for stage, samples in sorted(by_stage.items())})
+
+    tools = defaultdict(Counter)
+    for r in results:
+        for tool, status in r["tools"]:
+            tools[tool][status] += 1
+    errors = [r["error"] for r in results if r["error"]]
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "embedding_model": args.embedding_model,
+            "reranker_model": args.reranker_model,
+            "concurrency": args.concurrency,
+            "requests": len(workload),
+            "token_latency": args.token_latency,
+            "answer_tokens": args.answer_tokens,
+            "tool_cache": not args.no_tool_cache,
+            "seed": args.seed,
+        },
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "wall_s": wall,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "latency_ms": latency,
+        "requests_by_kind": dict(sorted(Counter(r["kind"] for r in results).items())),
+        "tool_outcomes": {tool: dict(counts) for tool, counts in sorted(tools.items())},
+        "router_tiers": router_rates,
+        "tool_cache_hit_rates": cache_rates,
+        "llm": dict(llm.stats),
+        "python_tool": dict(python_tool.stats),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent loop load test with a deterministic stub LLM")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--reranker-model", default="cross-encoder/ms-marco-TinyBERT-L-2-v2")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--queries", default=None, help="JSONL of {query, plan[, kind]} instead of the built-in mix")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stub LLM seconds per generated token")
+    parser.add_argument("--prefill-latency", type=float, default=0.00005, help="stub LLM seconds per prompt word")
+    parser.add_argument("--answer-tokens", type=int, default=64, help="stub LLM free-text answer length")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-parallel-steps", type=int, default=4)
+    parser.add_argument("--python-workers", type=int, default=2)
+    parser.add_argument("--docs-per-topic", type=int, default=8)
+    parser.add_argument("--no-tool-cache", action="store_true", help="run every tool call instead of serving repeats from the cache")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="previous JSON report to compare against")
+    parser.add_argument("--max-latency-regression", type=float, default=0.2, help="allowed relative p50/p95 slowdown")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.max_latency_regression, 0.0)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        sys.exit(1 if problems or report["errors"] else 0)
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent")]
+
+'''
+Load time, memory and decode throughput of the causal LM backends.
+
+Each backend runs in its own subprocess so RSS numbers are not polluted by
+the previous load.
+
+    python benchmarks/backend_bench.py --model Qwen/Qwen2.5-0.5B-Instruct \
+        --backends hf cpu-int8 --threads 8
+'''
+
+PROMPTS = [
+    "Explain how self-attention works in transformers.",
+    "Summarize the two pre-training objectives used in BERT.",
+]
+
+
+def measure(model_name: str, backend: str, dtype: str, threads, max_new_tokens: int) -> dict:
+    from core.model_registry import registry
+    from llm import LLMClient
+
+    model, tokenizer = registry.causal_lm(model_name, backend=backend, dtype=dtype, threads=threads)
+    load = registry.stats()[-1]
+
+    llm = LLMClient(model, tokenizer, max_wait_ms=0)
+    llm.generate(PROMPTS[0], max_new_tokens=4, do_sample=False)  # warm-up
+
+    tokens, seconds = 0, 0.0
+    for prompt in PROMPTS:
+        start = time.perf_counter()
+        text = llm.generate(prompt, max_new_tokens=max_new_tokens, do_sample=False)
+        seconds += time.perf_counter() - start
+        tokens += len(tokenizer.encode(text, add_special_tokens=False))
+    llm.close()
+
+    return {**load, "tokens_per_s": tokens / seconds if seconds else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Causal LM backend benchmark")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--backends", nargs="+", default=["auto", "hf", "cpu-int8"])
+    parser.add_argument("--dtype", default="auto")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.model, args.single, args.dtype, args.threads, args.max_new_tokens)))
+        return
+
+    results = []
+    for backend in args.backends:
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--single", backend,
+            "--model", args.model, "--dtype", args.dtype, "--max-new-tokens", str(args.max_new_tokens)
+        ]
+        if args.threads:
+            cmd += ["--threads", str(args.threads)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            results.append({"backend": backend, "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append({"requested": backend, **json.loads(proc.stdout.strip().splitlines()[-1])})
+
+    report = {"model": args.model, "backends": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from benchmarks.fixtures import build_corpus
+from indexing.chunker import RecursiveChunker
+
+'''
+Stored size of overlapped vs linked (overlap-free) chunking.
+
+    python benchmarks/chunking_bench.py --tokenizer BAAI/bge-m3
+    python benchmarks/chunking_bench.py --tokenizer BAAI/bge-m3 --embedding-model BAAI/bge-m3
+
+Documents are the fixture corpus joined per topic (one paragraph per fixture
+chunk). Stored tokens are what gets embedded, indexed and BM25-scored; with
+--embedding-model the embedding time of both layouts is measured too.
+'''
+
+
+def build_docs(docs_per_topic: int):
+    by_topic = defaultdict(list)
+    for chunk in build_corpus(docs_per_topic=docs_per_topic):
+        by_topic[chunk["metadata"]["topic"]].append(chunk["text"])
+    return [
+        {"text": "\n\n".join(texts), "metadata": {"source": f"{topic}.txt", "topic": topic}}
+        for topic, texts in sorted(by_topic.items())
+    ]
+
+
+def measure(chunker: RecursiveChunker, docs, embedding_model):
+    start = time.perf_counter()
+    chunks = chunker.chunk_text(docs)
+    report = {
+        "chunk_s": time.perf_counter() - start,
+        "chunks": len(chunks),
+        "stored_tokens": sum(chunker.token_len(c["text"]) for c in chunks),
+        "stored_chars": sum(len(c["text"]) for c in chunks),
+    }
+    if embedding_model:
+        from indexing.embedder import EmbeddingEngine
+        engine = EmbeddingEngine(model_name=embedding_model, batch_size=32)
+        engine.embed(chunks[:4])  # model load is not part of the measurement
+        start = time.perf_counter()
+        engine.embed(chunks)
+        report["embed_s"] = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overlapped vs linked chunk storage")
+    parser.add_argument("--tokenizer", default="BAAI/bge-m3")
+    parser.add_argument("--embedding-model", default=None)
+    parser.add_argument("--docs-per-topic", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=120)
+    parser.add_argument("--min-chunk-size", type=int, default=60)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    docs = build_docs(args.docs_per_topic)
+    report = {"docs": len(docs)}
+    for mode, linked in (("overlap", False), ("linked", True)):
+        chunker = RecursiveChunker(
+            model_name=args.tokenizer,
+            max_tokens=args.max_tokens,
+            overlap=args.overlap,
+            min_chunk_size=args.min_chunk_size,
+            link_neighbours=linked
+        )
+        report[mode] = measure(chunker, docs, args.embedding_model)
+    report["stored_token_ratio"] = report["linked"]["stored_tokens"] / max(report["overlap"]["stored_tokens"], 1)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
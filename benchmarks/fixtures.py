@@ -0,0 +1,96 @@
+import random
+import hashlib
+from typing import List, Dict, Any, Tuple
+
+'''
+Reproducible synthetic corpus + labelled queries for offline benchmarks.
+
+Every topic gets a handful of documents built from its own vocabulary
+mixed with shared filler, so both BM25 and dense retrieval have real work
+to do and the relevant chunks for a query are known exactly.
+'''
+
+TOPICS = {
+    "attention": ["attention", "query", "key", "value", "softmax", "heads", "transformer"],
+    "bert": ["bert", "masked", "language", "model", "pretraining", "next", "sentence", "prediction"],
+    "lora": ["lora", "low", "rank", "adapter", "finetuning", "matrices", "frozen", "weights"],
+    "rnn": ["recurrent", "rnn", "vanishing", "gradient", "sequence", "hidden", "state", "lstm"],
+    "cnn": ["convolution", "kernel", "stride", "padding", "pooling", "feature", "map", "image"],
+    "bm25": ["bm25", "term", "frequency", "inverse", "document", "sparse", "lexical", "ranking"],
+    "faiss": ["faiss", "vector", "index", "nearest", "neighbour", "inner", "product", "dense"],
+    "quantization": ["quantization", "int8", "4bit", "nf4", "bitsandbytes", "precision", "memory"],
+    "tokenizer": ["tokenizer", "bpe", "subword", "vocabulary", "merge", "unicode", "bytes"],
+    "optimizer": ["adam", "optimizer", "learning", "rate", "momentum", "warmup", "decay"],
+    "dropout": ["dropout", "regularization", "overfitting", "probability", "neurons", "ensemble"],
+    "rag": ["retrieval", "augmented", "generation", "context", "passages", "grounding", "rag"],
+}
+
+FILLER = [
+    "the", "method", "is", "used", "in", "practice", "to", "improve", "results", "on",
+    "many", "tasks", "and", "it", "was", "studied", "by", "several", "papers", "with",
+    "experiments", "showing", "that", "performance", "depends", "on", "data", "scale",
+]
+
+ARABIC_FILLER = ["النموذج", "البيانات", "التدريب", "النتائج", "الطريقة", "التجارب"]
+
+
+def _sentence(rng: random.Random, vocab: List[str], n_words: int, arabic: bool) -> str:
+    words = []
+    for _ in range(n_words):
+        pool = vocab if rng.random() < 0.35 else (ARABIC_FILLER if arabic and rng.random() < 0.5 else FILLER)
+        words.append(rng.choice(pool))
+    return " ".join(words).capitalize() + "."
+
+
+def build_corpus(
+    docs_per_topic: int = 8,
+    sentences_per_doc: int = 6,
+    seed: int = 13
+) -> List[Dict[str, Any]]:
+    """Chunks in the shape the retriever expects: {chunk_id, text, metadata}."""
+    rng = random.Random(seed)
+    chunks = []
+    for t_idx, (topic, vocab) in enumerate(sorted(TOPICS.items())):
+        for d in range(docs_per_topic):
+            arabic = d % 4 == 3
+            text = " ".join(
+                _sentence(rng, vocab, rng.randint(10, 22), arabic)
+                for _ in range(sentences_per_doc)
+            )
+            metadata = {
+                "source": f"{topic}_{d // 2}.{'pdf' if d % 2 else 'txt'}",
+                "page": d % 2 + 1,
+                "language": "ar" if arabic else "en",
+                "doc_type": "pdf" if d % 2 else "txt",
+                "topic": topic,
+            }
+            chunk_id = hashlib.sha256(f"{text[:100]}_{metadata['source']}_{d}".encode("utf-8")).hexdigest()
+            chunks.append({"chunk_id": chunk_id, "text": text, "metadata": metadata})
+    return chunks
+
+
+def build_queries(
+    chunks: List[Dict[str, Any]],
+    queries_per_topic: int = 3,
+    seed: int = 7
+) -> List[Dict[str, Any]]:
+    """[{query, relevant: [chunk_id...]}] - a chunk is relevant iff it is on the query's topic."""
+    rng = random.Random(seed)
+    by_topic: Dict[str, List[str]] = {}
+    for c in chunks:
+        by_topic.setdefault(c["metadata"]["topic"], []).append(c["chunk_id"])
+
+    queries = []
+    for topic, vocab in sorted(TOPICS.items()):
+        for _ in range(queries_per_topic):
+            terms = rng.sample(vocab, 3)
+            queries.append({
+                "query": f"How does {terms[0]} relate to {terms[1]} and {terms[2]}?",
+                "relevant": by_topic.get(topic, []),
+            })
+    return queries
+
+
+def build_fixture(seed: int = 13, docs_per_topic: int = 8, queries_per_topic: int = 3) -> Tuple[List[Dict], List[Dict]]:
+    chunks = build_corpus(docs_per_topic=docs_per_topic, seed=seed)
+    return chunks, build_queries(chunks, queries_per_topic=queries_per_topic, seed=seed + 1)
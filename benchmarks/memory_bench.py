@@ -0,0 +1,70 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent")]
+
+from semantic_memory import SemanticMemory
+
+'''
+Semantic memory lookup latency at scale (random unit vectors, no model).
+
+    python benchmarks/memory_bench.py --size 1000000 --dim 384
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic memory lookup benchmark")
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--ann-threshold", type=int, default=10_000)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tools = ["rag", "python", "calculator", "direct"]
+    memory = SemanticMemory(capacity=args.size, ann_threshold=args.ann_threshold)
+
+    start = time.perf_counter()
+    for offset in range(0, args.size, args.batch):
+        n = min(args.batch, args.size - offset)
+        memory.add(rng.standard_normal((n, args.dim)).astype("float32"), [tools[i % 4] for i in range(n)])
+    fill_s = time.perf_counter() - start
+
+    queries = rng.standard_normal((args.queries, args.dim)).astype("float32")
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        memory.search(q, k=1)
+        latencies.append((time.perf_counter() - t) * 1000.0)
+
+    # full memory: one more batch goes through decay-weighted eviction
+    start = time.perf_counter()
+    memory.add(rng.standard_normal((10, args.dim)).astype("float32"), ["rag"] * 10)
+    evict_ms = (time.perf_counter() - start) * 1000.0
+
+    report = {
+        "size": len(memory),
+        "dim": args.dim,
+        "ann": memory._ann is not None,
+        "fill_s": fill_s,
+        "lookup_ms_p50": float(np.percentile(latencies, 50)),
+        "lookup_ms_p99": float(np.percentile(latencies, 99)),
+        "evict_add_ms": evict_ms,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
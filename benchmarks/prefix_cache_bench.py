@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent")]
+
+from core.model_registry import registry
+from llm import LLMClient
+from planner import planner_prefix, _render, PLANNER_PROMPT_VERSION
+from router import ROUTER_PREFIX, ROUTER_PROMPT_VERSION
+
+'''
+Time-to-first-token for planner and router prompts, with and without the
+precomputed prefix KV cache.
+
+    python benchmarks/prefix_cache_bench.py --model Qwen/Qwen2.5-0.5B-Instruct
+'''
+
+QUERIES = [
+    "Explain attention in transformers and give code",
+    "What are the two main pre-training objectives used in BERT?",
+    "Calculate 512 * 512 and explain the memory cost of self-attention",
+]
+
+STEPS = [
+    "Retrieve info about Attention from KB",
+    "Calculate 512 * 512",
+    "Run the LoRA example code",
+    "Summarize concept",
+]
+
+
+def ttft_ms(llm: LLMClient, prompt: str, prefix, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        llm.generate(prompt, max_new_tokens=1, do_sample=False, prefix=prefix)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def bench(llm: LLMClient, name: str, prompts, repeat: int):
+    plain, cached = [], []
+    for prompt in prompts:
+        ttft_ms(llm, prompt, name, 1)  # builds the prefix cache once, outside the timings
+        plain += ttft_ms(llm, prompt, None, repeat)
+        cached += ttft_ms(llm, prompt, name, repeat)
+    plain_ms, cached_ms = statistics.median(plain), statistics.median(cached)
+    return {
+        "prefix_tokens": llm.prefixes.get(name).length,
+        "ttft_ms_plain": plain_ms,
+        "ttft_ms_cached": cached_ms,
+        "reduction": 1.0 - cached_ms / plain_ms if plain_ms else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix KV cache time-to-first-token benchmark")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--backend", default="hf")
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model, tokenizer = registry.causal_lm(args.model, backend=args.backend, dtype=args.dtype)
+    llm = LLMClient(model, tokenizer, max_wait_ms=0)
+    llm.register_prefix("planner", planner_prefix(tokenizer), PLANNER_PROMPT_VERSION)
+    llm.register_prefix("router", ROUTER_PREFIX, ROUTER_PROMPT_VERSION)
+
+    report = {
+        "model": args.model,
+        "planner": bench(llm, "planner", [_render(tokenizer, q) for q in QUERIES], args.repeat),
+        "router": bench(llm, "router", [ROUTER_PREFIX + f'Task: "{s}"\nTool:' for s in STEPS], args.repeat),
+    }
+    llm.close()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
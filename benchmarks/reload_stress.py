@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Dict, List, Any
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from benchmarks.fixtures import build_corpus, build_queries
+from indexing.embedder import EmbeddingEngine
+from pipeline import SmartHybridRetriever
+
+'''
+Hot index reload under load.
+
+    python benchmarks/reload_stress.py --threads 8 --swaps 6
+
+Reader threads call retrieve() in a loop while the main thread swaps between
+a few fixture corpora (different seeds, so their chunk ids never overlap).
+Every answer must come from exactly one generation: all records carry the
+same generation number and every chunk they contain belongs to the corpus
+that generation was built from. Exits 1 on any error or mixed answer.
+'''
+
+
+def record_ids(record: Dict[str, Any]) -> List[str]:
+    return list(record.get("span") or record.get("chunk_ids") or [record["chunk_id"]])
+
+
+def reader(retriever, queries, stop, top_k, seed, answers, errors):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        query = rng.choice(queries)["query"]
+        start = time.perf_counter()
+        try:
+            results = retriever.retrieve(query, top_k=top_k)
+        except Exception as e:
+            errors.append(repr(e))
+            continue
+        answers.append((time.perf_counter() - start, results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent retrieve() during index swaps")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--reranker-model", default="cross-encoder/ms-marco-TinyBERT-L-2-v2")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--swaps", type=int, default=6)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds of traffic between swaps")
+    parser.add_argument("--corpora", type=int, default=3)
+    parser.add_argument("--docs-per-topic", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    embedder = EmbeddingEngine(model_name=args.embedding_model, batch_size=32)
+    corpora = []
+    for i in range(args.corpora):
+        chunks = build_corpus(docs_per_topic=args.docs_per_topic, seed=13 + i)
+        corpora.append((chunks, embedder.embed(chunks)))
+    queries = build_queries(corpora[0][0])
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        retriever = SmartHybridRetriever(
+            corpora[0][0],
+            corpora[0][1],
+            embedding_model=args.embedding_model,
+            reranker_model=args.reranker_model,
+            index_dir=index_dir
+        )
+        # generation number -> chunk ids it was built from
+        expected = {retriever.generation.number: {c["chunk_id"] for c in corpora[0][0]}}
+        retriever.retrieve(queries[0]["query"], top_k=args.top_k)  # model load is not measured
+
+        stop = threading.Event()
+        answers: List[Any] = []
+        errors: List[str] = []
+        threads = [
+            threading.Thread(target=reader, args=(retriever, queries, stop, args.top_k, i, answers, errors))
+            for i in range(args.threads)
+        ]
+        for t in threads:
+            t.start()
+
+        swaps = []
+        for i in range(1, args.swaps + 1):
+            time.sleep(args.interval)
+            chunks, embeddings = corpora[i % len(corpora)]
+            start = time.perf_counter()
+            info = retriever.reload(chunks, embeddings).result()
+            swaps.append({**info, "seconds": time.perf_counter() - start})
+            expected[info["generation"]] = {c["chunk_id"] for c in chunks}
+        time.sleep(args.interval)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    mixed, foreign, per_generation = 0, 0, {}
+    for _, results in answers:
+        generations = {r["generation"] for r in results}
+        if len(generations) > 1:
+            mixed += 1
+            continue
+        if not generations:
+            continue
+        generation = generations.pop()
+        per_generation[generation] = per_generation.get(generation, 0) + 1
+        if any(cid not in expected[generation] for r in results for cid in record_ids(r)):
+            foreign += 1
+
+    latencies = np.asarray([a[0] for a in answers]) * 1000.0
+    report = {
+        "threads": args.threads,
+        "requests": len(answers),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "mixed_generation_answers": mixed,
+        "foreign_chunk_answers": foreign,
+        "answers_per_generation": per_generation,
+        "retrieve_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "retrieve_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        "swaps": swaps,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    sys.exit(1 if errors or mixed or foreign else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Any
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from benchmarks.fixtures import build_fixture
+from indexing.embedder import EmbeddingEngine
+from pipeline import SmartHybridRetriever
+from retrieval.metrics import recall_at_k, mrr, ndcg_at_k
+from core.tracing import tracer
+
+'''
+Retrieval quality + latency benchmark for the hybrid pipeline.
+
+    python benchmarks/retrieval_bench.py --out bench.json
+    python benchmarks/retrieval_bench.py --baseline bench.json --max-latency-regression 0.2
+
+Runs offline on CPU with tiny models (pass local paths or set HF_HUB_OFFLINE=1
+once they are cached). Reports recall@k / MRR / nDCG@k next to p50/p95/p99
+latency per stage and end-to-end throughput, as JSON.
+'''
+
+STAGES = ["expand", "embed", "faiss", "bm25", "fusion", "rerank", "context", "compress", "total"]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "mean": float(arr.mean()),
+    }
+
+
+def timed_retrieve(retriever: SmartHybridRetriever, query: str, top_k: int, timings: Dict[str, List[float]]):
+    """retriever.retrieve(), with per-stage durations taken from its trace spans."""
+    with tracer.capture() as spans:
+        results = retriever.retrieve(query, top_k=top_k)
+
+    per_stage = defaultdict(float)
+    for span in spans:
+        stage = "total" if span.name == "retrieve" else span.name.split(".", 1)[-1]
+        if stage in STAGES:
+            per_stage[stage] += span.duration
+    for stage, seconds in per_stage.items():
+        timings[stage].append(seconds)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    tracer.enabled = True  # stage timings come from the retriever's spans
+    chunks, queries = build_fixture(seed=args.seed, docs_per_topic=args.docs_per_topic)
+
+    embedder = EmbeddingEngine(model_name=args.embedding_model, batch_size=32)
+    t = time.perf_counter()
+    embeddings = embedder.embed(chunks)
+    index_embed_s = time.perf_counter() - t
+
+    cascade = [("bi-encoder", args.cascade_depth)] if args.cascade_depth else None
+    with tempfile.TemporaryDirectory() as index_dir:
+        t = time.perf_counter()
+        retriever = SmartHybridRetriever(
+            chunks,
+            embeddings,
+            embedding_model=args.embedding_model,
+            reranker_model=args.reranker_model,
+            rerank_cascade=cascade,
+            index_dir=index_dir,
+            compression_budget=args.compression_budget,
+            compression_scorer=args.compression_scorer
+        )
+        index_build_s = time.perf_counter() - t
+
+        if not args.reranker_cache:
+            retriever.reranker.cache = None
+
+        # warm-up loads the models and fills CPU caches
+        for item in queries[:args.warmup]:
+            timed_retrieve(retriever, item["query"], args.top_k, defaultdict(list))
+
+        timings: Dict[str, List[float]] = defaultdict(list)
+        quality = defaultdict(list)
+        context_chars = []
+        wall = time.perf_counter()
+        for _ in range(args.repeat):
+            for item in queries:
+                results = timed_retrieve(retriever, item["query"], args.top_k, timings)
+                ids = [r["chunk_id"] for r in results]
+                context_chars.append(sum(len(r["text"]) for r in results))
+                relevant = set(item["relevant"])
+                quality[f"recall@{args.top_k}"].append(recall_at_k(ids, relevant, args.top_k))
+                quality["mrr"].append(mrr(ids, relevant))
+                quality[f"ndcg@{args.top_k}"].append(ndcg_at_k(ids, relevant, args.top_k))
+        wall = time.perf_counter() - wall
+
+    n_queries = len(queries) * args.repeat
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "embedding_model": args.embedding_model,
+            "reranker_model": args.reranker_model,
+            "cascade_depth": args.cascade_depth,
+            "compression_budget": args.compression_budget,
+            "compression_scorer": args.compression_scorer,
+            "seed": args.seed,
+            "chunks": len(chunks),
+            "queries": n_queries,
+            "top_k": args.top_k,
+        },
+        "quality": {k: float(np.mean(v)) for k, v in quality.items()},
+        "latency_ms": {stage: percentiles(timings[stage]) for stage in STAGES if timings[stage]},
+        "throughput_qps": n_queries / wall if wall else 0.0,
+        "context_chars_mean": float(np.mean(context_chars)) if context_chars else 0.0,
+        "indexing": {"embed_s": index_embed_s, "build_s": index_build_s},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_latency_regression: float, max_quality_drop: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline` (empty list = pass)."""
+    problems = []
+    for metric, base in baseline.get("quality", {}).items():
+        now = current["quality"].get(metric)
+        if now is not None and base - now > max_quality_drop:
+            problems.append(f"quality {metric}: {base:.4f} -> {now:.4f}")
+
+    for stage, base in baseline.get("latency_ms", {}).items():
+        now = current["latency_ms"].get(stage)
+        if now is None:
+            continue
+        for p in ("p50", "p95"):
+            if base[p] > 0 and (now[p] - base[p]) / base[p] > max_latency_regression:
+                problems.append(f"latency {stage} {p}: {base[p]:.2f}ms -> {now[p]:.2f}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid retrieval quality/latency benchmark")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--reranker-model", default="cross-encoder/ms-marco-TinyBERT-L-2-v2")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--docs-per-topic", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--cascade-depth", type=int, default=0, help="bi-encoder shortlist before the reranker (0 = off)")
+    parser.add_argument("--compression-budget", type=int, default=0, help="sentence-level compression token budget (0 = off)")
+    parser.add_argument("--compression-scorer", default="cross-encoder", choices=["cross-encoder", "embedding"])
+    parser.add_argument("--reranker-cache", action="store_true", help="keep the reranker score cache on (off by default so repeats measure real work)")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="previous JSON report to compare against")
+    parser.add_argument("--max-latency-regression", type=float, default=0.2, help="allowed relative p50/p95 slowdown")
+    parser.add_argument("--max-quality-drop", type=float, default=0.01, help="allowed absolute drop per quality metric")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.max_latency_regression, args.max_quality_drop)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
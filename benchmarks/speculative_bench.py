@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent")]
+
+from core.model_registry import registry
+from llm import LLMClient
+
+'''
+Decode throughput of plain vs speculative (draft model) generation, plus the
+draft acceptance rate, for a few draft lengths.
+
+    python benchmarks/speculative_bench.py \
+        --model Qwen/Qwen2.5-1.5B-Instruct --draft Qwen/Qwen2.5-0.5B-Instruct
+'''
+
+PROMPTS = [
+    "Explain how self-attention works in transformers.",
+    "Summarize the two pre-training objectives used in BERT.",
+    "Write a short Python function that applies LoRA to a linear layer.",
+]
+
+
+def tokens_per_second(llm: LLMClient, tokenizer, max_new_tokens: int, repeat: int) -> float:
+    tokens, seconds = 0, 0.0
+    for _ in range(repeat):
+        for prompt in PROMPTS:
+            start = time.perf_counter()
+            text = llm.generate(prompt, max_new_tokens=max_new_tokens, do_sample=False)
+            seconds += time.perf_counter() - start
+            tokens += len(tokenizer.encode(text, add_special_tokens=False))
+    return tokens / seconds if seconds else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative decoding throughput benchmark")
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--draft", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--backend", default="hf")
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--draft-tokens", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model, tokenizer = registry.causal_lm(args.model, backend=args.backend, dtype=args.dtype)
+    draft, _ = registry.causal_lm(args.draft, backend=args.backend, dtype=args.dtype)
+
+    plain = LLMClient(model, tokenizer, max_wait_ms=0)
+    plain.generate(PROMPTS[0], max_new_tokens=4, do_sample=False)  # warm-up
+    baseline = tokens_per_second(plain, tokenizer, args.max_new_tokens, args.repeat)
+    plain.close()
+
+    runs = []
+    for n in args.draft_tokens:
+        llm = LLMClient(model, tokenizer, max_wait_ms=0, draft_model=draft, num_draft_tokens=n)
+        llm.generate(PROMPTS[0], max_new_tokens=4, do_sample=False)
+        llm.speculation.update(runs=0, generated=0, proposed=0, accepted=0)
+        tps = tokens_per_second(llm, tokenizer, args.max_new_tokens, args.repeat)
+        runs.append({
+            "num_draft_tokens": n,
+            "tokens_per_s": tps,
+            "speedup": tps / baseline if baseline else 0.0,
+            "acceptance_rate": llm.acceptance_rate(),
+        })
+        llm.close()
+
+    report = {
+        "model": args.model,
+        "draft": args.draft,
+        "max_new_tokens": args.max_new_tokens,
+        "plain_tokens_per_s": baseline,
+        "speculative": runs,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import re
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional
+
+from core.tracing import tracer
+
+'''
+Deterministic stand-in for agent/llm.py's LLMClient, for load tests on a CPU.
+
+Same surface as the real client (submit / generate / generate_batch /
+agenerate / stream / register_prefix / tokenizer), same queueing: requests
+are collected into batches of up to `max_batch_size` by one worker thread,
+and a batch takes prefill + decode time of its longest member, so queueing
+under concurrency looks like the real thing. Answers depend only on the
+prompt:
+
+    planner      -> the plan registered for the query (or a default plan)
+    router       -> a label picked from the words of the task
+    tool inputs  -> a small Python snippet / the arithmetic in the task
+    anything else (direct steps, synthesis) -> `answer_tokens` filler words
+'''
+
+DEFAULT_PLAN = "1. Retrieve info about the question from KB\n2. Summarize concept"
+WORDS = ["the", "model", "uses", "attention", "over", "retrieved", "context", "to", "answer", "question"]
+ARITHMETIC = re.compile(r"[\d.]+(?:\s*(?:\*\*|[-+*/%])\s*[\d.]+)+")
+
+
+class StubTokenizer:
+    """Enough of a HF tokenizer for the planner's chat template."""
+
+    pad_token_id = 0
+    eos_token_id = 0
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        text = "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+        return text + ("<|assistant|>\n" if add_generation_prompt else "")
+
+
+class _Request:
+    __slots__ = ("prompt", "max_new_tokens", "caller", "future")
+
+    def __init__(self, prompt: str, max_new_tokens: int, caller: str):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.caller = caller
+        self.future: Future = Future()
+
+
+class StubLLMClient:
+    def __init__(
+        self,
+        token_latency: float = 0.02,
+        prefill_latency: float = 0.00005,
+        answer_tokens: int = 64,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        plans: Optional[Dict[str, str]] = None
+    ):
+        """
+        token_latency: seconds per generated token (per batch step)
+        prefill_latency: seconds per prompt word
+        answer_tokens: length of free-text answers (direct steps, synthesis)
+        max_batch_size / max_wait: batching, as in LLMClient
+        plans: {query: numbered plan} returned to the planner for that query
+        """
+        self.tokenizer = StubTokenizer()
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.answer_tokens = answer_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.plans = dict(plans or {})
+        self.prefixes: Dict[str, str] = {}
+        self.stats = {"requests": 0, "batches": 0, "streams": 0, "generated_tokens": 0}
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name="stub-llm-batcher", daemon=True)
+        self._worker.start()
+
+    # -------------------- Answers --------------------
+
+    def _plan(self, prompt: str) -> str:
+        # the query is the user turn of the chat template
+        user = prompt.split("<|user|>\n", 1)[-1].split("\n<|assistant|>", 1)[0].strip()
+        return self.plans.get(user, DEFAULT_PLAN)
+
+    @staticmethod
+    def _route(prompt: str) -> str:
+        task = prompt.rsplit('Task: "', 1)[-1].lower()
+        if re.search(r"\d\s*[-+*/]\s*\d", task):
+            return "calculator"
+        if "code" in task and ("run" in task or "execute" in task):
+            return "python"
+        if "summar" in task or "write" in task:
+            return "direct"
+        return "rag"
+
+    def _filler(self, prompt: str, n: int) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        return " ".join(WORDS[(seed >> (i % 64)) % len(WORDS)] for i in range(n))
+
+    def answer(self, prompt: str, caller: str, max_new_tokens: int) -> str:
+        if caller == "planner":
+            return self._plan(prompt)
+        if caller == "router":
+            return self._route(prompt)
+        if "Write ONLY the Python code" in prompt:
+            task = prompt.split("Task: ", 1)[-1].split("\n", 1)[0]
+            n = 1000 + len(task) * 10
+            return f"total = sum(i * i for i in range({n}))\nprint(total)"
+        if "Extract only the math expression" in prompt:
+            match = ARITHMETIC.search(prompt)
+            return match.group(0) if match else "1 + 1"
+        return self._filler(prompt, min(self.answer_tokens, max_new_tokens))
+
+    def _cost(self, request: _Request, answer: str) -> float:
+        return (
+            len(request.prompt.split()) * self.prefill_latency
+            + min(len(answer.split()), request.max_new_tokens) * self.token_latency
+        )
+
+    # -------------------- LLMClient surface --------------------
+
+    def register_prefix(self, name: str, text: str, version: str = "1"):
+        self.prefixes[name] = text
+
+    def submit(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+        caller: str = "agent",
+        prefix: Optional[str] = None
+    ) -> Future:
+        request = _Request(prompt, max_new_tokens, caller)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        return self.submit(prompt, **kwargs).result()
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        return await asyncio.wrap_future(self.submit(prompt, **kwargs))
+
+    def generate_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        futures = [self.submit(p, **kwargs) for p in prompts]
+        return [f.result() for f in futures]
+
+    def stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+        caller: str = "agent",
+        prefix: Optional[str] = None
+    ) -> Iterator[str]:
+        """Single sequence, not batched (like LLMClient.stream)."""
+        self.stats["streams"] += 1
+        words = self.answer(prompt, caller, max_new_tokens).split()
+        time.sleep(len(prompt.split()) * self.prefill_latency)
+        for i, word in enumerate(words):
+            time.sleep(self.token_latency)
+            self.stats["generated_tokens"] += 1
+            yield word if i == 0 else " " + word
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+    # -------------------- Batching worker --------------------
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            answers = [self.answer(r.prompt, r.caller, r.max_new_tokens) for r in batch]
+            # a batch runs as long as its slowest member
+            time.sleep(max(self._cost(r, a) for r, a in zip(batch, answers)))
+
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["generated_tokens"] += sum(len(a.split()) for a in answers)
+            tracer.count("llm.batches")
+            for request, answer in zip(batch, answers):
+                request.future.set_result(answer)
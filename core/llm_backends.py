@@ -0,0 +1,135 @@
+import os
+import logging
+import warnings
+import importlib.util
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+'''
+Hardware-aware loading for causal LMs.
+
+`resolve_backend()` turns "auto" into a concrete configuration for the
+current machine and `load_causal_lm()` loads a model with it:
+
+    bnb-4bit      NF4 bitsandbytes quantization (CUDA + bitsandbytes)
+    hf            plain from_pretrained in `dtype` (GPU without bitsandbytes, or explicit)
+    cpu-int8      float32 load + dynamic int8 quantization of every nn.Linear
+    prequantized  checkpoint that ships its own quantization_config (GPTQ/AWQ/...)
+
+On CPU the intra-op thread count is set from `threads`, NEURORAG_NUM_THREADS
+or the number of usable cores.
+'''
+
+BACKENDS = ("bnb-4bit", "hf", "cpu-int8", "prequantized")
+THREADS_ENV = "NEURORAG_NUM_THREADS"
+
+
+@dataclass(frozen=True)
+class LoadConfig:
+    backend: str
+    device: str
+    dtype: str
+    threads: Optional[int] = None
+    reason: str = ""
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _cpu_threads(threads: Optional[int]) -> int:
+    if threads:
+        return threads
+    if os.environ.get(THREADS_ENV):
+        return int(os.environ[THREADS_ENV])
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_backend(backend: str = "auto", dtype: str = "auto", threads: Optional[int] = None) -> LoadConfig:
+    """Pick the backend/dtype for this machine; explicit values are kept as given."""
+    import torch
+
+    cuda = torch.cuda.is_available()
+    device = "cuda" if cuda else "cpu"
+
+    if backend == "auto":
+        if cuda and _has("bitsandbytes"):
+            backend, reason = "bnb-4bit", "CUDA with bitsandbytes"
+        elif cuda:
+            backend, reason = "hf", "CUDA without bitsandbytes"
+        else:
+            backend, reason = "cpu-int8", "no CUDA device"
+    elif backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    else:
+        reason = "requested"
+
+    if backend == "bnb-4bit" and not cuda:
+        raise ValueError("bnb-4bit needs a CUDA device; use backend='auto' or 'cpu-int8'")
+
+    if dtype == "auto":
+        # CPU kernels (and dynamic int8 activations) run in float32
+        dtype = "float16" if cuda else "float32"
+
+    return LoadConfig(
+        backend=backend,
+        device=device,
+        dtype=dtype,
+        threads=None if cuda else _cpu_threads(threads),
+        reason=reason
+    )
+
+
+def _quantize_int8(model):
+    """Dynamic int8 weights (activations quantized on the fly) for every nn.Linear."""
+    import torch
+
+    # torch.ao eager quantization is deprecated in favour of torchao but is
+    # still the one int8 path that ships with torch itself
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", (DeprecationWarning, UserWarning))
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_causal_lm(model_name: str, config: LoadConfig) -> Tuple[Any, Any]:
+    """Returns (model, tokenizer) loaded with `config`."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    if config.threads:
+        torch.set_num_threads(config.threads)
+
+    torch_dtype = getattr(torch, config.dtype)
+    kwargs: Dict[str, Any] = {"torch_dtype": torch_dtype}
+    if config.device == "cuda":
+        kwargs["device_map"] = "auto"
+
+    if config.backend == "bnb-4bit":
+        from transformers import BitsAndBytesConfig
+        kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch_dtype,
+            bnb_4bit_use_double_quant=True
+        )
+    elif config.backend == "prequantized":
+        # the checkpoint's own quantization_config decides the weight format
+        kwargs.pop("torch_dtype")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, **kwargs)
+
+    if config.backend == "cpu-int8":
+        model = _quantize_int8(model.eval())
+
+    logging.info(
+        f"causal_lm '{model_name}': backend={config.backend} device={config.device} "
+        f"dtype={config.dtype} threads={config.threads} ({config.reason})"
+    )
+    return model, tokenizer
@@ -0,0 +1,223 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+'''
+Process-wide model registry.
+
+Every heavy model (LLM, embedder, cross-encoder) is loaded once per
+(kind, model name, backend, dtype) on first use and the same handle is
+shared by the planner, router, agent loop, retriever and memory.
+'''
+
+ModelKey = Tuple[str, str, str, str]
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (0 if unknown)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak in KiB on Linux, a reasonable fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, ValueError):
+        return 0
+
+
+def _tensor_bytes(value: Any) -> int:
+    if hasattr(value, "numel") and hasattr(value, "element_size"):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        # dynamically quantized Linear layers keep (weight, bias) in packed params
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def _param_bytes(model: Any) -> int:
+    """Bytes held by torch parameters/buffers (quantized weights included) reachable from `model`."""
+    candidates = [model]
+    if isinstance(model, tuple):
+        candidates = list(model)
+    candidates += [getattr(m, "model", None) for m in list(candidates)]
+
+    for m in candidates:
+        if m is not None and hasattr(m, "state_dict") and hasattr(m, "parameters"):
+            try:
+                return int(sum(_tensor_bytes(v) for v in m.state_dict().values()))
+            except Exception:
+                continue
+    return 0
+
+
+@dataclass
+class ModelHandle:
+    key: ModelKey
+    model: Any
+    load_seconds: float
+    rss_delta_bytes: int
+    param_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+    hits: int = 0
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        kind, name, backend, dtype = self.key
+        return {
+            "kind": kind,
+            "model_name": name,
+            "backend": backend,
+            "dtype": dtype,
+            "load_seconds": round(self.load_seconds, 3),
+            "rss_delta_mb": round(self.rss_delta_bytes / 2**20, 1),
+            "param_mb": round(self.param_bytes / 2**20, 1),
+            "hits": self.hits,
+            **{k: v for k, v in self.meta.items() if k not in ("backend", "dtype")},
+        }
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: Dict[ModelKey, ModelHandle] = {}
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    # -------------------- Core --------------------
+
+    def get(
+        self,
+        kind: str,
+        model_name: str,
+        loader: Callable[[], Any],
+        backend: str = "default",
+        dtype: str = "auto",
+        meta: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Return the shared model for the key, calling `loader()` exactly once
+        even when several threads ask for it at the same time.
+        meta: extra load details kept with the entry and shown in stats()
+        """
+        key = (kind, model_name, backend, dtype)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+            # only threads asking for the same model wait on each other
+            with key_lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._load(key, loader, meta)
+
+        with self._lock:
+            entry.hits += 1  # many request threads share one entry
+        return entry.model
+
+    def _load(self, key: ModelKey, loader: Callable[[], Any], meta: Optional[Dict[str, Any]] = None) -> ModelHandle:
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = loader()
+        elapsed = time.perf_counter() - start
+
+        entry = ModelHandle(
+            key=key,
+            model=model,
+            load_seconds=elapsed,
+            rss_delta_bytes=max(_rss_bytes() - rss_before, 0),
+            param_bytes=_param_bytes(model),
+            meta=meta or {}
+        )
+        with self._lock:
+            self._entries[key] = entry
+
+        logging.info(f"loaded {key[0]} '{key[1]}' ({key[2]}/{key[3]}) in {elapsed:.1f}s")
+        return entry
+
+    def is_loaded(self, kind: str, model_name: str, backend: str = "default", dtype: str = "auto") -> bool:
+        return (kind, model_name, backend, dtype) in self._entries
+
+    def release(self, kind: str, model_name: str, backend: str = "default", dtype: str = "auto"):
+        """Drop the registry reference; the model is freed once no caller holds it."""
+        with self._lock:
+            self._entries.pop((kind, model_name, backend, dtype), None)
+
+    # -------------------- Reporting --------------------
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return [e.as_dict() for e in sorted(entries, key=lambda e: e.loaded_at)]
+
+    def report(self) -> str:
+        lines = ["kind                model                                    backend      load_s   rss_mb  param_mb  threads"]
+        for s in self.stats():
+            lines.append(
+                f"{s['kind']:<19} {s['model_name']:<40} {s['backend']:<12} "
+                f"{s['load_seconds']:>6} {s['rss_delta_mb']:>8} {s['param_mb']:>9} {s.get('threads') or '-':>8}"
+            )
+        return "\n".join(lines)
+
+    # -------------------- Typed helpers --------------------
+
+    def sentence_transformer(self, model_name: str):
+        def _load():
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name)
+        return self.get("sentence_transformer", model_name, _load)
+
+    def cross_encoder(self, model_name: str, max_length: Optional[int] = None):
+        def _load():
+            from sentence_transformers import CrossEncoder
+            return CrossEncoder(model_name, max_length=max_length)
+        dtype = f"max_len={max_length}" if max_length else "auto"
+        return self.get("cross_encoder", model_name, _load, dtype=dtype)
+
+    def causal_lm(
+        self,
+        model_name: str,
+        backend: str = "auto",
+        dtype: str = "auto",
+        threads: Optional[int] = None
+    ):
+        """
+        Returns (model, tokenizer) for a causal LM.
+        backend: "auto" picks one for the hardware (see core/llm_backends.py),
+        or one of "bnb-4bit", "hf", "cpu-int8", "prequantized".
+        """
+        from core.llm_backends import resolve_backend, load_causal_lm
+
+        config = resolve_backend(backend, dtype, threads)
+        return self.get(
+            "causal_lm", model_name,
+            lambda: load_causal_lm(model_name, config),
+            backend=config.backend,
+            dtype=config.dtype,
+            meta=config.as_dict()
+        )
+
+    def embed_fn(self, model_name: str) -> Callable[[str], np.ndarray]:
+        """text -> normalized embedding, backed by the shared SentenceTransformer."""
+        def _embed(text: str) -> np.ndarray:
+            model = self.sentence_transformer(model_name)
+            return model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+        return _embed
+
+    def embed_batch_fn(self, model_name: str, batch_size: int = 64) -> Callable[[List[str]], np.ndarray]:
+        """texts -> (n, dim) normalized embeddings in one encode() call."""
+        def _embed(texts: List[str]) -> np.ndarray:
+            model = self.sentence_transformer(model_name)
+            return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+        return _embed
+
+
+registry = ModelRegistry()
@@ -0,0 +1,208 @@
+import os
+import time
+import itertools
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+'''
+Lightweight in-process tracing and metrics.
+
+    with tracer.span("retrieve.faiss", candidates=10) as span:
+        ...
+        span.set("hits", 3)
+
+Every finished span feeds a per-stage latency histogram; `count()` feeds
+counters (tokens, candidates, cache hits). `export_prometheus()` renders both
+in Prometheus text format. With tracing disabled (NEURORAG_TRACING=0 or
+tracer.enabled = False) `span()` returns a shared no-op object and `count()`
+returns immediately.
+'''
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("neurorag_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _label_value(value: Any) -> str:
+    """Prometheus label value: always a string, with \\, " and newlines escaped."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "trace_id", "start", "duration", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.duration = 0.0
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    def set(self, key: str, value: Any):
+        self.attrs[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "trace_id": self.trace_id,
+            "duration_ms": self.duration * 1000.0,
+            "attrs": dict(self.attrs),
+        }
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Tracer:
+    def __init__(self, enabled: Optional[bool] = None, buckets=DEFAULT_BUCKETS, keep_spans: int = 2048):
+        if enabled is None:
+            enabled = os.environ.get("NEURORAG_TRACING", "1") != "0"
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.recent = deque(maxlen=keep_spans)
+        self.exporters: List[Callable[[Span], None]] = []
+
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    # -------------------- Recording --------------------
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def count(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        # label values are strings, as in Prometheus (None -> ""), so keys stay sortable
+        key = (name, tuple(sorted((k, "" if v is None else str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration measured elsewhere into the stage histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = _Histogram(self.buckets)
+            hist.observe(seconds)
+
+    def _finish(self, span: Span):
+        self.observe(span.name, span.duration)
+        self.recent.append(span)
+        for exporter in self.exporters:
+            exporter(span)
+
+    @contextmanager
+    def capture(self):
+        """Collect spans finished inside the block (benchmarks, debugging)."""
+        spans: List[Span] = []
+        self.exporters.append(spans.append)
+        try:
+            yield spans
+        finally:
+            self.exporters.remove(spans.append)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.recent.clear()
+
+    # -------------------- Export --------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"count": h.count, "sum_s": h.sum, "mean_ms": (h.sum / h.count * 1000.0) if h.count else 0.0}
+                    for name, h in self._histograms.items()
+                },
+                "counters": {
+                    name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                    for (name, labels), value in self._counters.items()
+                },
+            }
+
+    def export_prometheus(self, prefix: str = "neurorag") -> str:
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of each traced stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for le, n in zip(self.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{_label_value(name)}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{_label_value(name)}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{_label_value(name)}"}} {h.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{_label_value(name)}"}} {h.count}')
+
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"{prefix}_{name.replace('.', '_')}_total"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                label_text = ",".join(f'{k}="{_label_value(v)}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
@@ -0,0 +1,545 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Annotated, Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent"), os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import AfterValidator, BaseModel, Field
+
+from core.tracing import tracer
+from indexing.metadata_filter import FILTER_FIELDS
+
+'''
+HTTP server for the retriever and the agent.
+
+Models, the index and the agent are built once, on a background thread at
+startup, so /healthz answers while they load and /readyz turns 200 once they
+are ready. Each expensive stage (llm, reranker, python) has a concurrency
+limit and a bounded wait queue; a request that finds the queue full gets a
+429 instead of piling up.
+
+    python main.py --port 8000
+    NEURORAG_LLM_MODEL=/tmp/tiny-llm NEURORAG_EMBED_MODEL=/tmp/tiny-embed \\
+        NEURORAG_RERANK_MODEL=/tmp/tiny-reranker NEURORAG_BACKEND=hf python main.py
+
+    curl -s localhost:8000/retrieve -d '{"query": "what is lora?"}' -H 'content-type: application/json'
+    curl -sN localhost:8000/agent -d '{"query": "explain attention"}' -H 'content-type: application/json'
+    curl -s -X POST localhost:8000/reload   # pick up new documents without a restart
+
+Without NEURORAG_DATA_DIR (or when it has no documents) the synthetic
+benchmark corpus is indexed, which is enough to try the server locally.
+'''
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+@dataclass(frozen=True)
+class Settings:
+    llm_model: str = "Qwen/Qwen2.5-1.5B-Instruct"
+    embedding_model: str = "BAAI/bge-m3"
+    reranker_model: str = "BAAI/bge-reranker-large"
+    backend: str = "auto"
+    data_dir: Optional[str] = None
+    index_dir: str = "data/processed"
+    memory_db: str = "agent_memory.db"
+    tool_cache_db: Optional[str] = None
+    compression_budget: int = 0
+    python_workers: int = 2
+    # (concurrent, queued) per stage
+    llm_limit: int = 4
+    llm_queue: int = 16
+    reranker_limit: int = 4
+    reranker_queue: int = 32
+    python_limit: int = 2
+    python_queue: int = 8
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        env = os.environ.get
+        return cls(
+            llm_model=env("NEURORAG_LLM_MODEL", cls.llm_model),
+            embedding_model=env("NEURORAG_EMBED_MODEL", cls.embedding_model),
+            reranker_model=env("NEURORAG_RERANK_MODEL", cls.reranker_model),
+            backend=env("NEURORAG_BACKEND", cls.backend),
+            data_dir=env("NEURORAG_DATA_DIR"),
+            index_dir=env("NEURORAG_INDEX_DIR", cls.index_dir),
+            memory_db=env("NEURORAG_MEMORY_DB", cls.memory_db),
+            tool_cache_db=env("NEURORAG_TOOL_CACHE_DB"),
+            compression_budget=_env_int("NEURORAG_COMPRESSION_BUDGET", cls.compression_budget),
+            python_workers=_env_int("NEURORAG_PYTHON_WORKERS", cls.python_workers),
+            llm_limit=_env_int("NEURORAG_LLM_CONCURRENCY", cls.llm_limit),
+            llm_queue=_env_int("NEURORAG_LLM_QUEUE", cls.llm_queue),
+            reranker_limit=_env_int("NEURORAG_RERANK_CONCURRENCY", cls.reranker_limit),
+            reranker_queue=_env_int("NEURORAG_RERANK_QUEUE", cls.reranker_queue),
+            python_limit=_env_int("NEURORAG_PYTHON_CONCURRENCY", cls.python_limit),
+            python_queue=_env_int("NEURORAG_PYTHON_QUEUE", cls.python_queue),
+        )
+
+
+# -------------------- Admission control --------------------
+
+class StageSaturated(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} queue is full, retry later")
+        self.stage = stage
+
+
+class _Ticket:
+    """A reserved place in a stage: waits for a slot on acquire(), frees both on release()."""
+
+    def __init__(self, limiter: "StageLimiter"):
+        self.limiter = limiter
+        self._acquired = False
+        self._released = False
+        self._lock = threading.Lock()  # release() may come from another thread (agent on_done)
+
+    def acquire(self):
+        start = time.perf_counter()
+        self.limiter._slots.acquire()
+        self._acquired = True
+        tracer.observe(f"server.queue_wait.{self.limiter.name}", time.perf_counter() - start)
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        if self._acquired:
+            self.limiter._slots.release()
+        self.limiter._leave()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class StageLimiter:
+    """At most `concurrency` calls running and `queue_size` waiting; beyond that, StageSaturated."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.stats = {"admitted": 0, "rejected": 0}
+
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+        self._pending = 0  # running + waiting
+
+    def _reject_if_full(self):
+        # caller holds self._lock
+        if self._pending >= self.concurrency + self.queue_size:
+            self.stats["rejected"] += 1
+            tracer.count("server.rejected", stage=self.name)
+            raise StageSaturated(self.name)
+
+    def check(self):
+        """StageSaturated if reserve() would fail right now; takes no place."""
+        with self._lock:
+            self._reject_if_full()
+
+    def reserve(self) -> _Ticket:
+        with self._lock:
+            self._reject_if_full()
+            self._pending += 1
+            self.stats["admitted"] += 1
+        return _Ticket(self)
+
+    def _leave(self):
+        with self._lock:
+            self._pending -= 1
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue_size": self.queue_size,
+                "pending": self._pending,
+                **self.stats,
+            }
+
+
+class _LimitedTool:
+    """Tool proxy whose `method` goes through a stage limiter; a full queue becomes an error result."""
+
+    def __init__(self, tool, limiter: StageLimiter, method: str):
+        self._tool = tool
+        self._limiter = limiter
+        self._method = method
+
+    def __getattr__(self, name):
+        attr = getattr(self._tool, name)
+        if name != self._method:
+            return attr
+
+        def _call(*args, **kwargs):
+            try:
+                ticket = self._limiter.reserve()
+            except StageSaturated as e:
+                return {"status": "error", "output": str(e)}
+            with ticket:
+                return attr(*args, **kwargs)
+        return _call
+
+
+# -------------------- Services --------------------
+
+def _load_chunks(settings: Settings, chunker_model: str) -> List[Dict[str, Any]]:
+    if settings.data_dir and os.path.isdir(settings.data_dir):
+        from pathlib import Path
+        from indexing.data_ingestion import load
+        from indexing.chunker import RecursiveChunker
+
+        docs = load(Path(settings.data_dir))
+        if docs:
+            # core chunks only; the retriever widens hits with their neighbours at read time
+            return RecursiveChunker(model_name=chunker_model, link_neighbours=True).chunk_text(docs)
+        logging.warning(f"no documents in {settings.data_dir}, indexing the benchmark corpus")
+
+    from benchmarks.fixtures import build_corpus
+    return build_corpus()
+
+
+class Services:
+    """Everything the endpoints share; built once per process."""
+
+    def __init__(self, settings: Settings, retriever, agent, limiters: Dict[str, StageLimiter], closers=()):
+        self.settings = settings
+        self.retriever = retriever
+        self.agent = agent
+        self.limiters = limiters
+        self._closers = list(closers)
+        self._reload: Optional[Future] = None
+        self._reload_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, settings: Settings) -> "Services":
+        from core.model_registry import registry
+        from indexing.embedder import EmbeddingEngine
+        from pipeline import SmartHybridRetriever
+        from tools.rag_tool import RAGTool
+        from tools.calc_tool import CalcTool
+        from tools.python_tool import PythonTool
+        from memory import AgentMemory
+        from tool_cache import ToolCache
+        from loop import FullAgentSystem
+
+        limiters = {
+            "llm": StageLimiter("llm", settings.llm_limit, settings.llm_queue),
+            "reranker": StageLimiter("reranker", settings.reranker_limit, settings.reranker_queue),
+            "python": StageLimiter("python", settings.python_limit, settings.python_queue),
+        }
+
+        with tracer.span("server.load_index"):
+            chunks = _load_chunks(settings, settings.embedding_model)
+            embeddings = EmbeddingEngine(model_name=settings.embedding_model).embed(chunks)
+            os.makedirs(settings.index_dir, exist_ok=True)
+            retriever = SmartHybridRetriever(
+                chunks,
+                embeddings,
+                embedding_model=settings.embedding_model,
+                reranker_model=settings.reranker_model,
+                index_dir=settings.index_dir,
+                compression_budget=settings.compression_budget
+            )
+
+        with tracer.span("server.load_agent"):
+            model, tokenizer = registry.causal_lm(settings.llm_model, backend=settings.backend)
+            python_tool = PythonTool(workers=settings.python_workers)
+            memory = AgentMemory(db_path=settings.memory_db, embed_model=settings.embedding_model)
+            agent = FullAgentSystem(
+                model=model,
+                tokenizer=tokenizer,
+                tools={
+                    "python": _LimitedTool(python_tool, limiters["python"], "run_code"),
+                    "calculator": CalcTool(),
+                },
+                memory=memory,
+                rag_tool=_LimitedTool(RAGTool(retriever), limiters["reranker"], "run"),
+                tool_cache=ToolCache(db_path=settings.tool_cache_db)
+            )
+
+        logging.info("models loaded:\n" + registry.report())
+        return cls(settings, retriever, agent, limiters, closers=[python_tool.close, memory.close])
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload is not None and not self._reload.done()
+
+    def reload(self) -> Optional[Future]:
+        """
+        Re-read the corpus and swap a new index generation into the retriever,
+        off the request path; None if a reload is already running.
+        """
+        with self._reload_lock:
+            if self.reloading:
+                return None
+            future: Future = Future()
+            self._reload = future
+
+        def _run():
+            try:
+                from indexing.embedder import EmbeddingEngine
+                chunks = _load_chunks(self.settings, self.settings.embedding_model)
+                embeddings = EmbeddingEngine(model_name=self.settings.embedding_model).embed(chunks)
+                future.set_result(self.retriever.reload(chunks, embeddings).result())
+            except BaseException as e:
+                logging.exception("reload failed")
+                future.set_exception(e)
+
+        threading.Thread(target=_run, name="server-reload", daemon=True).start()
+        return future
+
+    def close(self):
+        for close in self._closers:
+            try:
+                close()
+            except Exception:
+                logging.exception("shutdown step failed")
+
+
+class _NotReady(Exception):
+    def __init__(self, error: Optional[str] = None):
+        super().__init__(f"startup failed: {error}" if error else "models are still loading")
+
+
+class _State:
+    def __init__(self):
+        self.services: Optional[Services] = None
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.ready_at: Optional[float] = None
+
+
+# -------------------- API --------------------
+
+def _known_fields(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # the indexes raise on other fields: reject them here as a 422, not a 500 mid-request
+    unknown = sorted(set(filters or ()) - set(FILTER_FIELDS))
+    if unknown:
+        raise ValueError(f"unknown filter fields {unknown}, expected some of {list(FILTER_FIELDS)}")
+    return filters
+
+
+Filters = Annotated[Optional[Dict[str, Any]], AfterValidator(_known_fields)]
+
+
+class RetrieveRequest(BaseModel):
+    query: str = Field(min_length=1)
+    top_k: int = Field(5, ge=1, le=100)
+    filters: Filters = None
+
+
+class RetrieveBatchRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=64)
+    top_k: int = Field(5, ge=1, le=100)
+    filters: Filters = None
+
+
+class AgentRequest(BaseModel):
+    query: str = Field(min_length=1)
+
+
+def _json_default(value):
+    # numpy scores/vectors from the retriever and tools
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _jsonable(value):
+    return json.loads(json.dumps(value, default=_json_default))
+
+
+def create_app(settings: Optional[Settings] = None, services: Optional[Services] = None) -> FastAPI:
+    """
+    services: prebuilt Services (tests, embedding the app elsewhere); when
+        omitted they are built from `settings` on a background thread at startup
+    """
+    settings = settings or Settings.from_env()
+    state = _State()
+
+    def _load():
+        try:
+            state.services = Services.build(settings)
+            state.ready_at = time.time()
+        except Exception as e:
+            logging.exception("startup failed")
+            state.error = repr(e)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if services is not None:
+            state.services = services
+            state.ready_at = time.time()
+        else:
+            threading.Thread(target=_load, name="server-startup", daemon=True).start()
+        yield
+        if state.services is not None:
+            state.services.close()
+
+    app = FastAPI(title="NeuroRAG", lifespan=lifespan)
+    app.state.neurorag = state
+
+    @app.exception_handler(StageSaturated)
+    async def _saturated(request: Request, exc: StageSaturated):
+        return JSONResponse({"detail": str(exc), "stage": exc.stage}, status_code=429, headers={"Retry-After": "1"})
+
+    def _services() -> Services:
+        if state.services is None:
+            raise _NotReady(state.error)
+        return state.services
+
+    @app.exception_handler(_NotReady)
+    async def _not_ready(request: Request, exc: _NotReady):
+        return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+    # -------------------- Probes --------------------
+
+    @app.get("/healthz")
+    def healthz():
+        # a failed startup will not fix itself: let the orchestrator restart us
+        if state.error is not None:
+            return JSONResponse({"status": "failed", "error": state.error}, status_code=500)
+        return {"status": "ok", "uptime_s": round(time.time() - state.started, 1)}
+
+    @app.get("/readyz")
+    def readyz():
+        if state.services is None:
+            return JSONResponse({"status": "loading" if state.error is None else "failed"}, status_code=503)
+        return {
+            "status": "ready",
+            "index": state.services.retriever.generation.info(),
+            "reloading": state.services.reloading,
+            "stages": {name: limiter.state() for name, limiter in state.services.limiters.items()},
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        lines = [tracer.export_prometheus()]
+        if state.services is not None:
+            lines.append("# TYPE neurorag_stage_pending gauge")
+            for name, limiter in state.services.limiters.items():
+                lines.append(f'neurorag_stage_pending{{stage="{name}"}} {limiter.state()["pending"]}')
+            generation = state.services.retriever.generation
+            lines.append("# TYPE neurorag_index_generation gauge")
+            lines.append(f'neurorag_index_generation{{index_version="{generation.version}"}} {generation.number}')
+            lines.append("# TYPE neurorag_index_chunks gauge")
+            lines.append(f"neurorag_index_chunks {len(generation.chunk_lookup)}")
+        lines.append("# TYPE neurorag_ready gauge")
+        lines.append(f"neurorag_ready {int(state.services is not None)}")
+        return "\n".join(lines) + "\n"
+
+    # -------------------- Retrieval --------------------
+
+    # plain `def` endpoints run on the threadpool, so waiting for a slot never blocks the loop
+    @app.post("/retrieve")
+    def retrieve(request: RetrieveRequest):
+        svc = _services()
+        with svc.limiters["reranker"].reserve():
+            start = time.perf_counter()
+            # the generation that answered, even with no hits
+            with svc.retriever.reading() as generation:
+                results = svc.retriever.retrieve(request.query, request.top_k, filters=request.filters, generation=generation)
+        return {
+            "query": request.query,
+            "generation": generation.number,
+            "results": _jsonable(results),
+            "took_ms": round((time.perf_counter() - start) * 1000.0, 2),
+        }
+
+    @app.post("/retrieve_batch")
+    def retrieve_batch(request: RetrieveBatchRequest):
+        svc = _services()
+        # one place in the queue for the whole batch: it is admitted or rejected as a unit
+        with svc.limiters["reranker"].reserve():
+            start = time.perf_counter()
+            results = []
+            for q in request.queries:
+                # a reload can land between two queries: each one names its own generation
+                with svc.retriever.reading() as generation:
+                    hits = svc.retriever.retrieve(q, request.top_k, filters=request.filters, generation=generation)
+                results.append({"query": q, "generation": generation.number, "results": _jsonable(hits)})
+        return {"results": results, "took_ms": round((time.perf_counter() - start) * 1000.0, 2)}
+
+    @app.post("/reload", status_code=202)
+    def reload():
+        """Rebuild the index from the corpus in the background; serving continues on the current one."""
+        svc = _services()
+        if svc.reload() is None:
+            return JSONResponse({"detail": "a reload is already running"}, status_code=409)
+        return {"status": "reloading", "generation": svc.retriever.generation.number}
+
+    # -------------------- Agent --------------------
+
+    @app.post("/agent")
+    def agent(request: AgentRequest):
+        """Agent events as NDJSON, one `{"type": ...}` object per line (see FullAgentSystem.stream)."""
+        svc = _services()
+        limiter = svc.limiters["llm"]
+        # 429 while the queue is full; the place itself is taken once the body starts,
+        # so a response that is dropped before its first chunk holds nothing
+        limiter.check()
+
+        def _events():
+            try:
+                ticket = limiter.reserve()
+            except StageSaturated as e:
+                # the last place went between check() and the first chunk
+                yield json.dumps({"type": "error", "message": str(e), "stage": e.stage}) + "\n"
+                return
+
+            stream = None
+            try:
+                ticket.acquire()
+                # the slot is freed when the run has really stopped, not when the client leaves
+                stream = svc.agent.stream(request.query, on_done=ticket.release)
+                for event in stream:
+                    yield json.dumps(event, default=_json_default, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logging.exception("agent run failed")
+                yield json.dumps({"type": "error", "message": repr(e)}) + "\n"
+            finally:
+                if stream is not None:
+                    stream.close()  # cancels what is left of the plan; on_done follows
+                else:
+                    ticket.release()
+
+        return StreamingResponse(_events(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NeuroRAG HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    logging.basicConfig(level=args.log_level.upper())
+    settings = Settings.from_env()
+    logging.info(f"settings: {asdict(settings)}")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
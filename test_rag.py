@@ -1,39 +1,53 @@
-from agent.loop import FullAgentSystem
-from transformers import AutoTokenizer, AutoModelForCausalLM , BitsAndBytesConfig
-import torch
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent"), os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from loop import FullAgentSystem, print_event
+from memory import AgentMemory
+from core.model_registry import registry
 from tools.python_tool import PythonTool
 from tools.calc_tool import CalcTool
 from tools.rag_tool import RAGTool
-from agent.memory import AgentMemory
+from indexing.embedder import EmbeddingEngine
+from pipeline import SmartHybridRetriever
+from benchmarks.fixtures import build_corpus
 
 MODEL_NAME = "Qwen/Qwen2.5-1.5B-Instruct"
-
-# 4 bit quantization
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.float16,
-    bnb_4bit_use_double_quant=True
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+RERANKER_MODEL = "cross-encoder/ms-marco-TinyBERT-L-2-v2"
+
+# same handle the planner uses -> the LLM is loaded only once
+model, tokenizer = registry.causal_lm(MODEL_NAME)
+
+# small retriever over the fixture corpus (see main.py for a real data directory)
+chunks = build_corpus()
+retriever = SmartHybridRetriever(
+    chunks,
+    EmbeddingEngine(model_name=EMBEDDING_MODEL).embed(chunks),
+    embedding_model=EMBEDDING_MODEL,
+    reranker_model=RERANKER_MODEL
 )
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    torch_dtype = torch.float16 ,
-    quantization_config=bnb_config,
-    device_map="auto")
-
 # --- System Execution ---
 
+python_tool = PythonTool()
+memory = AgentMemory(embed_model=EMBEDDING_MODEL)
 
 agent_system = FullAgentSystem(
     model=model,
     tokenizer=tokenizer,
-    tools={"python": PythonTool, "calculator": CalcTool},
-    memory=AgentMemory,
-    rag_tool=RAGTool
+    tools={"python": python_tool, "calculator": CalcTool()},
+    memory=memory,
+    rag_tool=RAGTool(retriever)
 )
 
 
 query = "What are the two main pre-training objectives used in BERT and give me  a code for lora?"
-agent_system.run(query)
\ No newline at end of file
+for event in agent_system.stream(query):
+    print_event(event)
+
+python_tool.close()
+memory.close()
+print(registry.report())
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# same import layout as main.py and the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "agent"), os.path.join(ROOT, "Hyprid_RagSystem")]
+
+from core.model_registry import registry
+from indexing import bm25_index
+from indexing.embedder import EmbeddingEngine
+from pipeline import SmartHybridRetriever
+from stubs import StubEmbedder, StubReranker, corpus
+
+
+@pytest.fixture
+def make_retriever(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, "sentence_transformer", lambda name: StubEmbedder())
+    monkeypatch.setattr(registry, "cross_encoder", lambda name, max_length=None: StubReranker())
+    monkeypatch.setattr(bm25_index.nltk, "word_tokenize", str.split)  # no punkt data offline
+
+    def make(**kwargs):
+        chunks = corpus("a")
+        return SmartHybridRetriever(chunks, EmbeddingEngine("stub").embed(chunks), index_dir=str(tmp_path), **kwargs)
+
+    return make
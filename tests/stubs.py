@@ -0,0 +1,38 @@
+import hashlib
+
+import numpy as np
+
+
+class StubEmbedder:
+    """Bag-of-words hashing vectors, so retrieval runs without downloading a model."""
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), 32), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 32] += 1.0
+        return vectors
+
+
+class StubTokenizer:
+    is_fast = False
+
+    def __call__(self, texts, add_special_tokens=False, truncation=False, max_length=None):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [t.split()[:max_length] for t in texts]}
+
+
+class StubReranker:
+    tokenizer = StubTokenizer()
+
+    def predict(self, pairs, **kwargs):
+        return [len(set(q.lower().split()) & set(t.lower().split())) for q, t in pairs]
+
+
+def corpus(prefix, n=12):
+    topics = ["lora adapters", "attention heads", "bm25 ranking", "faiss vectors"]
+    return [
+        {"chunk_id": f"{prefix}-{i}", "text": f"{prefix} note {i} on {topics[i % len(topics)]}", "metadata": {"source": f"{prefix}.txt", "page": i // 4, "language": "en"}}
+        for i in range(n)
+    ]
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from indexing import bm25_index
+from indexing.bm25_index import BM25Indexer
+from stubs import corpus
+
+
+@pytest.fixture
+def bm25(monkeypatch):
+    monkeypatch.setattr(bm25_index.nltk, "word_tokenize", str.split)  # no punkt data offline
+    return BM25Indexer(corpus("a") + corpus("b"))
+
+
+def test_filtered_scores_match_unfiltered(bm25):
+    query = "lora adapters note"
+    full = bm25.bm25.get_scores(query.split())
+    allowed = [i for i, c in enumerate(bm25.chunks) if c["metadata"]["source"] == "b.txt"]
+
+    hits = bm25.search(query, top_k=4, filters={"source": "b.txt"})
+    assert all(h["chunk_id"].startswith("b-") for h in hits)
+    # same scores as the unfiltered search, and the best four of the allowed documents (ties in any order)
+    assert [h["score"] for h in hits] == pytest.approx([full[bm25.chunk_ids.index(h["chunk_id"])] for h in hits])
+    assert [h["score"] for h in hits] == pytest.approx(sorted(full[allowed], reverse=True)[:4])
+
+
+def test_unfiltered_top_k(bm25):
+    hits = bm25.search("faiss vectors", top_k=3)
+    assert len(hits) == 3
+    assert all(a["score"] >= b["score"] for a, b in zip(hits, hits[1:]))
+    assert all("faiss" in bm25.texts[bm25.chunk_ids.index(h["chunk_id"])] for h in hits)
+
+
+def test_filter_matching_nothing(bm25):
+    assert bm25.search("lora", filters={"language": "ar"}) == []
+    assert len(bm25.search("lora", top_k=50, filters={"page": 0})) == int(np.sum(
+        [c["metadata"]["page"] == 0 for c in bm25.chunks]
+    ))
@@ -0,0 +1,65 @@
+import pytest
+
+from tools.calc_tool import CalcTool
+
+
+@pytest.fixture
+def calc():
+    return CalcTool()
+
+
+def test_arithmetic(calc):
+    assert calc.run("2 + 3 * 10") == {"status": "success", "output": "32"}
+    assert calc.run("(100 - 25) / 5")["output"] == "15.0"
+    assert calc.run("10 / 0") == {"status": "error", "output": "Division by zero."}
+
+
+def test_complex_result_is_an_error(calc):
+    result = calc.run("(-8) ** (1/3)")
+    assert result["status"] == "error"
+    assert "j" not in result["output"]
+    assert calc.run("(-8) ** 3")["output"] == "-512"
+
+
+def test_huge_power_rejected_before_evaluation(calc):
+    result = calc.run("9 ** 9 ** 9")
+    assert result["status"] == "error"
+    assert result["output"].startswith("Expression too expensive")
+
+
+def test_large_but_bounded_power_allowed(calc):
+    result = calc.run("2 ** 10000")
+    assert result["status"] == "success"
+    assert int(result["output"]) == 2 ** 10000
+
+
+def test_intermediate_size_limit(calc):
+    result = calc.run("2 ** 10000 * 2 ** 10000")
+    assert result["status"] == "error"
+    assert "bits" in result["output"]
+
+
+def test_depth_limit(calc):
+    assert calc.run("-" * (CalcTool.MAX_DEPTH - 1) + "1")["status"] == "success"
+    result = calc.run("-" * (CalcTool.MAX_DEPTH + 1) + "1")
+    assert result["status"] == "error"
+    assert "nested deeper" in result["output"]
+
+
+def test_length_limit(calc):
+    expression = "1+" * (CalcTool.MAX_EXPRESSION_CHARS // 2) + "1"
+    result = calc.run(expression)
+    assert result["status"] == "error"
+    assert "longer than" in result["output"]
+
+
+def test_only_numbers_and_operators(calc):
+    for expression in ("__import__('os')", "'a' * 3", "True + 1", "abs(-1)", "x.real"):
+        assert calc.run(expression)["status"] == "error", expression
+
+
+def test_run_batch(calc):
+    assert calc.run_batch("a * x ** 2 + b", {"x": [1, 2, 3], "a": 2, "b": 1}) == {
+        "status": "success", "output": [3.0, 9.0, 19.0]
+    }
+    assert calc.run_batch("x ** 0.5", {"x": [-1.0]})["status"] == "error"
@@ -0,0 +1,101 @@
+import hashlib
+
+import pytest
+
+from retrieval.compression import ContextCompressor, split_sentences
+from retrieval.expansion import NeighbourExpander
+
+TEXTS = [
+    "LoRA adds low rank adapters to frozen weights. It trains few parameters.",
+    "Attention heads mix tokens. LoRA adapters can target the attention projections!",
+    "BM25 ranks by term frequency. Dense retrieval uses vectors.",
+    "FAISS searches vectors quickly. LoRA is unrelated to FAISS.",
+]
+
+
+class OverlapScorer:
+    """ReRanker stand-in: shared query words per sentence; records what it was asked."""
+
+    model = object()  # no tokenizer: budgets count words
+
+    def __init__(self):
+        self.calls = []
+
+    def score(self, query, sentences):
+        self.calls.append([dict(s) for s in sentences])
+        words = set(query.lower().split())
+        return [float(len(words & set(s["text"].lower().rstrip(".!").split()))) for s in sentences]
+
+
+@pytest.fixture
+def lookup():
+    ids = [f"c{i}" for i in range(len(TEXTS))]
+    chunks = {}
+    for i, (cid, text) in enumerate(zip(ids, TEXTS)):
+        chunks[cid] = {"chunk_id": cid, "text": text, "metadata": {}}
+        if i:
+            chunks[cid]["prev_id"] = ids[i - 1]
+        if i + 1 < len(ids):
+            chunks[cid]["next_id"] = ids[i + 1]
+    return chunks
+
+
+def hits(lookup, *ids):
+    return [{**lookup[cid], "score": 1.0} for cid in ids]
+
+
+def test_split_sentences():
+    text = "  Hello world.  Second one!\nThird line؟ tail"
+    assert [text[a:b] for a, b in split_sentences(text)] == ["Hello world.", "Second one!", "Third line؟", "tail"]
+    assert [text[a:b] for a, b in split_sentences(text, min_chars=5)] == ["Hello world.", "Second one!", "Third line؟"]
+
+    long = " ".join(["word"] * 50)
+    pieces = [long[a:b] for a, b in split_sentences(long, max_chars=40)]
+    assert all(len(p) <= 40 for p in pieces)
+    assert " ".join(pieces) == long
+
+
+def test_spans_slice_their_source_chunks(lookup):
+    scorer = OverlapScorer()
+    compressor = ContextCompressor(reranker=scorer, token_budget=12, min_sentence_chars=5)
+    passages = NeighbourExpander(lookup, neighbours=1).expand(hits(lookup, "c1", "c3"))
+    assert any(len(p["span"]) > 1 for p in passages)
+
+    query = "lora adapters attention"
+    compressed = compressor.compress(query, passages)
+    scored = {s["text"]: s for call in scorer.calls for s in call}
+    assert compressed
+    for passage in compressed:
+        slices = [lookup[sp["chunk_id"]]["text"][sp["start"]:sp["end"]] for sp in passage["spans"]]
+        assert passage["text"] == compressor.separator.join(slices)
+        for sp, piece in zip(passage["spans"], slices):
+            assert sp["chunk_id"] in passage["span"]
+            # a span is one kept sentence, or several adjacent ones of the same chunk
+            first = next(t for t in scored if piece.startswith(t))
+            assert scored[first]["source"] == sp["chunk_id"]
+            assert any(piece.endswith(t) for t in scored)
+
+
+def test_unexpanded_passage_spans_index_the_chunk(lookup):
+    compressor = ContextCompressor(reranker=OverlapScorer(), token_budget=8, min_sentence_chars=5)
+    [passage] = compressor.compress("lora adapters", hits(lookup, "c0"))
+    [span] = passage["spans"]
+    assert span["chunk_id"] == "c0"
+    assert TEXTS[0][span["start"]:span["end"]] == passage["text"] == "LoRA adds low rank adapters to frozen weights."
+
+
+def test_sentence_cache_key_is_its_text(lookup):
+    # the same sentence, alone or inside a merged passage, must get the same score cache key
+    scorer = OverlapScorer()
+    compressor = ContextCompressor(reranker=scorer, min_sentence_chars=5)
+    compressor.compress("faiss", hits(lookup, "c3"))
+    compressor.compress("faiss", NeighbourExpander(lookup, neighbours=1).expand(hits(lookup, "c2", "c3")))
+
+    sentence = "FAISS searches vectors quickly."
+    keys = {s["chunk_id"] for call in scorer.calls for s in call if s["text"] == sentence}
+    assert keys == {"sentence:" + hashlib.sha1(sentence.encode("utf-8")).hexdigest()}
+    # and no two different sentences share one
+    by_key = {}
+    for call in scorer.calls:
+        for s in call:
+            assert by_key.setdefault(s["chunk_id"], s["text"]) == s["text"]
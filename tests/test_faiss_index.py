@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from indexing.faiss_index import FaissIndex
+
+
+def make_chunks(n=60, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [
+        {"chunk_id": f"c{i}", "embedding": vectors[i], "metadata": {"source": f"s{i % 3}.txt", "page": i % 7}}
+        for i in range(n)
+    ], vectors
+
+
+def make_index(tmp_path, **kwargs):
+    return FaissIndex(
+        vector_dim=16,
+        index_path=str(tmp_path / "faiss.index"),
+        mapping_path=str(tmp_path / "mapping.json"),
+        metadata_path=str(tmp_path / "metadata.json"),
+        **kwargs
+    )
+
+
+def expected(vectors, query, ids, top_k):
+    sims = vectors[ids] @ query
+    order = np.argsort(-sims)[:top_k]
+    return [f"c{ids[i]}" for i in order]
+
+
+@pytest.mark.parametrize("ratio", [1.0, 0.0])  # 1.0: subset scan, 0.0: IDSelectorBatch
+@pytest.mark.parametrize("filters", [{"source": "s1.txt"}, {"page": [0, 3]}, {"source": "s2.txt", "page": 5}])
+def test_filtered_search_is_exact(tmp_path, ratio, filters):
+    chunks, vectors = make_chunks()
+    index = make_index(tmp_path, subset_scan_ratio=ratio)
+    index.add(chunks)
+    query = vectors[7] + 0.1
+
+    ids = [i for i, c in enumerate(chunks) if all(
+        c["metadata"][f] in (v if isinstance(v, list) else [v]) for f, v in filters.items()
+    )]
+    hits = index.search(query, top_k=5, filters=filters)
+    assert [h["chunk_id"] for h in hits] == expected(vectors, query, ids, 5)
+    assert all(a["score"] >= b["score"] for a, b in zip(hits, hits[1:]))
+
+
+def test_unfiltered_and_empty_filter(tmp_path):
+    chunks, vectors = make_chunks()
+    index = make_index(tmp_path)
+    index.add(chunks)
+    hits = index.search(vectors[3], top_k=3)
+    assert [h["chunk_id"] for h in hits] == expected(vectors, vectors[3], list(range(len(chunks))), 3)
+    assert index.search(vectors[3], top_k=3, filters={"source": "missing.txt"}) == []
+
+
+def test_subset_smaller_than_top_k(tmp_path):
+    chunks, vectors = make_chunks()
+    index = make_index(tmp_path, subset_scan_ratio=1.0)
+    index.add(chunks)
+    hits = index.search(vectors[0], top_k=10, filters={"source": "s0.txt", "page": 0})
+    assert sorted(h["chunk_id"] for h in hits) == ["c0", "c21", "c42"]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    chunks, vectors = make_chunks()
+    index = make_index(tmp_path)
+    index.add(chunks)
+    index.save()
+
+    loaded = make_index(tmp_path)
+    assert loaded.index.ntotal == len(chunks)
+    assert loaded.mapping == index.mapping
+    assert loaded.next_id == len(chunks)
+    for filters in (None, {"source": "s1.txt"}, {"page": [2, 4]}):
+        assert loaded.search(vectors[5], top_k=4, filters=filters) == index.search(vectors[5], top_k=4, filters=filters)
+
+    loaded.clear()
+    assert loaded.index.ntotal == 0 and loaded.mapping == {} and loaded.next_id == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from indexing.metadata_filter import MetadataFilterIndex
+
+METAS = [
+    {"source": "a.pdf", "page": 1, "language": "en"},
+    {"source": "a.pdf", "page": 2, "language": "ar"},
+    {"source": "b.txt", "page": 1, "language": "en"},
+    {"source": "b.txt", "language": "en"},  # no page
+    {},
+]
+
+
+@pytest.fixture
+def index():
+    index = MetadataFilterIndex()
+    index.add(METAS)
+    return index
+
+
+def test_no_filter_is_none(index):
+    assert index.select(None) is None
+    assert index.select({}) is None
+
+
+def test_scalar_list_and_range(index):
+    assert index.select({"language": "en"}).tolist() == [0, 2, 3]
+    assert index.select({"source": ["a.pdf", "b.txt"]}).tolist() == [0, 1, 2, 3]
+    assert index.select({"page": range(2, 5)}).tolist() == [1]
+    assert index.select({"language": "fr"}).tolist() == []
+
+
+def test_fields_combine_with_and(index):
+    selected = index.select({"source": "a.pdf", "language": "en"})
+    assert selected.dtype == np.int64
+    assert selected.tolist() == [0]
+
+
+def test_unknown_field_raises(index):
+    with pytest.raises(ValueError, match="colour"):
+        index.select({"colour": "red"})
+
+
+def test_bitsets_follow_growth(index):
+    assert index.select({"language": "ar"}).tolist() == [1]
+    index.add([{"language": "ar"}])
+    assert index.select({"language": "ar"}).tolist() == [1, 5]
+
+
+def test_json_round_trip(index):
+    restored = MetadataFilterIndex.from_json(index.to_json())
+    assert restored.size == index.size
+    for filters in ({"language": "en"}, {"page": 1}, {"source": "b.txt", "page": [1, 2]}):
+        assert restored.select(filters).tolist() == index.select(filters).tolist()
@@ -0,0 +1,25 @@
+import threading
+
+from core.model_registry import ModelRegistry
+
+
+def test_loads_once_and_counts_every_hit():
+    registry = ModelRegistry()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return object()
+
+    def work():
+        for _ in range(200):
+            registry.get("stub", "m", loader)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    [entry] = registry.stats()
+    assert entry["hits"] == 8 * 200
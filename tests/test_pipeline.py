@@ -0,0 +1,13 @@
+def test_filter_matching_nothing_with_cascade(make_retriever):
+    retriever = make_retriever(rerank_cascade=[("bi-encoder", 2)])
+    assert retriever.retrieve("lora adapters", top_k=3, filters={"language": "ar"}) == []
+    # the cascade still prunes when there are candidates
+    hits = retriever.retrieve("lora adapters", top_k=3, filters={"language": "en"})
+    assert 0 < len(hits) <= 2
+
+
+def test_filters_restrict_hits(make_retriever):
+    retriever = make_retriever()
+    hits = retriever.retrieve("note", top_k=10, filters={"page": [0, 2]})
+    assert hits
+    assert {h["metadata"]["page"] for h in hits} <= {0, 2}
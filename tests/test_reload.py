@@ -0,0 +1,98 @@
+import os
+import threading
+
+from pipeline import SmartHybridRetriever
+from stubs import corpus
+
+
+def index_dirs(retriever):
+    return sorted(d for d in os.listdir(retriever.index_dir) if d.startswith("index-"))
+
+
+def test_retrieve_during_reloads(make_retriever):
+    retriever = make_retriever()
+    prefix_of = {retriever.generation.number: "a"}
+    stop = threading.Event()
+    errors, answers = [], []
+
+    def hammer():
+        while not stop.is_set():
+            try:
+                with retriever.reading() as generation:
+                    hits = retriever.retrieve("lora adapters", top_k=3, generation=generation)
+                answers.append((generation.number, hits))
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(repr(e))
+
+    readers = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in readers:
+        t.start()
+    try:
+        for i in range(6):
+            prefix = "b" if i % 2 == 0 else "a"
+            info = retriever.reload(corpus(prefix)).result(timeout=30)
+            prefix_of[info["generation"]] = prefix
+            assert info["drained"]
+    finally:
+        stop.set()
+        for t in readers:
+            t.join()
+
+    assert not errors, errors[:3]
+    assert {number for number, _ in answers} - set(prefix_of) == set()
+    for number, hits in answers:
+        assert hits
+        # one generation from start to end: never a mix of two corpora
+        assert {h["generation"] for h in hits} == {number}
+        assert all(h["chunk_id"].startswith(prefix_of[number] + "-") for h in hits)
+    # every replaced generation was freed; only the live version's files are left
+    assert index_dirs(retriever) == [f"index-{retriever.index_version}"]
+
+
+def test_undrained_generation_freed_by_last_reader(make_retriever):
+    retriever = make_retriever(drain_timeout=0.05)
+    version_a = retriever.index_version
+
+    with retriever.reading() as first:
+        info = retriever.reload(corpus("b")).result(timeout=30)
+        assert not info["drained"]
+        # still readable by the request holding it
+        assert retriever.retrieve("lora", top_k=2, generation=first)
+        assert first.chunk_lookup
+        # back to the first corpus: same version, same directory as `first`
+        retriever.reload(corpus("a")).result(timeout=30)
+        assert retriever.index_version == version_a
+    # the last reader left: `first` is freed, but the files the live generation uses stay
+    assert first.chunk_lookup == {}
+    assert index_dirs(retriever) == [f"index-{version_a}"]
+
+
+def test_last_reader_leaving_during_rebuild_keeps_its_files(make_retriever, monkeypatch):
+    retriever = make_retriever(drain_timeout=0.05)
+    version_a = retriever.index_version
+    pinned, release = threading.Event(), threading.Event()
+
+    def hold():
+        with retriever.reading():
+            pinned.set()
+            release.wait(30)
+
+    reader = threading.Thread(target=hold)
+    reader.start()
+    pinned.wait(30)
+    assert not retriever.reload(corpus("b")).result(timeout=30)["drained"]
+
+    build = SmartHybridRetriever._build_generation
+
+    def build_then_leave(self, chunks, embeddings):
+        new = build(self, chunks, embeddings)
+        # the old generation's last reader leaves while index-<A> is being rebuilt
+        release.set()
+        reader.join()
+        return new
+
+    monkeypatch.setattr(SmartHybridRetriever, "_build_generation", build_then_leave)
+    retriever.reload(corpus("a")).result(timeout=30)
+    assert retriever.index_version == version_a
+    assert os.path.exists(os.path.join(retriever.generation.index_dir, "faiss.index"))
+    assert index_dirs(retriever) == [f"index-{version_a}"]
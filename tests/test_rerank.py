@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+import pytest
+
+from core.model_registry import registry
+from retrieval.rerank import BiEncoderStage, CascadeStage, ReRanker, make_stage
+from stubs import StubReranker, corpus
+
+
+def test_incomplete_stage_fails_on_construction():
+    class NoScore(CascadeStage):
+        name = "no-score"
+
+    with pytest.raises(TypeError):
+        NoScore()
+
+
+def test_make_stage():
+    assert isinstance(make_stage("bi-encoder"), BiEncoderStage)
+    stage = BiEncoderStage()
+    assert make_stage(stage) is stage
+    with pytest.raises(ValueError):
+        make_stage("bm25")
+
+
+def test_bi_encoder_stage_scores_by_cosine():
+    vectors = np.eye(3, dtype="float32")
+    scores = BiEncoderStage().score("q", [{}, {}, {}], query_vector=np.array([0.0, 1.0, 0.0]), vectors=vectors)
+    assert scores == [0.0, 1.0, 0.0]
+
+
+def test_stats_add_up_under_concurrent_calls(monkeypatch):
+    monkeypatch.setattr(registry, "cross_encoder", lambda name, max_length=None: StubReranker())
+    reranker = ReRanker("stub")
+    chunks = corpus("a")
+
+    def work(t):
+        for i in range(50):
+            reranker.score(f"query {t} {i % 5}", chunks)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 8 threads x 5 distinct queries are scored once each, every other call is a cache hit
+    assert reranker.stats["pairs_scored"] + reranker.stats["cache_hits"] == 8 * 50 * len(chunks)
+    assert reranker.stats["pairs_scored"] >= 8 * 5 * len(chunks)
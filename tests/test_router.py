@@ -0,0 +1,29 @@
+import threading
+
+from router import StepRouter
+
+
+class StubLLM:
+    def register_prefix(self, name, text, version="1"):
+        pass
+
+    def generate_batch(self, prompts, **kwargs):
+        return ["rag"] * len(prompts)
+
+
+def test_tiers_and_hit_rates_under_concurrent_routing():
+    router = StepRouter(StubLLM())
+    steps = ["Calculate 12 * 7", "hmm"]
+    assert [r["tier"] for r in router.route_steps(steps)] == ["keyword", "llm"]
+
+    def work():
+        for _ in range(100):
+            router.route_steps(steps)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(router.stats.values()) == 2 * (1 + 8 * 100)
+    assert router.hit_rates() == {"keyword": 0.5, "classifier": 0.0, "llm": 0.5}
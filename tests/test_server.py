@@ -0,0 +1,184 @@
+import gc
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import AgentRequest, Services, Settings, StageLimiter, create_app
+
+
+class FakeGeneration:
+    number = 3
+    version = "abc123"
+    chunk_lookup = {"c1": {}, "c2": {}}
+
+    def info(self):
+        return {"generation": self.number, "index_version": self.version, "chunks": len(self.chunk_lookup)}
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.generation = FakeGeneration()
+
+    @contextmanager
+    def reading(self):
+        yield self.generation
+
+    def retrieve(self, query, top_k=5, filters=None, generation=None):
+        if query == "nothing":
+            # a reload lands while this query runs and it finds no hits
+            self.generation = FakeGeneration()
+            self.generation.number += 1
+            return []
+        return [{"chunk_id": "c1", "text": f"about {query}", "score": 1.0, "generation": generation.number}][:top_k]
+
+
+class FakeAgent:
+    """stream() like FullAgentSystem's: on_done fires once the run has stopped."""
+
+    def __init__(self):
+        self.release = threading.Event()  # set to let a held run finish
+        self.release.set()
+
+    def stream(self, query, cancel=None, on_done=None):
+        try:
+            yield {"type": "plan", "plan": "1. answer", "steps": ["1. answer"]}
+            self.release.wait(5)
+            yield {"type": "answer", "text": f"answer to {query}"}
+        finally:
+            if on_done is not None:
+                on_done()
+
+
+def make_services(llm=(1, 1), reranker=(1, 1)):
+    limiters = {
+        "llm": StageLimiter("llm", *llm),
+        "reranker": StageLimiter("reranker", *reranker),
+        "python": StageLimiter("python", 1, 1),
+    }
+    return Services(Settings(), FakeRetriever(), FakeAgent(), limiters)
+
+
+@pytest.fixture
+def services():
+    return make_services()
+
+
+@pytest.fixture
+def client(services):
+    with TestClient(create_app(services=services)) as c:
+        yield c
+
+
+@pytest.fixture
+def agent_events(services, monkeypatch):
+    """Calls the /agent endpoint directly and returns its body generator, unstarted."""
+    monkeypatch.setattr(main, "StreamingResponse", lambda content, media_type: content)
+    app = create_app(services=services)
+    endpoint = next(r.endpoint for r in app.routes if getattr(r, "path", None) == "/agent")
+    with TestClient(app):
+        yield lambda query: endpoint(AgentRequest(query=query))
+
+
+def test_probes_and_metrics(client):
+    assert client.get("/healthz").json()["status"] == "ok"
+
+    ready = client.get("/readyz").json()
+    assert ready["status"] == "ready"
+    assert ready["index"]["generation"] == 3
+    assert set(ready["stages"]) == {"llm", "reranker", "python"}
+
+    metrics = client.get("/metrics").text
+    assert 'neurorag_stage_pending{stage="llm"} 0' in metrics
+    assert 'neurorag_index_generation{index_version="abc123"} 3' in metrics
+    assert "neurorag_ready 1" in metrics
+
+
+def test_retrieve(client):
+    body = client.post("/retrieve", json={"query": "lora", "top_k": 1}).json()
+    assert body["generation"] == 3
+    assert body["results"][0]["text"] == "about lora"
+
+
+def test_retrieve_without_hits_names_the_generation_it_read(client):
+    body = client.post("/retrieve", json={"query": "nothing"}).json()
+    assert body["results"] == []
+    assert body["generation"] == 3
+
+
+def test_unknown_filter_field_is_a_client_error(client):
+    response = client.post("/retrieve", json={"query": "lora", "filters": {"colour": "red"}})
+    assert response.status_code == 422
+    assert "colour" in response.text
+    response = client.post("/retrieve_batch", json={"queries": ["lora"], "filters": {"colour": "red"}})
+    assert response.status_code == 422
+    assert client.post("/retrieve", json={"query": "lora", "filters": {"language": "en"}}).status_code == 200
+
+
+def test_retrieve_rejected_when_stage_is_full(client, services):
+    limiter = services.limiters["reranker"]
+    held = [limiter.reserve() for _ in range(limiter.concurrency + limiter.queue_size)]
+
+    response = client.post("/retrieve", json={"query": "lora"})
+    assert response.status_code == 429
+    assert response.json()["stage"] == "reranker"
+    assert response.headers["retry-after"] == "1"
+    assert 'neurorag_server_rejected_total{stage="reranker"}' in client.get("/metrics").text
+
+    for ticket in held:
+        ticket.release()
+    assert client.post("/retrieve", json={"query": "lora"}).status_code == 200
+
+
+def test_agent_streams_ndjson_and_frees_its_slot(client, services):
+    response = client.post("/agent", json={"query": "attention"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["type"] for e in events] == ["plan", "answer"]
+    assert services.limiters["llm"].state()["pending"] == 0
+
+
+def test_agent_rejected_when_llm_stage_is_full(client, services):
+    held = services.limiters["llm"].reserve()
+    services.limiters["llm"].reserve()  # concurrency 1 + queue 1
+
+    assert client.post("/agent", json={"query": "attention"}).status_code == 429
+    held.release()
+
+
+def test_agent_response_dropped_before_first_chunk_holds_no_slot(services, agent_events):
+    events = agent_events("attention")
+    events.close()  # client gone before the first chunk was sent
+    del events
+    gc.collect()
+    assert services.limiters["llm"].state()["pending"] == 0
+
+
+def test_agent_slot_held_until_the_run_stops(services, agent_events):
+    """Closing the stream early must not free the slot while the run is still going."""
+    limiter = services.limiters["llm"]
+    agent = services.agent
+    agent.release.clear()
+    inner = agent.stream
+
+    def stream(query, cancel=None, on_done=None):
+        def _later():
+            agent.release.wait(5)
+            on_done()
+        # like FullAgentSystem: on_done waits for the plan thread to exit
+        return inner(query, cancel, lambda: threading.Thread(target=_later).start())
+
+    agent.stream = stream
+    events = agent_events("attention")
+    assert json.loads(next(events))["type"] == "plan"
+    events.close()
+    assert limiter.state()["pending"] == 1
+
+    agent.release.set()
+    deadline = time.time() + 5
+    while limiter.state()["pending"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert limiter.state()["pending"] == 0
@@ -0,0 +1,127 @@
+import pytest
+
+import tool_cache
+from tool_cache import ToolCache, normalize_input
+
+OK = {"status": "success", "output": "42"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tool_cache.time, "time", clock)
+    return clock
+
+
+def test_hit_after_put_with_normalized_input():
+    cache = ToolCache()
+    cache.put("calculator", "6 * 7", OK)
+    assert cache.get("calculator", "6*7") == OK
+    cache.put("python", "print(1)\n\n", OK)
+    assert cache.get("python", "print(1)   \n") == OK
+    assert normalize_input("rag", "  what   is LoRA ") == "what is LoRA"
+    # retrieval is case-sensitive, so is its key
+    cache.put("rag", "US exports", OK)
+    assert cache.get("rag", "us exports") is None
+
+
+def test_only_successes_are_stored():
+    cache = ToolCache()
+    cache.put("calculator", "1/0", {"status": "error", "output": "Division by zero."})
+    assert cache.get("calculator", "1/0") is None
+
+
+def test_ttl_expiry(clock):
+    cache = ToolCache(ttl=10)
+    cache.put("calculator", "1+1", OK)
+    clock.now += 9
+    assert cache.get("calculator", "1+1") == OK
+    clock.now += 2
+    assert cache.get("calculator", "1+1") is None
+
+
+def test_lru_bound():
+    cache = ToolCache(max_entries=2)
+    for expression in ("1+1", "2+2", "3+3"):
+        cache.put("calculator", expression, OK)
+    assert cache.get("calculator", "1+1") is None
+    assert cache.get("calculator", "3+3") == OK
+
+
+@pytest.mark.parametrize("code", [
+    "import random\nprint(random.random())",
+    "import time\nprint(time.time())",
+    "print(open('f').read())",
+    "print(id(object()))",
+    "import os\nprint(os.environ)",
+])
+def test_non_deterministic_python_bypasses_the_cache(code):
+    assert not ToolCache.cacheable("python", code)
+
+
+def test_deterministic_code_is_cacheable():
+    assert ToolCache.cacheable("python", "print(sum(range(10)))")
+    assert ToolCache.cacheable("python", "identity = 1\nprint(identity)")
+    assert ToolCache.cacheable("calculator", "time * 2")
+
+
+def test_get_and_put_copy():
+    cache = ToolCache()
+    result = {"status": "success", "output": ["a"]}
+    cache.put("rag", "q", result)
+    result["output"].append("changed by the caller")
+    hit = cache.get("rag", "q")
+    assert hit["output"] == ["a"]
+    hit["output"].append("changed by a reader")
+    assert cache.get("rag", "q")["output"] == ["a"]
+
+
+def test_version_change_invalidates():
+    cache = ToolCache()
+    cache.put("rag", "what is lora", OK, version="index-1")
+    assert cache.get("rag", "what is lora", version="index-1") == OK
+    assert cache.get("rag", "what is lora", version="index-2") is None
+
+
+def test_sqlite_tier_survives_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    first = ToolCache(db_path=path, ttl=10)
+    first.put("calculator", "6*7", OK)
+
+    second = ToolCache(db_path=path, ttl=10)
+    assert second.get("calculator", "6*7") == OK
+    # promoted to memory: served even with the row gone
+    with second.conn:
+        second.conn.execute("DELETE FROM tool_cache")
+    assert second.get("calculator", "6*7") == OK
+
+    third = ToolCache(db_path=path, ttl=10)
+    first.put("calculator", "1+1", OK)
+    clock.now += 11
+    assert third.get("calculator", "1+1") is None
+
+
+def test_sqlite_prune_keeps_newest(tmp_path, clock):
+    cache = ToolCache(db_path=str(tmp_path / "cache.db"), max_db_entries=3)
+    for i in range(5):
+        clock.now += 1
+        cache.put("calculator", f"{i}+0", OK)
+    cache._prune_db()
+    keys = {row[0] for row in cache.conn.execute("SELECT key FROM tool_cache")}
+    assert keys == {ToolCache.key("calculator", f"{i}+0") for i in (2, 3, 4)}
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ToolCache(db_path=str(tmp_path / "cache.db"))
+    cache.put("calculator", "6*7", OK)
+    cache.clear()
+    assert cache.get("calculator", "6*7") is None
+    assert cache.conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0] == 0
@@ -1,9 +1,21 @@
+import re
 import ast
+import math
 import operator as op
+from functools import lru_cache
+from typing import Dict, Sequence, Union
+
+import numpy as np
+
+
+class _CostGuard(ValueError):
+    pass
+
 
 class CalcTool:
     name = "calculator"
     description = "Safely evaluates basic math expressions (+, -, *, /, **, parentheses)."
+    version = "3"
 
     # Allowed operators
     ALLOWED_OPERATORS = {
@@ -17,54 +29,151 @@ class CalcTool:
         ast.UAdd: op.pos,
     }
 
+    # Cost guards, checked before anything is evaluated
+    MAX_EXPRESSION_CHARS = 2000
+    MAX_DEPTH = 50            # AST nesting
+    MAX_INT_BITS = 13_000     # bound on any intermediate integer (keeps str() under 4300 digits)
+    MAX_EXPONENT = 10_000     # bound on an integer exponent
+
     def run(self, expression: str):
         """
         Evaluate a math expression safely using AST parsing.
         """
         try:
-            expression = expression.strip()
+            fn = self._compiled(expression)
+            value = fn({})
+            if isinstance(value, complex):
+                # e.g. (-8) ** (1/3): Python's principal root, not a real answer
+                return {"status": "error", "output": "No real result."}
+            return {"status": "success", "output": str(value)}
 
-            if not expression:
-                return {"status": "error", "output": "Empty expression."}
+        except ZeroDivisionError:
+            return {"status": "error", "output": "Division by zero."}
 
-            node = ast.parse(expression, mode="eval").body
-            result = self._eval(node)
+        except _CostGuard as e:
+            return {"status": "error", "output": f"Expression too expensive: {e}"}
 
-            return {"status": "success", "output": str(result)}
+        except Exception as e:
+            return {"status": "error", "output": f"Invalid expression: {e}"}
 
-        except ZeroDivisionError:
-            return {"status": "error", "output": "Division by zero."}
+    def run_batch(self, expression: str, bindings: Union[Dict[str, Sequence[float]], Sequence[Dict[str, float]]]):
+        """
+        Evaluate one expression over many variable bindings at once, e.g.
+        run_batch("a * x ** 2 + b", {"x": [1, 2, 3], "a": 2, "b": 1}) -> [3.0, 9.0, 19.0].
+        bindings: columns (name -> values, scalars broadcast) or a list of rows.
+        """
+        try:
+            fn = self._compiled(expression)
+            if not isinstance(bindings, dict):
+                names = {k for row in bindings for k in row}
+                bindings = {k: [row[k] for row in bindings] for k in names}
+            columns = {k: np.asarray(v, dtype=np.float64) for k, v in bindings.items()}
+
+            with np.errstate(divide="raise", invalid="raise", over="raise"):
+                result = fn(columns)
+            return {"status": "success", "output": np.atleast_1d(result).tolist()}
+
+        except (ZeroDivisionError, FloatingPointError):
+            return {"status": "error", "output": "Division by zero or overflow."}
+
+        except _CostGuard as e:
+            return {"status": "error", "output": f"Expression too expensive: {e}"}
 
         except Exception as e:
             return {"status": "error", "output": f"Invalid expression: {e}"}
 
-    def _eval(self, node):
+    # -------------------- Compilation --------------------
+
+    def _compiled(self, expression: str):
+        expression = expression.strip()
+        if not expression:
+            raise ValueError("Empty expression.")
+        if len(expression) > self.MAX_EXPRESSION_CHARS:
+            raise _CostGuard(f"longer than {self.MAX_EXPRESSION_CHARS} characters")
+        # whitespace never changes meaning, so it is not part of the cache key
+        return _compile(re.sub(r"\s+", " ", expression))
+
+    @classmethod
+    def _check(cls, node, names, depth):
+        """
+        Reject anything that is not numbers, variables and allowed operators,
+        and return an upper bound on log2 |value| of an integer node (None when
+        the value is a float or a variable: no bignum cost there).
+        """
+        if depth > cls.MAX_DEPTH:
+            raise _CostGuard(f"nested deeper than {cls.MAX_DEPTH}")
+
         # Numbers
-        if isinstance(node, ast.Num):  # means instance must be number int or floar
-            return node.n
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ValueError(f"Unsupported constant: {node.value!r}")
+            if isinstance(node.value, float):
+                return None
+            return math.log2(abs(node.value)) if node.value else 0.0
+
+        # Variables (run_batch bindings)
+        if isinstance(node, ast.Name):
+            if node.id.startswith("_"):
+                raise ValueError(f"Name not allowed: {node.id}")
+            names.add(node.id)
+            return None
+
+        # Unary operations (+x, -x)
+        if isinstance(node, ast.UnaryOp):
+            if type(node.op) not in cls.ALLOWED_OPERATORS:
+                raise ValueError(f"Unary operator {type(node.op)} not allowed.")
+            return cls._check(node.operand, names, depth + 1)
 
         # Binary operations
         if isinstance(node, ast.BinOp):
-            left = self._eval(node.left)
-            right = self._eval(node.right)
             operator_type = type(node.op)
-
-            if operator_type not in self.ALLOWED_OPERATORS:
+            if operator_type not in cls.ALLOWED_OPERATORS:
                 raise ValueError(f"Operator {operator_type} not allowed.")
 
-            return self.ALLOWED_OPERATORS[operator_type](left, right)
+            left = cls._check(node.left, names, depth + 1)
+            right = cls._check(node.right, names, depth + 1)
+            if left is None or right is None or operator_type is ast.Div:
+                return None
+
+            if operator_type in (ast.Add, ast.Sub):
+                bits = max(left, right) + 1
+            elif operator_type is ast.Mult:
+                bits = left + right
+            elif operator_type is ast.Mod:
+                bits = right
+            else:  # Pow: |exponent| <= 2**right
+                if right > math.log2(cls.MAX_EXPONENT):
+                    raise _CostGuard(f"exponent may exceed {cls.MAX_EXPONENT}")
+                bits = left * (2 ** right)
+
+            if bits > cls.MAX_INT_BITS:
+                raise _CostGuard(f"intermediate result may exceed {cls.MAX_INT_BITS} bits")
+            return bits
 
-        # Unary operations (+x, -x)
-        if isinstance(node, ast.UnaryOp):
-            operand = self._eval(node.operand)
-            operator_type = type(node.op)
+        raise ValueError(f"Unsupported expression type: {type(node)}")
 
-            if operator_type not in self.ALLOWED_OPERATORS:
-                raise ValueError(f"Unary operator {operator_type} not allowed.")
 
-            return self.ALLOWED_OPERATORS[operator_type](operand)
+@lru_cache(maxsize=4096)
+def _compile(expression: str):
+    """
+    Validate once, then return a callable(bindings) over the compiled code
+    object. Module level so the cache is keyed on the expression alone and
+    holds no CalcTool instance (the limits are class constants).
+    """
+    tree = ast.parse(expression, mode="eval")
+    names = set()
+    CalcTool._check(tree.body, names, depth=0)
 
-        raise ValueError(f"Unsupported expression type: {type(node)}")
+    code = compile(tree, "<calc>", "eval")
+    builtins = {"__builtins__": {}}
+
+    def _fn(bindings):
+        missing = names - bindings.keys()
+        if missing:
+            raise ValueError(f"Unbound variables: {', '.join(sorted(missing))}")
+        return eval(code, builtins, {k: bindings[k] for k in names})
+
+    return _fn
 
 
 # calc = CalcTool()
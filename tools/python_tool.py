@@ -1,47 +1,150 @@
 # Pyhton Tool
 
-import io
-import contextlib
-import traceback
+import os
+import sys
+import json
+import queue
+import select
+import logging
+import threading
+import subprocess
 
-class PythonTool:
-    name = "PythonTool"
-    description = "Execute and run Python Code"
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
 
-    def __init__(self , max_output_chars = 4000 ):
-        self.max_output_chars = max_output_chars
 
-    def run_code(self , code):
+class _Worker:
+    """One pre-started interpreter running python_worker.py."""
+
+    def __init__(self, memory_mb):
+        # fixed hash seed: set/dict-of-str iteration order is the same in every worker,
+        # so cached results don't depend on which worker produced them
+        env = dict(os.environ, OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1", MKL_NUM_THREADS="1", PYTHONHASHSEED="0")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", WORKER_SCRIPT, str(memory_mb or 0)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            text=True,
+            bufsize=1
+        )
+        self.runs = 0
+        self.ready = False
+
+    def _read(self, timeout):
+        readable, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        if not readable:
+            raise TimeoutError
+        line = self.proc.stdout.readline()
+        if not line:
+            raise EOFError("worker exited")
+        return json.loads(line)
+
+    def wait_ready(self, timeout):
+        if not self.ready:
+            self._read(timeout)  # {"ready": true} once the common imports are done
+            self.ready = True
 
-        buffer = io.StringIO()
+    def call(self, request, timeout):
+        self.proc.stdin.write(json.dumps(request) + "\n")
+        self.proc.stdin.flush()
+        self.runs += 1
+        return self._read(timeout)
 
-        try :
+    def alive(self):
+        return self.proc.poll() is None
 
-            local_vars = {}
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
 
-            with contextlib.redirect_stdout(buffer):
-              exec(code , {} , local_vars)
 
-            output = buffer.getvalue().strip()
+class PythonTool:
+    name = "PythonTool"
+    description = "Execute and run Python Code"
+    version = "3"
+    # snippets run in separate worker processes, so the agent may run them in parallel
+    isolated = True
+
+    def __init__(
+        self,
+        max_output_chars = 4000,
+        workers = 2,
+        timeout = 10.0,
+        cpu_seconds = 10,
+        memory_mb = 1024,
+        max_runs = 50,
+        startup_timeout = 60.0
+    ):
+        """
+        Generated code runs in a pool of pre-started worker interpreters
+        (numpy/math/json already imported), never in the agent process.
 
+        workers: pool size (snippets running in parallel)
+        timeout: wall-clock seconds per run; the worker is killed and replaced after it
+        cpu_seconds / memory_mb: RLIMIT_CPU per run / RLIMIT_AS per worker
+        max_runs: worker is recycled after this many runs
+        """
+        self.max_output_chars = max_output_chars
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_runs = max_runs
+        self.startup_timeout = startup_timeout
+        self.stats = {"runs": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put(_Worker(memory_mb))
 
-            if not output :
-                if local_vars:
-                    output = "Execution finished. Variables:\n" + "\n".join(
-                    [f"{k} = {repr(v)[:200]}" for k, v in local_vars.items()]
-                )
-                else:
-                    output = "Execution finished. No output."
+    def _release(self, worker, healthy):
+        with self._lock:
+            if not healthy or worker.runs >= self.max_runs or not worker.alive():
+                worker.kill()
+                self.stats["recycled"] += 1
+                if self._closed:
+                    return
+                # Popen returns right away; the replacement imports in the background
+                worker = _Worker(self.memory_mb)
+            elif self._closed:
+                worker.kill()
+                return
+        self._idle.put(worker)
+
+    def run_code(self , code):
+        worker = self._idle.get()
+        healthy = False
+        try:
+            worker.wait_ready(self.startup_timeout)
+            result = worker.call(
+                {"code": code, "max_output_chars": self.max_output_chars, "cpu_seconds": self.cpu_seconds},
+                self.timeout
+            )
+            healthy = True
+            return result
 
-            # Cap output
-            if len(output) > self.max_output_chars:
-                  output = output[: self.max_output_chars] + "\n... [output truncated]"
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            return {"status": "error", "output": f"Execution timed out after {self.timeout}s"}
 
-            return {"status": "success", "output": output}
+        except (EOFError, OSError, ValueError) as e:
+            # the worker died (memory limit, segfault, os._exit...) or spoke garbage
+            self.stats["crashes"] += 1
+            logging.warning(f"python worker crashed: {e!r}")
+            return {"status": "error", "output": "Execution failed: worker process crashed"}
 
-        except Exception:
-            err = traceback.format_exc()
-            if len(err) > self.max_output_chars:
-                err = err[: self.max_output_chars] + "\n... [error truncated]"
+        finally:
+            self.stats["runs"] += 1
+            self._release(worker, healthy)
 
-            return {"status": "error", "output": err}
\ No newline at end of file
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
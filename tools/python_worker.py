@@ -0,0 +1,133 @@
+import io
+import os
+import sys
+import json
+import signal
+import traceback
+import contextlib
+
+# common modules are imported once, before the first request
+import math  # noqa: F401
+import numpy  # noqa: F401
+
+try:
+    import resource
+except ImportError:  # not POSIX: no limits
+    resource = None
+
+'''
+Worker interpreter for PythonTool (started by tools/python_tool.py).
+
+Reads one JSON request per line ({"code", "max_output_chars",
+"cpu_seconds"}) from a private copy of the original stdin and answers one
+JSON line per request on a private copy of the original stdout. fd 0 and
+fd 1 themselves point at /dev/null, so generated code can neither read the
+protocol (input() sees EOF) nor corrupt it. Address-space and per-run CPU
+limits come from `resource`; a CPU overrun raises inside the snippet instead
+of killing the worker.
+'''
+
+
+class CPULimitExceeded(Exception):
+    pass
+
+
+class _CappedBuffer(io.TextIOBase):
+    """stdout replacement that keeps at most `limit` characters."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        room = self.limit - self.size
+        if room > 0:
+            self.parts.append(text[:room])
+            self.size += min(len(text), room)
+        if len(text) > room:
+            self.truncated = True
+        return len(text)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPULimitExceeded("CPU time limit exceeded")
+
+
+def _set_cpu_limit(seconds):
+    """Soft RLIMIT_CPU `seconds` past what this process used so far (None: lift it)."""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if not seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    resource.setrlimit(resource.RLIMIT_CPU, (int(used + seconds) + 1, hard))
+
+
+def run(code, max_output_chars, cpu_seconds):
+    buffer = _CappedBuffer(max_output_chars)
+    _set_cpu_limit(cpu_seconds)
+    try:
+        local_vars = {}
+        with contextlib.redirect_stdout(buffer):
+            exec(code, {}, local_vars)
+
+        output = buffer.getvalue().strip()
+        if not output:
+            if local_vars:
+                output = "Execution finished. Variables:\n" + "\n".join(
+                    [f"{k} = {repr(v)[:200]}" for k, v in local_vars.items()]
+                )
+            else:
+                output = "Execution finished. No output."
+
+        # Cap output
+        if buffer.truncated or len(output) > max_output_chars:
+            output = output[:max_output_chars] + "\n... [output truncated]"
+
+        return {"status": "success", "output": output}
+
+    except BaseException:
+        err = traceback.format_exc()
+        if len(err) > max_output_chars:
+            err = err[:max_output_chars] + "\n... [error truncated]"
+        return {"status": "error", "output": err}
+    finally:
+        _set_cpu_limit(None)
+
+
+def main():
+    memory_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    if resource is not None and memory_mb:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 2**20, hard))
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # protocol goes over private copies of stdin/stdout; fd 0 and fd 1 are silenced
+    requests = os.fdopen(os.dup(0), "r")
+    channel = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    sys.stdin = io.StringIO()
+    sys.stdout = io.TextIOWrapper(os.fdopen(1, "wb", buffering=0), write_through=True)
+
+    channel.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    for line in requests:
+        request = json.loads(line)
+        result = run(request["code"], request["max_output_chars"], request.get("cpu_seconds"))
+        channel.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from ..Hyprid_RagSystem.pipeline import SmartHybridRetriever
+from pipeline import SmartHybridRetriever
 
 
 class RAGTool:
@@ -7,12 +7,16 @@ class RAGTool:
     def __init__(self, retriever: SmartHybridRetriever):
         self.retriever = retriever
 
-    def run(self, query: str, top_k: int = 5):
+    @property
+    def version(self) -> str:
+        return self.retriever.index_version
+
+    def run(self, query: str, top_k: int = 5, filters=None):
         if not query.strip():
             return {"status": "error", "output": "Empty query"}
 
         return {
             "status": "success",
             "query": query,
-            "results": self.retriever.retrieve(query, top_k)
+            "results": self.retriever.retrieve(query, top_k, filters=filters)
         }